@@ -0,0 +1,180 @@
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+import torch
+from candidates import get_candidate_index
+from dictionary import get_compiled_dictionary
+from device import AUTOCAST_DTYPES, configure
+from metrics import batch_accuracy, player_accuracy
+from solver import EntropySolver
+from utils import get_label_tensor, get_wordlist, load_model
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--player', default='model', choices=['model', 'entropy'], dest='player', help="Benchmark the trained model or the entropy maximizing solver")
+parser.add_argument('--model', default="models/100epoch_bigger_train_beam_3", dest='model_path', help="The model to benchmark when --player is model")
+parser.add_argument('-k', default=[3], type=int, nargs='+', dest='ks', help="The beam widths to benchmark the model with")
+parser.add_argument('--candidates', default=False, dest='candidates', action='store_true', help="Only let the model guess words that are still consistent with the feedback")
+parser.add_argument('--words', default='official', choices=['official', 'all'], dest='words', help="Play every word in data/official.txt, or also every word in data/words.txt")
+parser.add_argument('--autocast', default=None, choices=list(AUTOCAST_DTYPES), dest='autocast', help="Run the model under autocast with this dtype, bfloat16 also works on CPU")
+parser.add_argument('--workers', default=os.cpu_count(), type=int, dest='workers', help="The number of worker processes")
+parser.add_argument('--quantize', default=False, dest='quantize', action='store_true', help="Also benchmark the model with dynamic int8 quantization, and check that it plays as well as the float model")
+parser.add_argument('--parity-tolerance', default=0.5, type=float, dest='parity_tolerance', help="The largest increase of the failure rate, in %, that the quantized model passes the parity check with")
+
+# the union of data/official.txt and data/words.txt that --words all plays, written by get_answers_path()
+ALL_WORDS_PATH = "data/all.txt"
+
+# Filled in by the parent before the pool is forked. The workers inherit the model weights (in shared memory)
+# and the memory mapped dictionary arrays, rather than receiving a pickled copy with every task.
+shared = {}
+
+def get_answers(words_option : str) -> list:
+    """
+        The words of data/official.txt, and with 'all' also the words of data/words.txt that are not in it.
+    """
+    answers = get_wordlist("data/official.txt")
+    if words_option == 'all':
+        official = set(answers)
+        answers += [word for word in get_wordlist("data/words.txt") if word not in official]
+    return answers
+
+def get_answers_path(words_option : str, all_words_path : str = ALL_WORDS_PATH) -> str:
+    """
+        The path of a word list with the words of get_answers(), for the trie and the candidate index of the model player.
+        With 'all' the union is written to all_words_path first, it is compiled like any other word list.
+    """
+    if words_option != 'all':
+        return "data/official.txt"
+    with open(f"{all_words_path}.tmp", "w") as f:
+        f.write("\n".join(get_answers(words_option)))
+    os.replace(f"{all_words_path}.tmp", all_words_path)
+    return all_words_path
+
+def init_worker() -> None:
+    # every process gets a core of its own
+    torch.set_num_threads(1)
+
+def play_shard(args : tuple) -> dict:
+    """
+        Plays every word of the shard with the shared player and returns the number of attempts taken
+        for each word, or None for the words that were not guessed.
+    """
+    words, k, model_name = args
+    if shared['player'] == 'entropy':
+        _, attempt_count = player_accuracy(shared['solver'], [(word, None) for word in words])
+    else:
+        dataset = [(word, get_label_tensor(word)) for word in words]
+        _, attempt_count = batch_accuracy(shared['models'][model_name], dataset, shared['trie'], k, candidate_index=shared['candidate_index'])
+    return { word : attempt_count.get(word) for word in words }
+
+def get_report(results : dict, seconds : float) -> dict:
+    """
+        Summarizes the results of play_shard() over all the words.
+
+        Return:
+        `report`: A dict with the guess distribution ({1..6: count, 'failed': count}), the average number
+        of guesses over the words that were guessed, the failure rate in %, the wall-clock time and the throughput in games per second.
+    """
+    distribution = { i : 0 for i in range(1, 7) }
+    distribution['failed'] = 0
+    for attempts in results.values():
+        distribution[attempts if attempts else 'failed'] += 1
+
+    solved = len(results) - distribution['failed']
+    return {
+        'distribution': distribution,
+        'average': round(sum(i * distribution[i] for i in range(1, 7)) / solved, 4) if solved else 0,
+        'failure_rate': round(100. * distribution['failed'] / len(results), 4) if results else 0,
+        'seconds': round(seconds, 3),
+        'games_per_second': round(len(results) / seconds, 2) if seconds else 0,
+    }
+
+def get_parity(results : dict, reference_results : dict) -> dict:
+    """
+        Compares the results of play_shard() for a model with those of a reference model on the same words.
+
+        Return:
+        `parity`: A dict with the change of the failure rate and of the average number of guesses (in the units of get_report()),
+        and the number of words whose outcome (the number of attempts, or failed) differs.
+    """
+    report, reference_report = get_report(results, 0), get_report(reference_results, 0)
+    return {
+        'failure_rate_change': round(report['failure_rate'] - reference_report['failure_rate'], 4),
+        'average_change': round(report['average'] - reference_report['average'], 4),
+        'changed_words': sum(results[word] != reference_results.get(word) for word in results),
+    }
+
+def print_report(name : str, report : dict) -> None:
+    print(name)
+    print(f"Guess distribution: {report['distribution']}")
+    print(f"Average guesses: {report['average']}")
+    print(f"Failure rate: {report['failure_rate']}%")
+    print(f"Wall-clock: {report['seconds']}s, throughput: {report['games_per_second']} games/s")
+    print("")
+
+def run_benchmark(pool, answers : list, k : int, num_shards : int, model_name : str = None) -> tuple:
+    """
+        Plays all the answers with the pool of workers.
+
+        Return:
+        `report`: The report from get_report().
+        `results`: The results of play_shard() for all the answers.
+    """
+    shard_size = max(1, -(-len(answers) // num_shards))
+    shards = [(answers[i:i + shard_size], k, model_name) for i in range(0, len(answers), shard_size)]
+
+    start = time.perf_counter()
+    results = {}
+    for shard_results in pool.imap_unordered(play_shard, shards):
+        results.update(shard_results)
+    return get_report(results, time.perf_counter() - start), results
+
+if __name__ == "__main__":
+    options = parser.parse_args()
+    # the workers run on CPU, so that they can share the model weights
+    configure("cpu", AUTOCAST_DTYPES.get(options.autocast))
+    answers = get_answers(options.words)
+
+    shared['player'] = options.player
+    if options.player == 'entropy':
+        # with all the words, the answers are the whole vocabulary of the feedback matrix, the union of both lists
+        shared['solver'] = EntropySolver(answers_path="data/official.txt" if options.words == 'official' else None)
+        ks = [None]
+        model_names = [None]
+    else:
+        model = load_model(options.model_path)
+        model.eval()
+        model.share_memory()
+        shared['models'] = { 'float32': model }
+        if options.quantize:
+            shared['models']['int8'] = load_model(options.model_path, quantize=True)
+        # the model can only guess the words of the trie, so it is built from the same words that are played
+        answers_path = get_answers_path(options.words)
+        shared['trie'] = get_compiled_dictionary(answers_path).trie
+        shared['candidate_index'] = get_candidate_index(answers_path) if options.candidates else None
+        ks = options.ks
+        model_names = list(shared['models'])
+
+    # fork, so that the workers inherit everything in shared
+    context = multiprocessing.get_context("fork")
+    failed_parity = False
+    with context.Pool(options.workers, initializer=init_worker) as pool:
+        for k in ks:
+            results = {}
+            for model_name in model_names:
+                name = options.player if k is None else f"{options.player} k = {k}"
+                if options.quantize:
+                    name += f" ({model_name})"
+                report, results[model_name] = run_benchmark(pool, answers, k, 2 * options.workers, model_name)
+                print_report(f"{name} on {len(answers)} words with {options.workers} workers", report)
+
+            if 'int8' in results:
+                parity = get_parity(results['int8'], results['float32'])
+                passed = parity['failure_rate_change'] <= options.parity_tolerance
+                failed_parity = failed_parity or not passed
+                print(f"Parity of int8 against float32 for k = {k}: {'PASSED' if passed else 'FAILED'}")
+                print(f"Failure rate change: {parity['failure_rate_change']}%, average guesses change: {parity['average_change']}")
+                print(f"Words with a different outcome: {parity['changed_words']}")
+                print("")
+    sys.exit(1 if failed_parity else 0)
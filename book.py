@@ -0,0 +1,160 @@
+import argparse
+import struct
+import sys
+import numpy as np
+import torch
+from dictionary import get_compiled_dictionary
+from device import forward, get_device, get_model_device
+from feedback import ALL_GREEN, decode_feedback
+from utils import decode_batch_feedback, get_batch_default_features, get_batch_updated_features, get_batch_word_beam_search, get_paired_feedback, get_wordlist, get_words_from_tensor, get_words_tensor, load_model
+
+BOOK_MAGIC = b"WORDLEBK"
+BOOK_VERSION = 1
+# magic, version, k, number of nodes, number of edges
+BOOK_HEADER = struct.Struct("<8sIIII")
+ROOT = 0
+NO_NODE = -1
+
+parser = argparse.ArgumentParser()
+subparsers = parser.add_subparsers(dest='command', required=True)
+build_parser = subparsers.add_parser('build', help="Build the book of a trained model by playing every word of the word list")
+build_parser.add_argument('--model', default="models/100epoch_bigger_train_beam_3", dest='model_path', help="The trained model to build the book of")
+build_parser.add_argument('--wordlist', default="data/official.txt", dest='wordlist_path', help="The words that are played, and that the beam search guesses from")
+build_parser.add_argument('-k', default=3, type=int, dest='k', help="The number of words to track in beam search")
+build_parser.add_argument('--output', default=None, dest='output_path', help="Where to write the book, by default the model path with a .book suffix")
+dump_parser = subparsers.add_parser('dump', help="Print a book as text, one line per position, for diffing the books of two models")
+dump_parser.add_argument('book_path', help="The book to print")
+
+class OpeningBook:
+    """
+        The whole policy of a deterministic player over a word list, as a tree of game positions.
+        Node 0 is the start of a game. Every node holds the word guessed there, and an edge for every feedback that the
+        guess got from a word of the list, leading to the node of the next guess.
+
+        The edges are stored in CSR layout, sorted by node and then by feedback code:
+        `guesses`: uint8 array of shape [N, 5], the guessed word of every node as offsets from 'a'.
+        `offsets`: int32 array of shape [N + 1], the edges of node n are offsets[n]:offsets[n + 1].
+        `codes`: uint8 array of shape [E], the base-3 encoded feedback of every edge (see feedback.encode_feedback()).
+        `children`: int32 array of shape [E], the node that every edge leads to.
+    """
+    def __init__(self, guesses : np.ndarray, offsets : np.ndarray, codes : np.ndarray, children : np.ndarray, k : int):
+        self.guesses = guesses
+        self.offsets = offsets
+        self.codes = codes
+        self.children = children
+        self.k = k
+        self.words = get_words_from_tensor(torch.from_numpy(guesses.astype(np.int64)))
+
+        # a flat dict for the lookups of the players, from node * 243 + code to the child node
+        parents = np.repeat(np.arange(len(guesses), dtype=np.int64), np.diff(offsets))
+        self.edges = dict(zip((parents * 243 + codes).tolist(), children.tolist()))
+
+    def __len__(self):
+        return len(self.guesses)
+
+    def get_child(self, node : int, code : int) -> int:
+        """
+            The node after the guess of the node got the feedback code, or NO_NODE if that never happened when building the book.
+        """
+        return self.edges.get(node * 243 + code, NO_NODE)
+
+    def save(self, path : str) -> None:
+        with open(path, "wb") as f:
+            f.write(BOOK_HEADER.pack(BOOK_MAGIC, BOOK_VERSION, self.k, len(self.guesses), len(self.codes)))
+            for array, dtype in [(self.guesses, np.uint8), (self.offsets, '<i4'), (self.codes, np.uint8), (self.children, '<i4')]:
+                f.write(np.ascontiguousarray(array, dtype=dtype).tobytes())
+
+    @classmethod
+    def load(cls, path : str) -> "OpeningBook":
+        with open(path, "rb") as f:
+            data = f.read()
+        magic, version, k, num_nodes, num_edges = BOOK_HEADER.unpack_from(data)
+        if magic != BOOK_MAGIC or version != BOOK_VERSION:
+            raise ValueError(f"{path} is not a version {BOOK_VERSION} opening book")
+
+        arrays = []
+        offset = BOOK_HEADER.size
+        for dtype, shape in [(np.uint8, (num_nodes, 5)), ('<i4', (num_nodes + 1,)), (np.uint8, (num_edges,)), ('<i4', (num_edges,))]:
+            count = int(np.prod(shape))
+            arrays.append(np.frombuffer(data, dtype=dtype, count=count, offset=offset).reshape(shape))
+            offset += count * np.dtype(dtype).itemsize
+        return cls(*arrays, k=k)
+
+    def get_lines(self) -> list:
+        """
+            The book as text, one line per node with the guesses and feedback that lead to it and the word guessed there.
+            The feedback is written as one digit per letter, 0 for absent, 1 for the wrong position and 2 for the right position.
+            The lines are sorted, so the books of two models can be compared with diff.
+        """
+        lines = []
+        stack = [(ROOT, "")]
+        while stack:
+            node, path = stack.pop()
+            lines.append(f"{path}=> {self.words[node]}")
+            for edge in range(self.offsets[node], self.offsets[node + 1]):
+                feedback = "".join(str(fb + 1) for fb in decode_feedback(int(self.codes[edge])))
+                stack.append((int(self.children[edge]), f"{path}{self.words[node]}:{feedback} "))
+        return sorted(lines)
+
+def build_book(model : torch.nn.Module, trie, answers : list, k : int = 3, max_attempts : int = 6) -> OpeningBook:
+    """
+        Builds the OpeningBook of the model with beam search over the trie, by playing all the answers in lock step.
+        Every round does a single forward pass and beam search over the distinct positions of the games still being played.
+    """
+    device = get_model_device(model)
+    trie = trie.to(device)
+    answer_letters = get_words_tensor(answers).to(device)
+    features = get_batch_default_features(len(answers), device)
+    nodes = torch.zeros(len(answers), dtype=torch.long, device=device)
+    active = torch.arange(len(answers), device=device)
+    num_nodes = 1
+    guesses, parents, codes, children = [], [], [], []
+
+    with torch.no_grad():
+        for attempt in range(max_attempts):
+            # every node of this round is played by at least one game, they all get their guess from one of those games
+            unique_nodes, inverse = torch.unique(nodes[active], return_inverse=True)
+            first = torch.empty_like(unique_nodes).scatter_(0, inverse, active)
+            outputs = forward(model, features[first])
+            node_letters = get_batch_word_beam_search(outputs, trie, k)
+            guesses.append(node_letters)
+
+            guessed_letters = node_letters[inverse]
+            game_codes = get_paired_feedback(guessed_letters, answer_letters[active])
+            features[active] = get_batch_updated_features(features[active], decode_batch_feedback(game_codes), guessed_letters)
+
+            playing = game_codes != ALL_GREEN
+            if attempt == max_attempts - 1 or not playing.any():
+                break
+
+            # a new node for every distinct (node, feedback) pair of the games that go on
+            edges, edge_inverse = torch.unique(nodes[active][playing] * 243 + game_codes[playing].long(), return_inverse=True)
+            parents.append(torch.div(edges, 243, rounding_mode='floor'))
+            codes.append(edges % 243)
+            children.append(torch.arange(num_nodes, num_nodes + len(edges), device=device))
+            num_nodes += len(edges)
+
+            active = active[playing]
+            nodes[active] = children[-1][edge_inverse]
+
+    parents = torch.cat(parents).cpu().numpy() if parents else np.zeros(0, dtype=np.int64)
+    offsets = np.concatenate(([0], np.cumsum(np.bincount(parents, minlength=num_nodes))))
+    return OpeningBook(
+        torch.cat(guesses).cpu().numpy().astype(np.uint8),
+        offsets.astype(np.int32),
+        torch.cat(codes).cpu().numpy().astype(np.uint8) if codes else np.zeros(0, dtype=np.uint8),
+        torch.cat(children).cpu().numpy().astype(np.int32) if children else np.zeros(0, dtype=np.int32),
+        k,
+    )
+
+if __name__ == "__main__":
+    options = parser.parse_args()
+    if options.command == 'build':
+        model = load_model(options.model_path).to(get_device())
+        model.eval()
+        book = build_book(model, get_compiled_dictionary(options.wordlist_path).trie, get_wordlist(options.wordlist_path), options.k)
+        output_path = options.output_path or f"{options.model_path}.book"
+        book.save(output_path)
+        print(f"Saved a book of {len(book)} positions to {output_path}")
+    else:
+        sys.stdout.write("\n".join(OpeningBook.load(options.book_path).get_lines()) + "\n")
@@ -0,0 +1,79 @@
+import torch
+from collections import OrderedDict
+import device
+from state import get_state_keys, pack_features
+from utils import get_word_beam_search
+
+class DecisionCache:
+    """
+        A bounded LRU cache of the words that a model guesses, in front of the model and the beam search.
+        Evaluation is deterministic, and every game starts from the same default features, so the first guess
+        and most of the second guesses are the same for thousands of games.
+
+        The decisions are keyed by the packed game state (see state.py) and the beam width k. The cache remembers the
+        model and mask tree it was filled with, and the version counters of the model's parameters, which torch bumps
+        on every in-place update (optimizer steps, load_state_dict()). When any of these change, or the autocast dtype
+        does, the cache is cleared before the next lookup.
+
+        Arguments:
+        `max_size`: The number of decisions to keep, the least recently used one is evicted beyond that.
+    """
+    def __init__(self, max_size : int = 65536):
+        self.max_size = max_size
+        self.decisions = OrderedDict()
+        self.fingerprint = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self.decisions)
+
+    def get_fingerprint(self, model : torch.nn.Module, mask_tree) -> tuple:
+        versions = tuple((id(tensor), tensor._version) for tensor in model.parameters())
+        return (id(model), id(mask_tree), device.AUTOCAST_DTYPE, versions)
+
+    def clear(self) -> None:
+        self.decisions.clear()
+
+    def get_word(self, model : torch.nn.Module, features : torch.Tensor, mask_tree, k : int = 3) -> str:
+        """
+            Returns get_word_beam_search() of the model's output for the features, from the cache when possible.
+
+            Arguments:
+            `features`: The (26, 12) features of a single game, see get_default_features().
+            `mask_tree`: The mask tree or PackedTrie, anything that get_word_beam_search() takes.
+        """
+        fingerprint = self.get_fingerprint(model, mask_tree)
+        if fingerprint != self.fingerprint:
+            if self.decisions:
+                self.invalidations += 1
+                self.clear()
+            self.fingerprint = fingerprint
+
+        key = (get_state_keys(pack_features(features[None]))[0], k)
+        if key in self.decisions:
+            self.hits += 1
+            self.decisions.move_to_end(key)
+            return self.decisions[key]
+
+        self.misses += 1
+        with torch.no_grad():
+            guessed_word = get_word_beam_search(device.forward(model, features), mask_tree, k)
+        self.decisions[key] = guessed_word
+        if len(self.decisions) > self.max_size:
+            self.decisions.popitem(last=False)
+            self.evictions += 1
+        return guessed_word
+
+    def get_stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self.decisions),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+            'hit_rate': round(100. * self.hits / lookups, 4) if lookups else 0,
+        }
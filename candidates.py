@@ -0,0 +1,152 @@
+import numpy as np
+import torch
+from dictionary import get_compiled_dictionary
+
+class CandidateIndex:
+    """
+        Finds the words of a word list that are still consistent with the feedback of a game, using bitsets.
+
+        The constraints follow the columns of the (26, 12) features from get_default_features():
+        a green at position i (columns 2-6) means the word has the letter at i, a yellow at position i
+        (columns 7-11) means it has the letter somewhere other than i, and a letter marked absent (column 1)
+        bounds how many times the letter can appear.
+
+        For every word, each of these constraints is precomputed as one bit:
+        `position_bits[i, c]`: Bitset of the words that have the letter c at position i.
+        `count_bits[c, n]`: Bitset of the words that have the letter c at least n times.
+
+        A set of live candidates is itself a bitset (a uint64 array with one bit per word), and every feedback
+        is applied as a few ANDs of it with the precomputed bitsets.
+    """
+    def __init__(self, words : list):
+        self.words = words
+        self.labels = np.array([[ord(k) - ord('a') for k in word] for word in words], dtype=np.int64).reshape(-1, 5)
+        self.num_blocks = (len(words) + 63) // 64
+
+        counts = np.zeros((len(words), 26), dtype=np.int64)
+        np.add.at(counts, (np.arange(len(words))[:, None], self.labels), 1)
+        self.max_count = int(counts.max(initial=0))
+
+        position_words = self.labels.T[:, None, :] == np.arange(26)[None, :, None]
+        count_words = counts.T[:, None, :] >= np.arange(self.max_count + 2)[None, :, None]
+        self.position_bits = self.pack(position_words)
+        self.count_bits = self.pack(count_words)
+
+    def __len__(self):
+        return len(self.words)
+
+    def pack(self, word_mask : np.ndarray) -> np.ndarray:
+        """
+            Packs a bool array with the words on its last axis into bitsets of num_blocks uint64.
+        """
+        padded = np.zeros(word_mask.shape[:-1] + (64 * self.num_blocks,), dtype=bool)
+        padded[..., :len(self.words)] = word_mask
+        return np.packbits(padded, axis=-1, bitorder='little').view('<u8')
+
+    def all(self) -> np.ndarray:
+        """
+            The bitset with every word of the list, this is the start of every game.
+        """
+        return self.pack(np.ones(len(self.words), dtype=bool))
+
+    def get_mask(self, live : np.ndarray) -> np.ndarray:
+        """
+            Converts a bitset to a bool array with one entry per word.
+        """
+        return np.unpackbits(live.view(np.uint8), axis=-1, bitorder='little')[..., :len(self.words)].astype(bool)
+
+    def get_words(self, live : np.ndarray) -> list:
+        return [self.words[i] for i in np.flatnonzero(self.get_mask(live))]
+
+    def count(self, live : np.ndarray) -> int:
+        return int(np.unpackbits(live.view(np.uint8)).sum())
+
+    def limit_count(self, live : np.ndarray, letter : int, lower : int, upper : int = None) -> np.ndarray:
+        live &= self.count_bits[letter, min(lower, self.max_count + 1)]
+        if upper is not None and upper <= self.max_count:
+            live &= ~self.count_bits[letter, upper + 1]
+        return live
+
+    def update(self, live : np.ndarray, feedback : list, guessed_word : str) -> np.ndarray:
+        """
+            Removes the words that are not consistent with the feedback for the guessed word from the live bitset.
+            This uses the exact letter counts that a single feedback gives.
+
+            Arguments:
+            `live`: The bitset of live candidates, from all() or an earlier call to this function.
+            `feedback`: A list of integers from {-1, 0, 1}. This comes from the output of get_feedback().
+            `guessed_word`: The word that was guessed.
+
+            Return:
+            `live`: A new bitset with the remaining candidates.
+        """
+        live = live.copy()
+        found, absent = {}, set()
+        for i, k in enumerate(guessed_word):
+            letter = ord(k) - ord('a')
+            if feedback[i] == 1:
+                live &= self.position_bits[i, letter]
+            else:
+                live &= ~self.position_bits[i, letter]
+
+            if feedback[i] == -1:
+                absent.add(letter)
+            else:
+                found[letter] = found.get(letter, 0) + 1
+
+        for letter in set(found) | absent:
+            lower = found.get(letter, 0)
+            live = self.limit_count(live, letter, lower, lower if letter in absent else None)
+        return live
+
+    def from_features(self, features : torch.Tensor) -> np.ndarray:
+        """
+            Returns the bitset of candidates that are consistent with features from get_updated_features().
+            The features do not keep which guess every mark came from, so the letter counts they give are only
+            bounds, and the result can be a superset of what update() gives for the same guesses.
+        """
+        live = self.all()
+        marks = features.detach().cpu().numpy() > 0
+        for letter in np.flatnonzero(~marks[:, 0]):
+            greens = np.flatnonzero(marks[letter, 2:7])
+            yellows = np.flatnonzero(marks[letter, 7:12])
+            for i in greens:
+                live &= self.position_bits[i, letter]
+            for i in yellows:
+                live &= ~self.position_bits[i, letter]
+
+            lower = max(len(greens), 1 if len(yellows) else 0)
+            upper = 0 if marks[letter, 1] and not lower else None
+            live = self.limit_count(live, letter, lower, upper)
+        return live
+
+    def get_best_words(self, outputs : torch.Tensor, live : np.ndarray) -> list:
+        """
+            Decodes a batch of model outputs to the live candidate with the highest probability under the model,
+            the product of the softmax of the outputs at each of its characters.
+
+            Arguments:
+            `outputs`: The output from the model for a batch of features. Should be of the shape [B, 5, 26].
+            `live`: The bitsets of live candidates of each game, of shape [B, num_blocks].
+
+            Return:
+            `words`: The best live word for each game, or None for games without any live candidate.
+        """
+        log_probs = torch.nn.functional.log_softmax(outputs.detach().float(), dim=2).cpu()
+        labels = torch.from_numpy(self.labels)
+        scores = sum(log_probs[:, i, labels[:, i]] for i in range(5))
+
+        mask = torch.from_numpy(self.get_mask(live))
+        scores = scores.masked_fill(~mask, float('-inf'))
+        best = torch.argmax(scores, dim=1).tolist()
+        has_live = mask.any(dim=1).tolist()
+        return [self.words[b] if ok else None for b, ok in zip(best, has_live)]
+
+def get_candidate_index(wordlist_path : str) -> CandidateIndex:
+    """
+        Builds the CandidateIndex of the words in the word list at the path.
+
+        Arguments:
+        `wordlist_path`: Needs to be the full path to the wordlist to use. Usually word lists are under data/ subdirectory.
+    """
+    return CandidateIndex(get_compiled_dictionary(wordlist_path).get_wordlist())
@@ -0,0 +1,221 @@
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import torch
+
+CHECKPOINT_INDEX = "checkpoints.json"
+
+def _clone_state(state):
+    """
+        Copies every tensor of a (nested) state dict to CPU, so the snapshot does not change while training goes on.
+    """
+    if isinstance(state, torch.Tensor):
+        return state.detach().to("cpu", copy=True)
+    if isinstance(state, dict):
+        return { key : _clone_state(value) for key, value in state.items() }
+    if isinstance(state, (list, tuple)):
+        return type(state)(_clone_state(value) for value in state)
+    return state
+
+class CheckpointManager:
+    """
+        Saves checkpoints of the model and optimizer state dicts in a directory, on a background thread.
+
+        save() takes a snapshot of the state dicts on the calling thread and returns right away, the snapshot is then
+        written to a temporary file that is renamed into place, so a checkpoint file is always complete. After every write
+        only the best_k checkpoints by the metric and the last_n by epoch are kept, the others are deleted.
+        The metadata of the kept checkpoints (name, epoch, metrics) is in the checkpoints.json index of the directory,
+        which is replaced in the same way.
+
+        A checkpoint can be saved before its metric is known, as with evaluator.BackgroundEvaluator, by passing
+        pending=True. It is kept until update_metrics() gives it the metric. Checkpoints saved without the metric
+        and not pending are not ranked, they are only kept as one of the last_n. The evaluations of an earlier run that
+        never came are not waited for, the checkpoints of the index are no longer pending once it is picked up.
+
+        Arguments:
+        `directory`: Where the checkpoints are written, the index of an earlier run in the directory is picked up.
+        `best_k`: The number of checkpoints with the best metric to keep.
+        `last_n`: The number of most recent checkpoints to keep.
+        `metric`: The key of the metrics passed to save() that ranks the checkpoints.
+        `higher_is_better`: Whether a higher metric is better, as for accuracy, or a lower one, as for loss.
+    """
+    def __init__(self, directory : str, best_k : int = 3, last_n : int = 2, metric : str = 'accuracy', higher_is_better : bool = True):
+        self.directory = directory
+        self.best_k = best_k
+        self.last_n = last_n
+        self.metric = metric
+        self.higher_is_better = higher_is_better
+        os.makedirs(directory, exist_ok=True)
+
+        index_path = os.path.join(directory, CHECKPOINT_INDEX)
+        self.entries = []
+        if os.path.exists(index_path):
+            with open(index_path, "r") as f:
+                self.entries = [{ key : value for key, value in entry.items() if key != 'pending' } for entry in json.load(f)['checkpoints']]
+
+        # a single writer keeps the writes in the order of the calls to save()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.pending = []
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def save(self, model : torch.nn.Module, optimizer : torch.optim.Optimizer, epoch : int, metrics : dict, extra : dict = None, pending : bool = False) -> str:
+        """
+            Snapshots the model and the optimizer and queues the checkpoint to be written.
+            Errors of earlier writes are raised here, or by wait().
+
+            Return:
+            `path`: The path that the checkpoint is written to.
+        """
+        self.check_pending()
+        name = f"epoch{epoch:05d}.pt"
+        checkpoint = {
+            'epoch': epoch,
+            'metrics': metrics,
+            'in_features': model.linear_layers[0].in_features,
+            'model': _clone_state(model.state_dict()),
+            'optimizer': _clone_state(optimizer.state_dict()) if optimizer is not None else None,
+            'extra': extra,
+        }
+        entry = { 'name': name, 'epoch': epoch, 'metrics': metrics }
+        if pending:
+            entry['pending'] = True
+        self.pending.append(self.executor.submit(self.write, checkpoint, entry))
+        return os.path.join(self.directory, name)
+
+    def write(self, checkpoint : dict, entry : dict) -> None:
+        path = os.path.join(self.directory, entry['name'])
+        torch.save(checkpoint, f"{path}.tmp")
+        os.replace(f"{path}.tmp", path)
+
+        self.retain([e for e in self.entries if e['name'] != entry['name']] + [entry])
+
+    def update_metrics(self, epoch : int, metrics : dict, history : dict = None) -> None:
+        """
+            Queues an update of the metrics of the checkpoint of the epoch, after the checkpoint is written.
+            Nothing is updated if the epoch has no checkpoint, or if it was deleted already.
+
+            Arguments:
+            `history`: The values of the epoch in the extra['history'] lists of the checkpoints, by name. They are set
+            in the checkpoint of the epoch and in the later ones, which were saved before the values were known.
+        """
+        self.check_pending()
+        self.pending.append(self.executor.submit(self.write_metrics, epoch, metrics, history))
+
+    def write_metrics(self, epoch : int, metrics : dict, history : dict = None) -> None:
+        def update(checkpoint):
+            values = (checkpoint['extra'] or {}).get('history', {})
+            for name, value in (history or {}).items():
+                if name in values and len(values[name]) > epoch:
+                    values[name][epoch] = value
+
+        with self.lock:
+            entries = [e for e in self.entries if e['epoch'] == epoch]
+            later = [e for e in self.entries if e['epoch'] > epoch] if history else []
+        for later_entry in later:
+            self.rewrite(later_entry['name'], update)
+        if not entries:
+            return
+        entry = { 'name': entries[0]['name'], 'epoch': epoch, 'metrics': dict(entries[0]['metrics'], **metrics) }
+
+        def update_with_metrics(checkpoint):
+            checkpoint['metrics'] = entry['metrics']
+            update(checkpoint)
+        self.rewrite(entry['name'], update_with_metrics)
+        self.retain([e for e in self.entries if e['name'] != entry['name']] + [entry])
+
+    def rewrite(self, name : str, update) -> None:
+        """
+            Loads the checkpoint file, changes it in place with update(checkpoint) and writes it back.
+        """
+        path = os.path.join(self.directory, name)
+        checkpoint = torch.load(path, map_location="cpu", weights_only=False)
+        update(checkpoint)
+        torch.save(checkpoint, f"{path}.tmp")
+        os.replace(f"{path}.tmp", path)
+
+    def retain(self, entries : list) -> None:
+        """
+            Keeps the retained entries, deletes the files of the others and writes the index.
+        """
+        with self.lock:
+            self.entries = self.get_retained(entries)
+            for dropped in entries:
+                if dropped not in self.entries and os.path.exists(os.path.join(self.directory, dropped['name'])):
+                    os.remove(os.path.join(self.directory, dropped['name']))
+
+            index_path = os.path.join(self.directory, CHECKPOINT_INDEX)
+            with open(f"{index_path}.tmp", "w") as f:
+                f.write(json.dumps({ 'metric': self.metric, 'checkpoints': self.entries }, indent=4))
+            os.replace(f"{index_path}.tmp", index_path)
+
+    def get_retained(self, entries : list) -> list:
+        """
+            The entries of the best_k checkpoints by the metric, of the last_n by epoch and of the pending ones, sorted by epoch.
+        """
+        by_metric = sorted((e for e in entries if self.metric in e['metrics']), key=lambda e: e['metrics'][self.metric], reverse=self.higher_is_better)
+        by_epoch = sorted(entries, key=lambda e: e['epoch'])
+        kept = by_metric[:self.best_k] + (by_epoch[-self.last_n:] if self.last_n else []) + [e for e in entries if e.get('pending')]
+        return [e for e in by_epoch if e in kept]
+
+    def check_pending(self) -> None:
+        done = [future for future in self.pending if future.done()]
+        self.pending = [future for future in self.pending if not future.done()]
+        for future in done:
+            future.result()
+
+    def wait(self) -> None:
+        """
+            Blocks until all the queued checkpoints are written.
+        """
+        pending, self.pending = self.pending, []
+        for future in pending:
+            future.result()
+
+    def close(self) -> None:
+        try:
+            self.wait()
+        finally:
+            self.executor.shutdown()
+
+    def get_best(self) -> dict:
+        """
+            The entry of the checkpoint with the best metric that is written, or None.
+        """
+        with self.lock:
+            retained = sorted((e for e in self.entries if self.metric in e['metrics']), key=lambda e: e['metrics'][self.metric], reverse=self.higher_is_better)
+        return retained[0] if retained else None
+
+    def get_last(self) -> dict:
+        """
+            The entry of the most recent checkpoint that is written, or None.
+        """
+        with self.lock:
+            return max(self.entries, key=lambda e: e['epoch']) if self.entries else None
+
+    def get_path(self, entry : dict) -> str:
+        return os.path.join(self.directory, entry['name'])
+
+def load_checkpoint(path : str) -> dict:
+    """
+        Loads a checkpoint written by CheckpointManager.save(), on CPU.
+    """
+    return torch.load(path, map_location="cpu", weights_only=False)
+
+def restore_checkpoint(checkpoint : dict, model : torch.nn.Module, optimizer : torch.optim.Optimizer = None) -> int:
+    """
+        Loads the state of a checkpoint from load_checkpoint() into the model, and the optimizer when given.
+
+        Return:
+        `epoch`: The epoch to resume training from, the one after the epoch of the checkpoint.
+    """
+    model.load_state_dict(checkpoint['model'])
+    if optimizer is not None and checkpoint['optimizer'] is not None:
+        optimizer.load_state_dict(checkpoint['optimizer'])
+    return checkpoint['epoch'] + 1
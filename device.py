@@ -0,0 +1,53 @@
+import os
+import torch
+
+AUTOCAST_DTYPES = {
+    'bfloat16': torch.bfloat16,
+    'float16': torch.float16,
+}
+
+# The device and dtypes used everywhere. Set them with configure(), or with the WORDLE_DEVICE and
+# WORDLE_AUTOCAST (bfloat16 / float16) environment variables.
+DEVICE = torch.device(os.environ.get("WORDLE_DEVICE") or ("cuda:0" if torch.cuda.is_available() else "cpu"))
+DTYPE = torch.float32
+AUTOCAST_DTYPE = AUTOCAST_DTYPES.get(os.environ.get("WORDLE_AUTOCAST", ""))
+
+def configure(device : str = None, autocast_dtype : torch.dtype = None) -> None:
+    """
+        Sets the device that models and tensors are created on, and the dtype of the autocast that the
+        models are run under. An autocast_dtype of None runs the models in float32.
+    """
+    global DEVICE, AUTOCAST_DTYPE
+    if device is not None:
+        DEVICE = torch.device(device)
+    AUTOCAST_DTYPE = autocast_dtype
+
+def get_device() -> torch.device:
+    return DEVICE
+
+def get_dtype() -> torch.dtype:
+    return DTYPE
+
+def get_model_device(model : torch.nn.Module) -> torch.device:
+    """
+        The device of the model's weights, so that inputs can be created next to them.
+    """
+    for parameter in model.parameters():
+        return parameter.device
+    return DEVICE
+
+def autocast():
+    """
+        The autocast context that the models are run in, a no-op unless an autocast dtype is configured.
+        bfloat16 autocast also works on CPU only hosts.
+    """
+    return torch.autocast(DEVICE.type, dtype=AUTOCAST_DTYPE, enabled=AUTOCAST_DTYPE is not None)
+
+def forward(model : torch.nn.Module, features : torch.Tensor) -> torch.Tensor:
+    """
+        Runs the model on the features under autocast(). The outputs are always returned as float32,
+        so the softmax of the beam search and the loss keep their precision.
+    """
+    with autocast():
+        outputs = model(features)
+    return outputs.float()
@@ -0,0 +1,101 @@
+import hashlib
+import os
+import shutil
+import numpy as np
+import torch
+from trie import PackedTrie, build_packed_trie
+from utils import get_wordlist, get_words_tensor
+
+ARRAY_NAMES = ["children", "valid", "labels", "words"]
+
+class CompiledDictionary:
+    """
+        Everything that is derived from a word list, compiled once and loaded without any parsing.
+
+        `words`: A numpy array of dtype 'S5' with the words of the list, in order.
+        `index`: A dict from word to its position in the list.
+        `labels`: A long tensor of shape [len(words), 5], row i is get_label_tensor(words[i]).
+        `trie`: The PackedTrie holding the prefix masks of the words.
+    """
+    def __init__(self, arrays : dict):
+        self.words = arrays["words"]
+        self.labels = torch.from_numpy(arrays["labels"])
+        self.trie = PackedTrie(torch.from_numpy(arrays["children"]), torch.from_numpy(arrays["valid"]))
+        self._index = None
+
+    def __len__(self):
+        return len(self.words)
+
+    @property
+    def index(self) -> dict:
+        if self._index is None:
+            self._index = { word.decode("ascii") : i for i, word in enumerate(self.words) }
+        return self._index
+
+    def get_wordlist(self) -> list:
+        return [word.decode("ascii") for word in self.words]
+
+def get_wordlist_hash(wordlist_path : str) -> str:
+    """
+        Returns the sha256 of the contents of the word list, used as the key of its compiled artifact.
+    """
+    with open(wordlist_path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def get_artifact_dir(wordlist_path : str, content_hash : str) -> str:
+    """
+        The compiled artifact of data/official.txt lives next to it in data/.official.<hash>/
+    """
+    directory, file_name = os.path.split(wordlist_path)
+    name = os.path.splitext(file_name)[0]
+    return os.path.join(directory, f".{name}.{content_hash[:16]}")
+
+def compile_dictionary(wordlist_path : str, artifact_dir : str) -> None:
+    """
+        Parses the word list and writes the arrays of a CompiledDictionary as .npy files to artifact_dir.
+        The arrays are written to a temporary directory that is renamed at the end, so readers never see a partial artifact.
+        Artifacts of older versions of the same word list are removed.
+    """
+    words = get_wordlist(wordlist_path)
+    trie = build_packed_trie(words)
+    arrays = {
+        "children": trie.children.numpy(),
+        "valid": trie.valid.numpy(),
+        "labels": get_words_tensor(words).numpy(),
+        "words": np.array(words, dtype="S5"),
+    }
+
+    tmp_dir = f"{artifact_dir}.tmp{os.getpid()}"
+    os.makedirs(tmp_dir, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_dir, f"{name}.npy"), array)
+
+    parent, artifact_name = os.path.split(artifact_dir)
+    prefix = artifact_name[:-16]
+    for entry in os.listdir(parent or "."):
+        key = entry[len(prefix):]
+        if entry.startswith(prefix) and len(key) == 16 and all(c in "0123456789abcdef" for c in key):
+            shutil.rmtree(os.path.join(parent, entry), ignore_errors=True)
+
+    try:
+        os.rename(tmp_dir, artifact_dir)
+    except OSError:
+        # another process compiled the same word list first
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+def get_compiled_dictionary(wordlist_path : str) -> CompiledDictionary:
+    """
+        Returns the CompiledDictionary of the word list at the path.
+        The artifact is keyed by the hash of the contents of the word list, it is compiled on first use
+        and every later call with an unchanged word list memory maps the saved arrays.
+
+        Arguments:
+        `wordlist_path`: Needs to be the full path to the wordlist to use. Usually word lists are under data/ subdirectory.
+    """
+    artifact_dir = get_artifact_dir(wordlist_path, get_wordlist_hash(wordlist_path))
+    if not os.path.isdir(artifact_dir):
+        compile_dictionary(wordlist_path, artifact_dir)
+
+    # copy-on-write maps, so the tensors are writable but the files are never modified
+    arrays = { name : np.load(os.path.join(artifact_dir, f"{name}.npy"), mmap_mode="c") for name in ARRAY_NAMES }
+    return CompiledDictionary(arrays)
@@ -0,0 +1,165 @@
+import contextlib
+import os
+import socket
+import numpy as np
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+from torch.nn import CrossEntropyLoss
+from torch.nn.parallel import DistributedDataParallel
+from torch.optim import Adam
+from torch.utils.data import DataLoader
+from torch.utils.data.distributed import DistributedSampler
+from device import AUTOCAST_DTYPES, configure, forward, get_model_device
+from dictionary import get_compiled_dictionary
+from interactions import RECORD_DTYPE, get_batch_records
+from evaluator import BackgroundEvaluator
+from main import apply_evaluations, end_epoch, resume_training
+from models import FusedBaseModel
+from runs import Run, seed_everything
+from utils import decode_batch_feedback, get_batch_default_features, get_batch_updated_features, get_batch_word_beam_search, get_dataset, get_paired_feedback, get_split_dataset, get_words_from_tensor
+
+class GatheredRecorder:
+    """
+        Collects the interactions of the games of one rank during an epoch. flush() is called by every rank at the
+        end of the epoch, and appends the records of all the ranks to the recorder of rank 0, in rank order.
+    """
+    def __init__(self, recorder = None):
+        self.recorder = recorder
+        self.records = []
+
+    def record_batch(self, epoch : int, correct_words : list, attempt : int, guessed_words : list, codes) -> None:
+        self.records.append(get_batch_records(epoch, correct_words, attempt, guessed_words, codes))
+
+    def flush(self) -> None:
+        records = np.concatenate(self.records) if self.records else np.zeros(0, dtype=RECORD_DTYPE)
+        self.records = []
+        gathered = [None] * dist.get_world_size() if dist.get_rank() == 0 else None
+        dist.gather_object(records, gathered, dst=0)
+        if self.recorder is not None:
+            for rank_records in gathered:
+                self.recorder.append(rank_records)
+            self.recorder.flush()
+
+def train_distributed(model, datasets, trie, max_epochs, eta, batch_size=64, accumulation_steps=1, recorder=None, checkpoints=None, resume=None, evaluator=None, seed=0):
+    """
+        Data parallel version of main.train_batched(), run by every process of a gloo process group.
+        Every rank plays its own shard of datasets['train'] from a DistributedSampler, and the gradients are averaged
+        over the ranks by DistributedDataParallel in the single backward pass of each mini-batch (of every
+        accumulation_steps mini-batches). The sampler pads the shards to the same length with words from the start of
+        the shuffled dataset, so all the ranks take the same number of steps. Unless the number of words is a multiple of
+        the world size, those few words are played twice in an epoch, and their games count twice in the losses and
+        in the interaction log.
+
+        Rank 0 is the only one that evaluates the model (in its evaluator if it has one) and saves checkpoints, the recorders
+        and evaluators of the other ranks are ignored and their interactions are gathered to the recorder of rank 0 at the end of every epoch.
+
+        Arguments:
+        `batch_size`: The number of games of a mini-batch over all the ranks, each one plays batch_size // world_size of them.
+        `seed`: The seed of the shuffling of the sampler, the same on every rank, like the seed of the run's config.
+        The others are the same as for main.train_batched(). Returns the training loss of every epoch, summed over the ranks.
+    """
+    rank, world_size = dist.get_rank(), dist.get_world_size()
+    losses = np.zeros(max_epochs)
+    val_acc = np.zeros(max_epochs)
+    val_loss = np.zeros(max_epochs)
+    history = { 'losses': losses, 'val_acc': val_acc, 'val_loss': val_loss }
+    recorder = GatheredRecorder(recorder if rank == 0 else None)
+
+    optimizer = Adam(model.parameters(), lr=eta)
+    loss_criterion = CrossEntropyLoss(reduction='sum')
+    sampler = DistributedSampler(datasets['train'], num_replicas=world_size, rank=rank, shuffle=True, seed=seed)
+    loader = DataLoader(datasets['train'], batch_size=max(1, batch_size // world_size), sampler=sampler)
+    device = get_model_device(model)
+    trie = trie.to(device)
+    start_epoch = resume_training(resume, model, optimizer, history)
+    # the weights of rank 0 are broadcast to the other ranks here
+    parallel_model = DistributedDataParallel(model)
+
+    for epoch in range(start_epoch, max_epochs):
+        sampler.set_epoch(epoch)
+        model.train()
+        optimizer.zero_grad()
+
+        for step, (correct_words, correct_word_labels) in enumerate(loader):
+            correct_word_labels = correct_word_labels.to(device)
+            features = get_batch_default_features(len(correct_words), device)
+            active = torch.arange(len(correct_words))
+            if rank == 0:
+                print(f"Batches: {step + 1}/{len(loader)}", end='\r')
+
+            # the gradients are only all-reduced in the backward pass of the batches that end with an optimizer step
+            sync = (step + 1) % accumulation_steps == 0 or step + 1 == len(loader)
+            with contextlib.nullcontext() if sync else parallel_model.no_sync():
+                batch_loss = 0.
+                for attempt in range(6):
+                    labels = correct_word_labels[active]
+                    outputs = forward(parallel_model, features[active])
+                    guessed_letters = get_batch_word_beam_search(outputs.detach(), trie, k=3)
+
+                    batch_loss = batch_loss + loss_criterion(outputs.reshape(-1, 26), labels.reshape(-1)) / 5
+
+                    codes = get_paired_feedback(guessed_letters, labels)
+                    feedback = decode_batch_feedback(codes)
+                    features[active] = get_batch_updated_features(features[active], feedback, guessed_letters)
+
+                    active_words = [correct_words[idx] for idx in active.tolist()]
+                    recorder.record_batch(epoch, active_words, attempt, get_words_from_tensor(guessed_letters), codes)
+
+                    active = active[(codes != 242).cpu()]
+                    if not len(active):
+                        break
+
+                losses[epoch] += batch_loss.item()
+                (batch_loss / (len(correct_words) * accumulation_steps)).backward()
+
+            if sync:
+                optimizer.step()
+                optimizer.zero_grad()
+
+        epoch_loss = torch.tensor([losses[epoch]], dtype=torch.float64)
+        dist.all_reduce(epoch_loss)
+        losses[epoch] = epoch_loss.item()
+        recorder.flush()
+        if rank == 0:
+            end_epoch(model, optimizer, datasets['train'], trie, epoch, max_epochs, history, checkpoints, evaluator)
+
+    if rank == 0 and evaluator is not None:
+        apply_evaluations(evaluator.wait(), max_epochs, history, checkpoints)
+    return losses
+
+def get_free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _worker(rank : int, world_size : int, port : int, run_dir : str, config : dict, resume : dict) -> None:
+    dist.init_process_group("gloo", init_method=f"tcp://127.0.0.1:{port}", rank=rank, world_size=world_size)
+    try:
+        # one process per core, more threads per process only compete for the same cores
+        torch.set_num_threads(max(1, (os.cpu_count() or 1) // world_size))
+        configure("cpu", AUTOCAST_DTYPES.get(config['autocast']))
+        seed_everything(config['seed'])
+
+        datasets = get_split_dataset(get_dataset(config['wordlist']), config['splits'])
+        trie = get_compiled_dictionary(config['wordlist']).trie
+        model = FusedBaseModel(in_features=26 * 12)
+        if rank != 0:
+            train_distributed(model, datasets, trie, config['max_epochs'], config['eta'], config['batch_size'], config['accumulation_steps'], resume=resume, seed=config['seed'])
+            return
+        with Run(run_dir, config) as run, BackgroundEvaluator(datasets['train'], trie, config['eval_every']) if config['background_eval'] else contextlib.nullcontext() as evaluator:
+            losses = train_distributed(model, datasets, trie, config['max_epochs'], config['eta'], config['batch_size'], config['accumulation_steps'], recorder=run.recorder, checkpoints=run, resume=resume, evaluator=evaluator, seed=config['seed'])
+        run.save_losses(losses)
+    finally:
+        dist.destroy_process_group()
+
+def launch(run : Run, resume : dict = None) -> None:
+    """
+        Trains the run with train_distributed() on run.config['processes'] local CPU processes, and returns once they are all done.
+        The resume checkpoint is from run.load_checkpoint(), which is called first so that the interaction log is cut back
+        before rank 0 appends to it. Rank 0 writes the checkpoints, the interaction log and losses.npy of the run.
+    """
+    if not run.config['batch_size']:
+        raise ValueError("Distributed training is mini-batched, set a batch_size in the config of the run")
+    world_size = run.config['processes']
+    mp.spawn(_worker, args=(world_size, get_free_port(), run.directory, run.config, resume), nprocs=world_size, join=True)
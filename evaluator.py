@@ -0,0 +1,111 @@
+import queue
+import traceback
+import torch
+import torch.multiprocessing as mp
+import device
+from metrics import evaluate
+from models import FusedBaseModel
+
+def _evaluate_snapshots(requests, results, dataset, trie, k : int, autocast_dtype : torch.dtype) -> None:
+    """
+        The loop of the evaluator process, evaluates every snapshot of the requests queue until it gets None.
+    """
+    device.configure("cpu", autocast_dtype)
+    # the training process keeps the other cores
+    torch.set_num_threads(1)
+    model = None
+    while True:
+        request = requests.get()
+        if request is None:
+            return
+        epoch, in_features, state = request
+        try:
+            if model is None:
+                model = FusedBaseModel(in_features).eval()
+            model.load_state_dict(state)
+            acc, _, loss = evaluate(model, dataset, trie, k)
+            results.put((epoch, { 'accuracy': acc, 'val_loss': loss }))
+        except Exception:
+            results.put((epoch, traceback.format_exc()))
+
+class BackgroundEvaluator:
+    """
+        Evaluates snapshots of the weights of a model during training in a separate process, with metrics.evaluate().
+
+        submit() copies the weights into shared memory and returns right away, the evaluator process picks up the
+        snapshots in order. Training only pays for the copy, the results are collected with get_results() whenever
+        they are ready, and wait() blocks for the rest at the end of training.
+
+        Arguments:
+        `dataset`: The (word, label) pairs that are played, like datasets['train'].
+        `trie`: The PackedTrie used for the beam search, see trie.get_packed_trie().
+        `every`: The evaluation cadence, only every `every`-th epoch is evaluated (and the last one, see submit()).
+        `k`: The number of words to track in beam search.
+
+        Use it as a context manager, or call close() at the end.
+    """
+    def __init__(self, dataset, trie, every : int = 1, k : int = 3):
+        self.every = every
+        context = mp.get_context("spawn")
+        self.requests = context.Queue()
+        self.results = context.Queue()
+        dataset = [(word, label.cpu()) for word, label in dataset]
+        self.process = context.Process(target=_evaluate_snapshots, args=(self.requests, self.results, dataset, trie.to("cpu"), k, device.AUTOCAST_DTYPE), daemon=True)
+        self.process.start()
+        self.submitted = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def submit(self, epoch : int, model : torch.nn.Module, force : bool = False) -> bool:
+        """
+            Queues a snapshot of the model's weights to be evaluated, if the epoch is on the cadence or force is set.
+            Training goes on with the model right away, it does not change the snapshot.
+
+            Return:
+            `submitted`: Whether the epoch is evaluated.
+        """
+        if (epoch + 1) % self.every and not force:
+            return False
+        state = { name : tensor.detach().to("cpu", copy=True).share_memory_() for name, tensor in model.state_dict().items() }
+        self.requests.put((epoch, model.linear_layers[0].in_features, state))
+        self.submitted += 1
+        return True
+
+    def get_results(self, block : bool = False) -> list:
+        """
+            The (epoch, metrics) of the evaluations finished since the last call, metrics has 'accuracy' and 'val_loss' keys.
+            With block set, waits for at least one result unless none is outstanding.
+        """
+        results = []
+        while self.submitted:
+            try:
+                epoch, metrics = self.results.get(timeout=1.0) if block and not results else self.results.get_nowait()
+            except queue.Empty:
+                if not block or results:
+                    break
+                if not self.process.is_alive():
+                    raise RuntimeError(f"The evaluator process exited with code {self.process.exitcode}")
+                continue
+            self.submitted -= 1
+            if isinstance(metrics, str):
+                raise RuntimeError(f"Evaluating the snapshot of epoch {epoch} failed:\n{metrics}")
+            results.append((epoch, metrics))
+        return results
+
+    def wait(self) -> list:
+        """
+            Blocks until all the submitted snapshots are evaluated, and returns their results like get_results().
+        """
+        results = []
+        while self.submitted:
+            results += self.get_results(block=True)
+        return results
+
+    def close(self) -> None:
+        if self.process.is_alive():
+            self.requests.put(None)
+            self.process.join()
@@ -0,0 +1,79 @@
+import argparse
+import copy
+import torch
+from dictionary import get_compiled_dictionary
+from models import FusedBaseModel
+from trie import PackedTrie
+from utils import _get_beam_search_letters, _get_feedback_codes, get_batch_updated_features, load_model
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--model', default="models/100epoch_bigger_train_beam_3", dest='model_path', help="The trained model to export")
+parser.add_argument('--wordlist', default="data/official.txt", dest='wordlist_path', help="The word list that the beam search guesses from")
+parser.add_argument('-k', default=3, type=int, dest='k', help="The number of words to track in beam search")
+parser.add_argument('--output', default=None, dest='output_path', help="Where to write the artifact, by default the model path with a .pt suffix")
+
+class ExportedPlayer(torch.nn.Module):
+    """
+        A model and the packed trie of its word list in one TorchScript module, with the beam search fused into forward().
+        Once saved with export_player(), the artifact is loaded with a single torch.jit.load() call, without any
+        of the modules of this project, and without the trie or the model having to be rebuilt.
+
+        All the inputs and outputs are tensors, the words are offsets from 'a' just like get_words_tensor():
+        `player(features)`: The guessed letters of shape [B, 5] for features of shape [B, 26, 12].
+        `player.default_features(batch_size)`: The features at the start of a game, of shape [B, 26, 12].
+        `player.get_feedback(guessed_letters, answer_letters)`: The feedback of shape [B, 5] with entries from {-1, 0, 1}.
+        `player.update_features(features, feedback, guessed_letters)`: Updates the features in place and returns them.
+    """
+    def __init__(self, model : FusedBaseModel, trie : PackedTrie, k : int = 3):
+        super().__init__()
+        self.model = model
+        self.k = k
+        self.register_buffer('trie_children', trie.children.clone())
+        self.register_buffer('trie_valid', trie.valid.clone())
+
+    def forward(self, features : torch.Tensor) -> torch.Tensor:
+        outputs = self.model(features)
+        if outputs.dim() == 2:
+            outputs = outputs[None]
+        return _get_beam_search_letters(outputs, self.trie_children, self.trie_valid, self.k)
+
+    @torch.jit.export
+    def default_features(self, batch_size : int) -> torch.Tensor:
+        features = torch.zeros((batch_size, 26, 12), dtype=self.trie_valid.dtype, device=self.trie_valid.device)
+        features[:, :, 0] = 1
+        return features
+
+    @torch.jit.export
+    def get_feedback(self, guessed_letters : torch.Tensor, answer_letters : torch.Tensor) -> torch.Tensor:
+        codes = _get_feedback_codes(guessed_letters, answer_letters).long()
+        feedback = torch.empty(guessed_letters.shape, dtype=torch.long, device=guessed_letters.device)
+        for i in range(5):
+            feedback[..., i] = codes % 3 - 1
+            codes = torch.div(codes, 3, rounding_mode='floor')
+        return feedback
+
+    @torch.jit.export
+    def update_features(self, features : torch.Tensor, feedback : torch.Tensor, guessed_letters : torch.Tensor) -> torch.Tensor:
+        return get_batch_updated_features(features, feedback, guessed_letters)
+
+def export_player(model : torch.nn.Module, trie : PackedTrie, output_path : str, k : int = 3) -> torch.jit.ScriptModule:
+    """
+        Compiles the model and the trie to an ExportedPlayer and saves it at the output path.
+        The model is exported on CPU in float32 and in eval mode. BaseModels are converted to a FusedBaseModel first.
+
+        Return:
+        `player`: The compiled player, the same as torch.jit.load(output_path).
+    """
+    model = copy.deepcopy(model) if isinstance(model, FusedBaseModel) else FusedBaseModel.from_base_model(model)
+    player = ExportedPlayer(model.cpu().float(), trie.to("cpu"), k)
+    player.eval()
+    scripted = torch.jit.script(player)
+    scripted.save(output_path)
+    return scripted
+
+if __name__ == "__main__":
+    options = parser.parse_args()
+    output_path = options.output_path or f"{options.model_path}.pt"
+    model = load_model(options.model_path)
+    export_player(model, get_compiled_dictionary(options.wordlist_path).trie, output_path, options.k)
+    print(f"Exported {options.model_path} with k = {options.k} to {output_path}")
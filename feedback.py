@@ -0,0 +1,109 @@
+import os
+import numpy as np
+from utils import get_batch_feedback, get_wordlist
+
+FEEDBACK_MATRIX_PATH = "data/feedback_matrix.npy"
+FEEDBACK_VOCAB_PATH = "data/feedback_vocab.txt"
+WORDLIST_PATHS = ["data/official.txt", "data/words.txt"]
+
+# number of distinct feedback patterns, 3 ** 5
+PATTERN_COUNT = 243
+ALL_GREEN = PATTERN_COUNT - 1
+
+def encode_feedback(feedback : list) -> int:
+    """
+        Encodes a feedback list from get_feedback() as a base-3 integer in [0, 242].
+        Each entry from {-1, 0, 1} becomes the digit {0, 1, 2}, with the first character being the least significant digit.
+        An all green feedback is encoded as 242.
+
+        Arguments:
+        `feedback`: A list of 5 integers from {-1, 0, 1}. This comes from the output of get_feedback().
+    """
+    code = 0
+    for i, fb in enumerate(feedback):
+        code += (fb + 1) * 3 ** i
+    return code
+
+def decode_feedback(code : int) -> list:
+    """
+        Inverse of encode_feedback(), converts a base-3 integer back to a list of integers from {-1, 0, 1}.
+    """
+    code = int(code)
+    feedback = []
+    for _ in range(5):
+        feedback.append(code % 3 - 1)
+        code //= 3
+    return feedback
+
+def encode_words(words : list) -> np.ndarray:
+    """
+        Converts a list of 5 letter words to an array of shape [len(words), 5] holding the offset of every
+        character from 'a'.
+    """
+    if not words:
+        return np.empty((0, 5), dtype=np.uint8)
+    return np.frombuffer("".join(words).encode("ascii"), dtype=np.uint8).reshape(-1, 5) - ord('a')
+
+def get_vocabulary(wordlist_paths : list = WORDLIST_PATHS) -> list:
+    """
+        Returns the sorted union of the words in all the word lists at the given paths.
+    """
+    words = set()
+    for path in wordlist_paths:
+        words.update(get_wordlist(path))
+    return sorted(words)
+
+def build_feedback_matrix(words : list, matrix_path : str, chunk_size : int = 256) -> np.ndarray:
+    """
+        Computes the feedback for every (guess, answer) pair over the given words and writes it to matrix_path as
+        a .npy file of shape [len(words), len(words)] and dtype uint8. Rows are guesses, columns are answers.
+
+        The matrix is written in chunks through a memory map, so the full matrix never has to fit in memory.
+        It is written to a temporary file first and then renamed, so an interrupted build does not leave a corrupt matrix behind.
+    """
+    encoded = encode_words(words)
+    tmp_path = matrix_path + ".tmp"
+    matrix = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.uint8, shape=(len(words), len(words)))
+    for start in range(0, len(words), chunk_size):
+        end = min(start + chunk_size, len(words))
+        matrix[start:end] = get_batch_feedback(encoded[start:end], encoded)
+    matrix.flush()
+    del matrix
+    os.replace(tmp_path, matrix_path)
+    return np.load(matrix_path, mmap_mode="r")
+
+class FeedbackMatrix:
+    """
+        Precomputed feedback for every (guess, answer) pair over the vocabulary, encoded with encode_feedback().
+
+        The matrix is built once and saved under data/, later runs memory map it so it is never loaded into the heap.
+        At ~12.5k words the matrix is ~156MB of uint8.
+
+        Lookups:
+        `feedback_matrix.code(guess, answer)`: The encoded feedback for a single pair, in O(1).
+        `feedback_matrix.feedback(guess, answer)`: Same as get_feedback(guess, answer).
+        `feedback_matrix.row(guess)`: The encoded feedback of a guess against every word in the vocabulary.
+    """
+    def __init__(self, matrix_path : str = FEEDBACK_MATRIX_PATH, vocab_path : str = FEEDBACK_VOCAB_PATH, wordlist_paths : list = WORDLIST_PATHS):
+        self.words = get_vocabulary(wordlist_paths)
+        self.index = { word : i for i, word in enumerate(self.words) }
+
+        cached_words = get_wordlist(vocab_path) if os.path.exists(vocab_path) else None
+        if cached_words == self.words and os.path.exists(matrix_path):
+            self.matrix = np.load(matrix_path, mmap_mode="r")
+        else:
+            self.matrix = build_feedback_matrix(self.words, matrix_path)
+            with open(vocab_path, "w") as f:
+                f.write("\n".join(self.words))
+
+    def __len__(self):
+        return len(self.words)
+
+    def code(self, guessed_word : str, correct_word : str) -> int:
+        return int(self.matrix[self.index[guessed_word], self.index[correct_word]])
+
+    def feedback(self, guessed_word : str, correct_word : str) -> list:
+        return decode_feedback(self.code(guessed_word, correct_word))
+
+    def row(self, guessed_word : str) -> np.ndarray:
+        return self.matrix[self.index[guessed_word]]
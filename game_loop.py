@@ -1,29 +1,66 @@
-from torch import load
-from utils import get_default_features, get_feedback, get_mask_tree, get_word_beam_search, get_updated_features, get_wordset
+import argparse
+import torch
+from book import OpeningBook
+from cache import DecisionCache
+from candidates import get_candidate_index
+from dictionary import get_compiled_dictionary
+from device import AUTOCAST_DTYPES, configure, get_device
+from players import BookPlayer, ExportedModelPlayer, ModelPlayer
+from solver import EntropySolver
+from utils import get_feedback, get_wordset, load_model
 from visualize import get_colored_word
 
+parser = argparse.ArgumentParser()
+parser.add_argument('--player', default='model', choices=['model', 'exported', 'book', 'entropy'], dest='player', help="Play against the trained model, an artifact from export.py, a book from book.py or the entropy maximizing solver")
+parser.add_argument('--model', default="models/100epoch_bigger_train_beam_3", dest='model_path', help="The model to play against when --player is model, or the artifact when --player is exported")
+parser.add_argument('--book', default=None, dest='book_path', help="The book to play from when --player is book, positions outside of it are played by the model")
+parser.add_argument('-k', default=3, type=int, dest='k', help="The number of words to track in beam search")
+parser.add_argument('--candidates', default=False, dest='candidates', action='store_true', help="Only let the model guess words that are still consistent with the feedback")
+parser.add_argument('--device', default=None, dest='device', help="The device to run the model on, by default cuda:0 when available and cpu otherwise")
+parser.add_argument('--autocast', default=None, choices=list(AUTOCAST_DTYPES), dest='autocast', help="Run the model under autocast with this dtype, bfloat16 also works on CPU")
+parser.add_argument('--cache-size', default=65536, type=int, dest='cache_size', help="The number of model decisions to cache, 0 disables the cache")
+parser.add_argument('--quantize', default=False, dest='quantize', action='store_true', help="Run the model with dynamic int8 quantization, this always runs on CPU")
+
 if __name__ == "__main__":
+    options = parser.parse_args()
+    if options.player == 'book' and options.book_path is None:
+        parser.error("--player book needs a book, pass it with --book")
+    # the quantized kernels only run on CPU
+    configure("cpu" if options.quantize else options.device, AUTOCAST_DTYPES.get(options.autocast))
     word_set = get_wordset("data/official.txt")
-    model = load("models/100epoch_bigger_train_beam_3")
-    mask_tree = get_mask_tree("data/official.txt")
+    cache = None
+
+    if options.player == 'entropy':
+        player = EntropySolver()
+    elif options.player == 'exported':
+        player = ExportedModelPlayer(torch.jit.load(options.model_path))
+    else:
+        model = load_model(options.model_path, options.quantize).to(get_device())
+        model.eval()
+        candidate_index = get_candidate_index("data/official.txt") if options.candidates else None
+        cache = DecisionCache(options.cache_size) if options.cache_size else None
+        player = ModelPlayer(model, get_compiled_dictionary("data/official.txt").trie.to(get_device()), options.k, candidate_index, cache)
+        if options.player == 'book':
+            player = BookPlayer(OpeningBook.load(options.book_path), player)
     
     while True:
         correct_word = input("Choose word:")
         print("word in vocab: ", correct_word in word_set)
         if correct_word == "quit":
+            if cache is not None:
+                print("decision cache: ", cache.get_stats())
             break
         
-        features = get_default_features()
+        player.reset()
 
         for attempt in range(6):
-            outputs = model(features)
-            guessed_word = get_word_beam_search(outputs, mask_tree)
+            guessed_word = player.guess()
 
             feedback = get_feedback(guessed_word, correct_word)
-            features = get_updated_features(features, feedback, guessed_word)
+            player.update(guessed_word, feedback)
             
             colored_word = get_colored_word(guessed_word, feedback)
             print(colored_word)
 
             if guessed_word == correct_word:
-                break
\ No newline at end of file
+                break
@@ -0,0 +1,377 @@
+import json
+import os
+import shutil
+import struct
+import numpy as np
+from feedback import ALL_GREEN, decode_feedback, encode_feedback
+
+INTERACTIONS_MAGIC = b"WORDLEIL"
+INTERACTIONS_VERSION = 1
+# magic, version
+INTERACTIONS_HEADER = struct.Struct("<8sI")
+
+# One fixed size record per attempt, the feedback is base-3 encoded (see feedback.encode_feedback())
+RECORD_DTYPE = np.dtype([
+    ('epoch', '<u4'),
+    ('word', 'S5'),
+    ('attempt', 'u1'),
+    ('guessed_word', 'S5'),
+    ('feedback', 'u1'),
+])
+
+class InteractionRecorder:
+    """
+        Streams the interactions of training to an append-only binary log, one RECORD_DTYPE record per attempt.
+        The records are buffered and appended to the file every flush_every records, and on every call to flush().
+        A log that already exists is appended to, and a crash loses at most the records since the last flush.
+
+        Use it as a context manager, or call close() at the end:
+
+        with InteractionRecorder("interactions/history.log") as recorder:
+            recorder.record(epoch, correct_word, attempt, guessed_word, feedback)
+    """
+    def __init__(self, path : str, flush_every : int = 65536):
+        self.path = path
+        if os.path.exists(path) and os.path.getsize(path):
+            _check_header(path)
+            # drop a partly written record from a crash, so the appended records line up
+            records_size = os.path.getsize(path) - INTERACTIONS_HEADER.size
+            os.truncate(path, INTERACTIONS_HEADER.size + records_size - records_size % RECORD_DTYPE.itemsize)
+            self.file = open(path, "ab")
+        else:
+            self.file = open(path, "wb")
+            self.file.write(INTERACTIONS_HEADER.pack(INTERACTIONS_MAGIC, INTERACTIONS_VERSION))
+        self.buffer = np.zeros(flush_every, dtype=RECORD_DTYPE)
+        self.size = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def append(self, records : np.ndarray) -> None:
+        if self.size + len(records) > len(self.buffer):
+            self.flush()
+        if len(records) > len(self.buffer):
+            self.file.write(records.tobytes())
+            return
+        self.buffer[self.size:self.size + len(records)] = records
+        self.size += len(records)
+
+    def record(self, epoch : int, correct_word : str, attempt : int, guessed_word : str, feedback : list) -> None:
+        """
+            Records one attempt, the feedback is a list from get_feedback().
+        """
+        self.append(np.array([(epoch, correct_word, attempt, guessed_word, encode_feedback(feedback))], dtype=RECORD_DTYPE))
+
+    def record_batch(self, epoch : int, correct_words : list, attempt : int, guessed_words : list, codes) -> None:
+        """
+            Records the same attempt of a batch of games, the feedback is the base-3 encoded codes from get_paired_feedback().
+        """
+        self.append(get_batch_records(epoch, correct_words, attempt, guessed_words, codes))
+
+    def flush(self) -> None:
+        self.file.write(self.buffer[:self.size].tobytes())
+        self.file.flush()
+        self.size = 0
+
+    def close(self) -> None:
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+def get_batch_records(epoch : int, correct_words : list, attempt : int, guessed_words : list, codes) -> np.ndarray:
+    """
+        The RECORD_DTYPE records of the same attempt of a batch of games, see InteractionRecorder.record_batch().
+    """
+    records = np.zeros(len(correct_words), dtype=RECORD_DTYPE)
+    records['epoch'] = epoch
+    records['word'] = correct_words
+    records['attempt'] = attempt
+    records['guessed_word'] = guessed_words
+    records['feedback'] = np.asarray(codes.cpu() if hasattr(codes, 'cpu') else codes, dtype=np.uint8)
+    return records
+
+def _check_header(path : str) -> None:
+    with open(path, "rb") as f:
+        header = f.read(INTERACTIONS_HEADER.size)
+    if len(header) < INTERACTIONS_HEADER.size or INTERACTIONS_HEADER.unpack(header) != (INTERACTIONS_MAGIC, INTERACTIONS_VERSION):
+        raise ValueError(f"{path} is not a version {INTERACTIONS_VERSION} interaction log")
+
+def get_record_count(path : str) -> int:
+    """
+        The number of whole records in an interaction log.
+    """
+    return max(0, os.path.getsize(path) - INTERACTIONS_HEADER.size) // RECORD_DTYPE.itemsize
+
+def read_records(path : str, chunk_size : int = 1 << 20):
+    """
+        Streams the records of an interaction log, as RECORD_DTYPE arrays of up to chunk_size records.
+        A partly written record at the end of the log, from a crash in the middle of a write, is skipped.
+    """
+    _check_header(path)
+    with open(path, "rb") as f:
+        f.seek(INTERACTIONS_HEADER.size)
+        while True:
+            data = f.read(chunk_size * RECORD_DTYPE.itemsize)
+            count = len(data) // RECORD_DTYPE.itemsize
+            if not count:
+                break
+            yield np.frombuffer(data, dtype=RECORD_DTYPE, count=count)
+
+def get_turns(records : np.ndarray) -> dict:
+    """
+        Converts the records of one game to the turns of the interaction history, a dict from the attempt
+        to the 'feedback' and 'guessed_word' of that attempt. See visualize.get_colored_turn().
+    """
+    return {
+        int(record['attempt']) : {
+            'feedback': decode_feedback(int(record['feedback'])),
+            'guessed_word': record['guessed_word'].decode("ascii"),
+        }
+        for record in records
+    }
+
+def _group_games(records : np.ndarray, keys : np.ndarray):
+    """
+        Sorts the records by key, and then by attempt, and yields (key, turns) for every key in order.
+    """
+    order = np.lexsort((records['attempt'], keys))
+    records, keys = records[order], keys[order]
+    starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1]))) if len(keys) else []
+    ends = list(starts[1:]) + [len(keys)]
+    for start, end in zip(starts, ends):
+        yield keys[start], get_turns(records[start:end])
+
+def iter_epoch_turns(path : str, epoch : int):
+    """
+        Streams one epoch of an interaction log, yielding (correct_word, turns) for every word in the order it was played.
+        Only the records of that epoch are kept in memory.
+    """
+    records = [chunk[chunk['epoch'] == epoch] for chunk in read_records(path)]
+    records = np.concatenate(records) if records else np.zeros(0, dtype=RECORD_DTYPE)
+    words, first, inverse = np.unique(records['word'], return_index=True, return_inverse=True)
+    # the rank of every word by its first record, so the words come out in the order they were played
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    for word_rank, turns in _group_games(records, rank[inverse.reshape(-1)]):
+        yield words[order[word_rank]].decode("ascii"), turns
+
+def iter_word_turns(path : str, correct_word : str):
+    """
+        Streams the games of one word from an interaction log, yielding (epoch, turns) for every epoch it was played in.
+        Only the records of that word are kept in memory.
+    """
+    word = correct_word.encode("ascii")
+    records = [chunk[chunk['word'] == word] for chunk in read_records(path)]
+    records = np.concatenate(records) if records else np.zeros(0, dtype=RECORD_DTYPE)
+    for epoch, turns in _group_games(records, records['epoch']):
+        yield int(epoch), turns
+
+def convert_history(json_path : str, path : str) -> None:
+    """
+        Converts an interaction history saved as json by utils.save_history() to an interaction log.
+    """
+    with open(json_path, "r") as f:
+        history = json.load(f)
+    with InteractionRecorder(path) as recorder:
+        for epoch, one_epoch_interaction in history.items():
+            for correct_word, turns in one_epoch_interaction.items():
+                for attempt, turn in turns.items():
+                    recorder.record(int(epoch), correct_word, int(attempt), turn['guessed_word'], turn['feedback'])
+
+STORE_ARRAY_NAMES = [
+    "num_records", "words", "guesses", "epochs", "word_ids", "attempts", "guess_ids", "feedback",
+    "epoch_values", "epoch_offsets", "word_order", "word_offsets", "log_stat",
+]
+
+class InteractionStore:
+    """
+        A columnar copy of an interaction log with indexes by epoch and by word, for queries that only read the rows they need.
+        Build it with get_interaction_store(), the arrays are memory mapped .npy files.
+
+        The rows are sorted by epoch, then by game in the order they were played, then by attempt, with one column per field:
+        `epochs`, `attempts`, `feedback`: The fields of the records, see RECORD_DTYPE.
+        `word_ids`, `guess_ids`: Indices into `words` and `guesses`, the sorted distinct correct and guessed words of the log.
+
+        And the indexes:
+        `epoch_values`, `epoch_offsets`: The rows of epoch epoch_values[i] are epoch_offsets[i]:epoch_offsets[i + 1].
+        `word_order`, `word_offsets`: The rows of word i, sorted by epoch, are word_order[word_offsets[i]:word_offsets[i + 1]].
+        `log_stat`: The size and the modification time of the log that the store was built from, see get_log_stat().
+
+        When an epoch was recorded more than once, for example by a resumed run, only the last game of every word in it is kept.
+    """
+    def __init__(self, arrays : dict):
+        for name in STORE_ARRAY_NAMES:
+            setattr(self, name, arrays[name])
+        self.word_index = { word.decode("ascii") : i for i, word in enumerate(self.words) }
+
+    def __len__(self):
+        return len(self.epochs)
+
+    def get_epochs(self) -> list:
+        return self.epoch_values.tolist()
+
+    def get_epoch_rows(self, epoch : int) -> slice:
+        i = int(np.searchsorted(self.epoch_values, epoch))
+        if i == len(self.epoch_values) or self.epoch_values[i] != epoch:
+            return slice(0, 0)
+        return slice(int(self.epoch_offsets[i]), int(self.epoch_offsets[i + 1]))
+
+    def get_word_rows(self, correct_word : str) -> np.ndarray:
+        if correct_word not in self.word_index:
+            return np.zeros(0, dtype=np.int64)
+        i = self.word_index[correct_word]
+        return np.asarray(self.word_order[self.word_offsets[i]:self.word_offsets[i + 1]])
+
+    def get_turns(self, rows) -> dict:
+        """
+            The turns of the game at the rows, in the same format as the interaction history. See visualize.get_colored_turn().
+        """
+        return {
+            int(attempt) : {
+                'feedback': decode_feedback(int(code)),
+                'guessed_word': self.guesses[guess_id].decode("ascii"),
+            }
+            for attempt, code, guess_id in zip(self.attempts[rows], self.feedback[rows], self.guess_ids[rows])
+        }
+
+    def get_word_turns(self, correct_word : str) -> list:
+        """
+            All the games of the word, as a list of (epoch, turns) sorted by epoch.
+        """
+        rows = self.get_word_rows(correct_word)
+        epochs = np.asarray(self.epochs[rows])
+        starts = np.flatnonzero(np.concatenate(([True], epochs[1:] != epochs[:-1]))) if len(rows) else []
+        ends = list(starts[1:]) + [len(rows)]
+        return [(int(epochs[start]), self.get_turns(rows[start:end])) for start, end in zip(starts, ends)]
+
+    def _get_games(self, rows : slice) -> tuple:
+        """
+            The first row, the number of attempts and whether the word was guessed, for every game in the rows of one epoch.
+        """
+        word_ids = np.asarray(self.word_ids[rows])
+        starts = np.flatnonzero(np.concatenate(([True], word_ids[1:] != word_ids[:-1]))) if len(word_ids) else np.zeros(0, dtype=np.int64)
+        attempts = np.diff(np.append(starts, len(word_ids)))
+        solved = np.maximum.reduceat(np.asarray(self.feedback[rows]) == ALL_GREEN, starts) if len(starts) else np.zeros(0, dtype=bool)
+        return starts + rows.start, attempts, solved.astype(bool)
+
+    def get_epoch_turns(self, epoch : int) -> list:
+        """
+            All the games of the epoch, as a list of (correct_word, turns) in the order they were played.
+        """
+        starts, attempts, _ = self._get_games(self.get_epoch_rows(epoch))
+        return [
+            (self.words[self.word_ids[start]].decode("ascii"), self.get_turns(slice(start, start + count)))
+            for start, count in zip(starts.tolist(), attempts.tolist())
+        ]
+
+    def get_epoch_summary(self, epoch : int) -> dict:
+        """
+            The number of games of the epoch, how many were guessed, the accuracy in %, the average number of attempts
+            of the guessed words and the distribution of the attempts ({1..6: count, 'failed': count}).
+        """
+        _, attempts, solved = self._get_games(self.get_epoch_rows(epoch))
+        distribution = { i : int(count) for i, count in enumerate(np.bincount(attempts[solved], minlength=7)[1:7], start=1) }
+        distribution['failed'] = int((~solved).sum())
+        return {
+            'epoch': epoch,
+            'games': len(solved),
+            'solved': int(solved.sum()),
+            'accuracy': round(100. * solved.sum() / len(solved), 3) if len(solved) else 0,
+            'average': round(float(attempts[solved].mean()), 4) if solved.any() else 0,
+            'distribution': distribution,
+        }
+
+    def accuracy_on_output(self, epoch : int) -> float:
+        """
+            Same as visualize.accuracy_on_output() for the interactions of the epoch.
+        """
+        return self.get_epoch_summary(epoch)['accuracy']
+
+    def get_in_vocab(self, words_set : set, epoch : int = None) -> float:
+        """
+            Same as visualize.get_in_vocab(), the percentage of guesses that are in words_set, over one epoch or over the whole log.
+        """
+        rows = slice(0, len(self)) if epoch is None else self.get_epoch_rows(epoch)
+        in_vocab = np.array([guess.decode("ascii") in words_set for guess in self.guesses], dtype=bool)
+        guess_ids = np.asarray(self.guess_ids[rows])
+        return round(100. * in_vocab[guess_ids].mean(), 4) if len(guess_ids) else 0
+
+def build_interaction_store(log_path : str, store_dir : str) -> None:
+    """
+        Builds the InteractionStore of an interaction log and writes its arrays as .npy files to store_dir.
+        The arrays are written to a temporary directory that replaces store_dir at the end.
+    """
+    _check_header(log_path)
+    # before reading, so that a log that changes while the store is built is seen as changed afterwards
+    log_stat = get_log_stat(log_path)
+    num_records = get_record_count(log_path)
+    if num_records:
+        records = np.memmap(log_path, dtype=RECORD_DTYPE, mode="r", offset=INTERACTIONS_HEADER.size, shape=(num_records,))
+    else:
+        records = np.zeros(0, dtype=RECORD_DTYPE)
+    words, word_ids = np.unique(records['word'], return_inverse=True)
+    guesses, guess_ids = np.unique(records['guessed_word'], return_inverse=True)
+    word_ids, guess_ids = word_ids.reshape(-1).astype(np.uint32), guess_ids.reshape(-1).astype(np.uint32)
+    epochs, attempts = np.asarray(records['epoch']), np.asarray(records['attempt'])
+
+    # sorted by epoch and word, the records of a game stay in the order they were recorded
+    positions = np.arange(num_records)
+    order = np.lexsort((positions, word_ids, epochs))
+    if num_records:
+        # only keep the last game of every (epoch, word), from its last record with attempt 0 on
+        sorted_epochs, sorted_word_ids = epochs[order], word_ids[order]
+        new_game = np.concatenate(([True], (sorted_epochs[1:] != sorted_epochs[:-1]) | (sorted_word_ids[1:] != sorted_word_ids[:-1])))
+        last_start = np.maximum.reduceat(np.where(attempts[order] == 0, positions, -1), np.flatnonzero(new_game))
+        game_starts = last_start[np.cumsum(new_game) - 1]
+        kept = positions >= game_starts
+        # the games of an epoch are put back in the order they were played, by the position of their first record in the log
+        order, game_positions = order[kept], order[game_starts[kept]]
+        order = order[np.lexsort((order, game_positions, epochs[order]))]
+
+    arrays = {
+        "num_records": np.array([num_records], dtype=np.int64),
+        "words": words.astype("S5"),
+        "guesses": guesses.astype("S5"),
+        "epochs": epochs[order],
+        "word_ids": word_ids[order],
+        "attempts": attempts[order],
+        "guess_ids": guess_ids[order],
+        "feedback": np.asarray(records['feedback'])[order],
+    }
+    arrays["epoch_values"], epoch_starts = np.unique(arrays["epochs"], return_index=True)
+    arrays["epoch_offsets"] = np.append(epoch_starts, len(order)).astype(np.int64)
+    arrays["word_order"] = np.argsort(arrays["word_ids"], kind="stable").astype(np.uint32 if len(order) < 2 ** 32 else np.int64)
+    arrays["word_offsets"] = np.searchsorted(arrays["word_ids"][arrays["word_order"]], np.arange(len(words) + 1)).astype(np.int64)
+    arrays["log_stat"] = log_stat
+
+    tmp_dir = f"{store_dir}.tmp{os.getpid()}"
+    os.makedirs(tmp_dir, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_dir, f"{name}.npy"), array)
+    shutil.rmtree(store_dir, ignore_errors=True)
+    os.rename(tmp_dir, store_dir)
+
+def get_log_stat(log_path : str) -> np.ndarray:
+    """
+        The size and the modification time in ns of the log. A log that is cut back and appended to again,
+        like the log of a resumed runs.Run, can have the same size as before but not the same modification time.
+    """
+    stat = os.stat(log_path)
+    return np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+
+def get_interaction_store(log_path : str, store_dir : str = None) -> InteractionStore:
+    """
+        Returns the InteractionStore of an interaction log, by default stored next to it in {log_path}.store.
+        The store is rebuilt when the log has changed since it was built, otherwise the saved arrays are memory mapped.
+    """
+    store_dir = store_dir or f"{log_path}.store"
+    log_stat_path = os.path.join(store_dir, "log_stat.npy")
+    if not os.path.exists(log_stat_path) or not np.array_equal(np.load(log_stat_path), get_log_stat(log_path)):
+        build_interaction_store(log_path, store_dir)
+
+    arrays = { name : np.load(os.path.join(store_dir, f"{name}.npy"), mmap_mode="r") for name in STORE_ARRAY_NAMES }
+    return InteractionStore(arrays)
@@ -1,41 +1,119 @@
+import argparse
+import contextlib
+import os
+import time
 import torch
 from torch.optim import Adam
 from torch.nn import CrossEntropyLoss
+from torch.utils.data import DataLoader
 import numpy as np
-from metrics import accuracy, avg_loss
+from metrics import evaluate
 from utils import *
-from models import BaseModel
+from models import FusedBaseModel
+from dictionary import get_compiled_dictionary
+from device import AUTOCAST_DTYPES, configure, forward, get_device, get_model_device
+from interactions import InteractionRecorder
+from checkpoint import restore_checkpoint
+from evaluator import BackgroundEvaluator
+from runs import Run, get_config, seed_everything, set_rng_state
 
-device = "cuda:0" if torch.cuda.is_available else "cpu"
-print(f"Training models on {device}")
+def resume_training(resume, model, optimizer, history):
+    """
+        Restores the model, the optimizer and the per epoch history (losses, val_acc, val_loss) from a checkpoint
+        of checkpoint.load_checkpoint(), and returns the epoch to continue from. Without a checkpoint, training starts at epoch 0.
+        The random number generator states of a checkpoint from a runs.Run are restored as well.
+    """
+    if resume is None:
+        return 0
+    start_epoch = restore_checkpoint(resume, model, optimizer)
+    for name, values in history.items():
+        values[:start_epoch] = resume['extra']['history'][name][:start_epoch]
+    if 'rng' in resume['extra']:
+        set_rng_state(resume['extra']['rng'])
+    return start_epoch
 
-torch.manual_seed(2002)
-torch.autograd.set_detect_anomaly(True)
+def save_checkpoint(checkpoints, model, optimizer, epoch, history, evaluated=True, pending=False):
+    """
+        Queues a checkpoint of the epoch with checkpoints, a checkpoint.CheckpointManager or a runs.Run, when it is given.
+        The val_acc and val_loss of the epoch are only part of its metrics when it is evaluated, pending is set
+        when they come later from a background evaluation.
+    """
+    if checkpoints is None:
+        return
+    metrics = { 'loss': float(history['losses'][epoch]) }
+    if evaluated:
+        metrics.update({ 'accuracy': float(history['val_acc'][epoch]), 'val_loss': float(history['val_loss'][epoch]) })
+    extra = { 'history': { name : values[:epoch + 1].tolist() for name, values in history.items() } }
+    checkpoints.save(model, optimizer, epoch, metrics, extra, pending=pending)
 
-def train(model, datasets, mask_tree, max_epochs, eta):
+def apply_evaluations(results, max_epochs, history, checkpoints=None):
+    """
+        Fills in the val_acc and val_loss history of the (epoch, metrics) results of a BackgroundEvaluator,
+        and updates the metrics and the history of their checkpoints.
+    """
+    for epoch, metrics in results:
+        history['val_acc'][epoch] = metrics['accuracy']
+        history['val_loss'][epoch] = metrics['val_loss']
+        print(f"Epoch {epoch} / {max_epochs}, val_acc => {metrics['accuracy']}, val_loss => {metrics['val_loss']}")
+        if checkpoints is not None:
+            checkpoints.update_metrics(epoch, metrics, { 'val_acc': metrics['accuracy'], 'val_loss': metrics['val_loss'] })
+
+def end_epoch(model, optimizer, dataset, trie, epoch, max_epochs, history, checkpoints=None, evaluator=None):
+    """
+        Evaluates the model on the dataset at the end of an epoch, with a single pass of metrics.evaluate(), and checkpoints it.
+        With an evaluator.BackgroundEvaluator the model is only submitted for evaluation, and the results of
+        the evaluations that are done by now are applied.
+    """
+    model.eval()
+    if evaluator is None:
+        history['val_acc'][epoch], _, history['val_loss'][epoch] = evaluate(model, dataset, trie)
+        print(f"Epoch {epoch} / {max_epochs}, loss => {history['losses'][epoch]}, val_acc => {history['val_acc'][epoch]}, val_loss => {history['val_loss'][epoch]}")
+        save_checkpoint(checkpoints, model, optimizer, epoch, history)
+        return
+
+    pending = evaluator.submit(epoch, model, force=epoch + 1 == max_epochs)
+    print(f"Epoch {epoch} / {max_epochs}, loss => {history['losses'][epoch]}")
+    save_checkpoint(checkpoints, model, optimizer, epoch, history, evaluated=False, pending=pending)
+    apply_evaluations(evaluator.get_results(), max_epochs, history, checkpoints)
+
+def train(model, datasets, mask_tree, max_epochs, eta, recorder=None, checkpoints=None, resume=None, evaluator=None):
+    """
+        Trains the model one word at a time, with an optimizer step for every attempt.
+
+        Arguments:
+        `recorder`: An optional interactions.InteractionRecorder that every attempt is streamed to, it is flushed after every epoch.
+        `checkpoints`: An optional checkpoint.CheckpointManager that gets a checkpoint after every epoch, and keeps the best ones by val_acc.
+        A runs.Run can be given instead, to also snapshot the random number generator states.
+        `resume`: An optional checkpoint from checkpoint.load_checkpoint(), training continues after its epoch.
+        `evaluator`: An optional evaluator.BackgroundEvaluator that evaluates the model after the epochs of its cadence,
+        by default the model is evaluated after every epoch before training goes on.
+        Both use metrics.evaluate(), so the mask_tree needs to be the PackedTrie of trie.get_packed_trie().
+    """
     losses = np.zeros(max_epochs)
     val_acc = np.zeros(max_epochs)
     val_loss = np.zeros(max_epochs)
+    history = { 'losses': losses, 'val_acc': val_acc, 'val_loss': val_loss }
     word_count = len(datasets['train'])
-    max_val_acc = float('-inf')
 
     optimizer = Adam(model.parameters(), lr=eta)
     loss_criterion = CrossEntropyLoss()
-    interactions = { ep : { word : {} for word, label in datasets['train'] } for ep in range(max_epochs) }
+    device = get_model_device(model)
+    start_epoch = resume_training(resume, model, optimizer, history)
     
-    for epoch in range(max_epochs):
+    for epoch in range(start_epoch, max_epochs):
         i = 0
         model.train()
         
         for correct_word, correct_word_labels in datasets['train']:
-            features = get_default_features()
+            features = get_default_features(device)
+            correct_word_labels = correct_word_labels.to(device)
             i += 1
             print(f"Word: {correct_word} {i}/{word_count}", end='\r')
             
             for attempt in range(6):
                 optimizer.zero_grad()
 
-                outputs = model(features)
+                outputs = forward(model, features)
                 guessed_word = get_word_beam_search(outputs, mask_tree, k=3)
 
                 word_loss = loss_criterion(outputs, correct_word_labels)
@@ -48,33 +126,154 @@ def train(model, datasets, mask_tree, max_epochs, eta):
                 feedback = get_feedback(guessed_word, correct_word)
                 features = get_updated_features(features, feedback, guessed_word)
                 
-                interactions[epoch][correct_word][attempt] = {
-                    'feedback': feedback,
-                    'guessed_word': guessed_word
-                }
+                if recorder is not None:
+                    recorder.record(epoch, correct_word, attempt, guessed_word, feedback)
 
                 if guessed_word == correct_word:
                     break
-        
-        model.eval()
-        val_acc[epoch], _ = accuracy(model, datasets['train'], mask_tree)
-        val_loss[epoch] = avg_loss(model, datasets['train'], mask_tree)
-        print(f"Epoch {epoch} / {max_epochs}, loss => {losses[epoch]}, val_acc => {val_acc[epoch]}, val_loss => {val_loss[epoch]}")
-
-        if val_acc[epoch] > max_val_acc:
-            save_model(model, "100epoch_bigger_full")
-            max_val_acc = val_acc[epoch]
-    
-    return losses, interactions
+
+        if recorder is not None:
+            recorder.flush()
+        end_epoch(model, optimizer, datasets['train'], mask_tree, epoch, max_epochs, history, checkpoints, evaluator)
+
+    if evaluator is not None:
+        apply_evaluations(evaluator.wait(), max_epochs, history, checkpoints)
+    return losses
+
+def train_batched(model, datasets, trie, max_epochs, eta, batch_size=64, accumulation_steps=1, recorder=None, checkpoints=None, resume=None, evaluator=None):
+    """
+        Mini-batched version of train(). Rather than taking an optimizer step for every attempt of every word,
+        a batch of games is played in lock step. Each attempt round is one forward pass over the (features, label)
+        pairs of the games still being played in the batch, and the losses of all the rounds are summed up
+        for a single optimizer step per batch.
+
+        Arguments:
+        `trie`: The PackedTrie used for the beam search, see trie.get_packed_trie().
+        `batch_size`: The number of games that are played together.
+        `accumulation_steps`: The number of batches over which the gradients are accumulated before an optimizer step.
+        `recorder`: An optional interactions.InteractionRecorder that every attempt is streamed to, it is flushed after every epoch.
+        `checkpoints`, `resume`, `evaluator`: Same as for train().
+    """
+    losses = np.zeros(max_epochs)
+    val_acc = np.zeros(max_epochs)
+    val_loss = np.zeros(max_epochs)
+    history = { 'losses': losses, 'val_acc': val_acc, 'val_loss': val_loss }
+    word_count = len(datasets['train'])
+
+    optimizer = Adam(model.parameters(), lr=eta)
+    # summed over the 5 characters, divided by 5 below to match the per-word loss of train()
+    loss_criterion = CrossEntropyLoss(reduction='sum')
+    loader = DataLoader(datasets['train'], batch_size=batch_size, shuffle=True)
+    device = get_model_device(model)
+    trie = trie.to(device)
+    start_epoch = resume_training(resume, model, optimizer, history)
+
+    for epoch in range(start_epoch, max_epochs):
+        i = 0
+        model.train()
+        optimizer.zero_grad()
+
+        for step, (correct_words, correct_word_labels) in enumerate(loader):
+            correct_word_labels = correct_word_labels.to(device)
+            features = get_batch_default_features(len(correct_words), device)
+            active = torch.arange(len(correct_words))
+            i += len(correct_words)
+            print(f"Words: {i}/{word_count}", end='\r')
+
+            batch_loss = 0.
+            for attempt in range(6):
+                labels = correct_word_labels[active]
+                outputs = forward(model, features[active])
+                guessed_letters = get_batch_word_beam_search(outputs.detach(), trie, k=3)
+
+                batch_loss = batch_loss + loss_criterion(outputs.reshape(-1, 26), labels.reshape(-1)) / 5
+
+                codes = get_paired_feedback(guessed_letters, labels)
+                feedback = decode_batch_feedback(codes)
+                features[active] = get_batch_updated_features(features[active], feedback, guessed_letters)
+
+                if recorder is not None:
+                    active_words = [correct_words[idx] for idx in active.tolist()]
+                    recorder.record_batch(epoch, active_words, attempt, get_words_from_tensor(guessed_letters), codes)
+
+                active = active[(codes != 242).cpu()]
+                if not len(active):
+                    break
+
+            losses[epoch] += batch_loss.item()
+            (batch_loss / (len(correct_words) * accumulation_steps)).backward()
+
+            if (step + 1) % accumulation_steps == 0 or step + 1 == len(loader):
+                optimizer.step()
+                optimizer.zero_grad()
+
+        if recorder is not None:
+            recorder.flush()
+        end_epoch(model, optimizer, datasets['train'], trie, epoch, max_epochs, history, checkpoints, evaluator)
+
+    if evaluator is not None:
+        apply_evaluations(evaluator.wait(), max_epochs, history, checkpoints)
+    return losses
 
 if __name__ == "__main__":
-    splits = [1.0, 0, 0]
-    mask_tree = get_mask_tree("data/official.txt")
-    dataset = get_dataset("data/official.txt")
-    datasets = get_split_dataset(dataset, splits)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--run', default=None, dest='run_dir', help="The directory of a new run, with its config, checkpoints, interaction log and losses, by default runs/<date>-<time>")
+    parser.add_argument('--config', default=None, dest='config_path', help="A json file with the config of a new run, the missing keys come from runs.DEFAULT_CONFIG")
+    parser.add_argument('--resume', default=None, dest='resume_dir', help="The directory of a run to continue from its last checkpoint, with the config of the run")
+    parser.add_argument('--resume-from', default=None, dest='resume_from', help="With --resume, a checkpoint of the run to continue from instead, for example runs/RUN/checkpoints/epoch00042.pt")
+    parser.add_argument('--batch-size', default=None, type=int, dest='batch_size', help="Train on mini-batches of games of this size, by default the model is trained one word at a time")
+    parser.add_argument('--accumulation-steps', default=None, type=int, dest='accumulation_steps', help="The number of mini-batches to accumulate gradients over before each optimizer step")
+    parser.add_argument('--epochs', default=None, type=int, dest='max_epochs', help="The number of epochs of a new run")
+    parser.add_argument('--processes', default=None, type=int, dest='processes', help="Train a new run on this many local CPU processes with torch.distributed, one per core, it needs --batch-size")
+    parser.add_argument('--background-eval', default=None, type=int, dest='eval_every', help="Evaluate a new run in a background process every this many epochs, rather than after every epoch before training goes on")
+    parser.add_argument('--autocast', default=None, choices=list(AUTOCAST_DTYPES), dest='autocast', help="Run the model under autocast with this dtype, bfloat16 also works on CPU")
+    parser.add_argument('--detect-anomaly', default=False, dest='detect_anomaly', action='store_true', help="Turn on autograd anomaly detection, this slows down training a lot")
+    parser.add_argument('--device', default=None, dest='device', help="The device to train on, by default cuda:0 when available and cpu otherwise. Continue a run on the same device to get the same results")
+    options = parser.parse_args()
+
+    # the options of a new run go in its config, a run that is continued keeps its own config
+    if options.resume_dir:
+        run = Run.load(options.resume_dir)
+    else:
+        overrides = { 'batch_size': options.batch_size, 'accumulation_steps': options.accumulation_steps, 'max_epochs': options.max_epochs, 'autocast': options.autocast, 'processes': options.processes }
+        if options.eval_every:
+            overrides.update({ 'background_eval': True, 'eval_every': options.eval_every })
+        run = Run.create(options.run_dir or os.path.join("runs", time.strftime("%Y%m%d-%H%M%S")), get_config(options.config_path, overrides))
+    config = run.config
+
+    torch.autograd.set_detect_anomaly(options.detect_anomaly)
+    configure(options.device, AUTOCAST_DTYPES.get(config['autocast']))
+    print(f"Training models on {get_device()}, run {run.directory}")
+    seed_everything(config['seed'])
+
+    dataset = get_dataset(config['wordlist'])
+    datasets = get_split_dataset(dataset, config['splits'])
+
+    # get_word_beam_search() also takes the packed trie in place of the mask tree
+    trie = get_compiled_dictionary(config['wordlist']).trie.to(get_device())
 
-    b1 = BaseModel(in_features=26 * 12)
-    b1_loss, interaction_history = train(b1, datasets, mask_tree, max_epochs=100, eta=0.00005)
+    b1 = FusedBaseModel(in_features=26 * 12).to(get_device())
+    # cuts the interaction log back to the checkpoint, the random number generator states are restored by resume_training()
+    resume = run.load_checkpoint(options.resume_from) if options.resume_dir else None
+    if config['processes'] > 1:
+        # imported here, distributed.py imports this module
+        from distributed import launch
+        print(f"Training on {config['processes']} CPU processes")
+        launch(run, resume)
+        # the checkpoints were written by rank 0
+        run = Run.load(run.directory)
+    else:
+        # the interactions are streamed to the log while training, read it back with the functions of interactions.py
+        with run, BackgroundEvaluator(datasets['train'], trie, config['eval_every']) if config['background_eval'] else contextlib.nullcontext() as evaluator:
+            if config['batch_size']:
+                b1_loss = train_batched(b1, datasets, trie, config['max_epochs'], config['eta'], batch_size=config['batch_size'], accumulation_steps=config['accumulation_steps'], recorder=run.recorder, checkpoints=run, resume=resume, evaluator=evaluator)
+            else:
+                b1_loss = train(b1, datasets, trie, config['max_epochs'], config['eta'], recorder=run.recorder, checkpoints=run, resume=resume, evaluator=evaluator)
+        run.save_losses(b1_loss)
 
-    save_history(interaction_history, "final_interaction_history.json")
-    save_loss(b1_loss, "100epoch_bigger_full.npy")
\ No newline at end of file
+    best = run.checkpoints.get_best()
+    # the checkpoints only have metrics to rank them by once an epoch is evaluated
+    if best is not None:
+        print(f"Best checkpoint: {run.checkpoints.get_path(best)}")
+    else:
+        print("Best checkpoint: none, no epoch was evaluated")
@@ -1,18 +1,27 @@
+import numpy as np
+import torch
 from torch.nn import CrossEntropyLoss
-from utils import get_default_features, get_feedback, get_mask_tree, get_updated_features, get_word_beam_search
+from cache import DecisionCache
+from device import forward, get_model_device
+from players import play_game
+from utils import decode_batch_feedback, get_batch_default_features, get_batch_updated_features, get_batch_word_beam_search, get_default_features, get_feedback, get_mask_tree, get_paired_feedback, get_updated_features, get_word_beam_search, get_words_from_tensor, get_words_tensor
 
 
-def accuracy(model, dataset, mask_tree):
+def accuracy(model, dataset, mask_tree, cache=None):
+    """
+        Plays every word of the dataset with the model and returns the accuracy in % and the number of attempts for every guessed word.
+        The model's decisions go through the DecisionCache, a new one unless a cache is given to share it between calls.
+    """
     acc = 0.
     count = 0.
     attempt_count = {}
+    device = get_model_device(model)
+    cache = DecisionCache() if cache is None else cache
     for correct_word, label in dataset:
-        features = get_default_features()
+        features = get_default_features(device)
 
         for attempt in range(6):
-            output = model(features)
-
-            guessed_word = get_word_beam_search(output, mask_tree)
+            guessed_word = cache.get_word(model, features, mask_tree)
             
             if guessed_word == correct_word:
                 acc += 1
@@ -30,12 +39,13 @@ def accuracy(model, dataset, mask_tree):
 def avg_loss(model, dataset, mask_tree):
     loss_fn = CrossEntropyLoss()
     loss = 0.
+    device = get_model_device(model)
     for correct_word, label in dataset:
-        features = get_default_features()
+        features = get_default_features(device)
         
         for attempt in range(6):
-            outputs = model(features)
-            loss += loss_fn(outputs, label)
+            outputs = forward(model, features)
+            loss += loss_fn(outputs, label.to(device))
 
             guessed_word = get_word_beam_search(outputs, mask_tree)
             feedback = get_feedback(guessed_word, correct_word)
@@ -44,4 +54,256 @@ def avg_loss(model, dataset, mask_tree):
             if guessed_word == correct_word:
                 break
         
-    return loss
\ No newline at end of file
+    return loss
+
+def get_candidate_letters(candidate_index, outputs, live, guessed_letters):
+    """
+        Replaces the guesses of the beam search with the most likely live candidate of each game,
+        games without any live candidate keep the guess of the beam search.
+    """
+    candidate_words = candidate_index.get_best_words(outputs, live)
+    if None in candidate_words:
+        beam_words = get_words_from_tensor(guessed_letters)
+        candidate_words = [c if c is not None else b for c, b in zip(candidate_words, beam_words)]
+    return get_words_tensor(candidate_words).to(outputs.device)
+
+def batch_accuracy(model, dataset, trie, k=3, batch_size=None, candidate_index=None):
+    """
+        Batched version of accuracy(), gives the same results when no candidate_index is given.
+        Rather than playing one word at a time, all the games are played in lock step. Each attempt round
+        does a single forward pass and beam search over the features of all the games still being played,
+        games that guessed the word are dropped from the batch.
+
+        Arguments:
+        `trie`: The PackedTrie used for the beam search, see trie.get_packed_trie().
+        `batch_size`: The number of games to play together, by default all the words in the dataset.
+        `candidate_index`: An optional candidates.CandidateIndex, when given the guesses are restricted to the words
+        that are still consistent with the feedback of each game, see players.ModelPlayer.
+    """
+    device = get_model_device(model)
+    trie = trie.to(device)
+    words = [word for word, label in dataset]
+    all_labels = torch.stack([label for word, label in dataset]).to(device) if words else None
+    batch_size = batch_size or max(len(words), 1)
+    solved = {}
+
+    with torch.no_grad():
+        for start in range(0, len(words), batch_size):
+            batch_words = words[start:start + batch_size]
+            labels = all_labels[start:start + batch_size]
+            features = get_batch_default_features(len(batch_words), device)
+            active = torch.arange(len(batch_words))
+            if candidate_index is not None:
+                live = np.tile(candidate_index.all(), (len(batch_words), 1))
+
+            for attempt in range(6):
+                outputs = forward(model, features[active])
+                guessed_letters = get_batch_word_beam_search(outputs, trie, k)
+                if candidate_index is not None:
+                    guessed_letters = get_candidate_letters(candidate_index, outputs, live[active.numpy()], guessed_letters)
+                codes = get_paired_feedback(guessed_letters, labels[active])
+                feedback = decode_batch_feedback(codes)
+
+                correct = (codes == 242).cpu()
+                for idx in active[correct].tolist():
+                    solved[batch_words[idx]] = 1 + attempt
+
+                if candidate_index is not None:
+                    for idx, guessed_word, word_feedback in zip(active.tolist(), get_words_from_tensor(guessed_letters), feedback.tolist()):
+                        live[idx] = candidate_index.update(live[idx], word_feedback, guessed_word)
+
+                features[active] = get_batch_updated_features(features[active], feedback, guessed_letters)
+                active = active[~correct]
+                if not len(active):
+                    break
+
+    attempt_count = { word : solved[word] for word in words if word in solved }
+    acc = 100 * len(attempt_count) / len(words)
+    acc = round(acc, 4)
+    return acc, attempt_count
+
+def batch_avg_loss(model, dataset, trie, k=3, batch_size=None):
+    """
+        Batched version of avg_loss(), plays all the games in lock step just like batch_accuracy().
+        Returns the summed loss over all attempts of all the words as a float.
+    """
+    loss_fn = CrossEntropyLoss(reduction='none')
+    device = get_model_device(model)
+    trie = trie.to(device)
+    words = [word for word, label in dataset]
+    all_labels = torch.stack([label for word, label in dataset]).to(device) if words else None
+    batch_size = batch_size or max(len(words), 1)
+    loss = 0.
+
+    with torch.no_grad():
+        for start in range(0, len(words), batch_size):
+            labels = all_labels[start:start + batch_size]
+            features = get_batch_default_features(len(labels), device)
+            active = torch.arange(len(labels))
+
+            for attempt in range(6):
+                outputs = forward(model, features[active])
+                # loss_fn(outputs, label) in avg_loss() is the mean over the 5 characters of one word,
+                # summed in float64 so that it does not depend on the order of the sum, as in play_games()
+                loss += loss_fn(outputs.reshape(-1, 26), labels[active].reshape(-1)).double().sum().item() / 5
+
+                guessed_letters = get_batch_word_beam_search(outputs, trie, k)
+                codes = get_paired_feedback(guessed_letters, labels[active])
+                features[active] = get_batch_updated_features(features[active], decode_batch_feedback(codes), guessed_letters)
+
+                active = active[(codes != 242).cpu()]
+                if not len(active):
+                    break
+
+    return loss
+
+def play_games(model, datasets, trie, k=3, batch_size=None):
+    """
+        Plays every word of every dataset once with the model and beam search, without gradients. The games of all the
+        datasets are played together in lock step, every attempt round does one forward pass and one beam search over
+        the games still being played, which gives both the guesses and the loss.
+
+        Arguments:
+        `datasets`: A dict of datasets of (word, label) pairs, like the one from get_split_dataset().
+        `trie`: The PackedTrie used for the beam search, see trie.get_packed_trie().
+        `batch_size`: The number of games to play together, by default all of them.
+
+        Yields (name, correct_word, turns, loss) as each game ends, with the name of its dataset, the turns as a list of dicts
+        with 'guessed_word' and 'feedback' keys, and the loss summed over its attempts as in avg_loss().
+    """
+    loss_fn = CrossEntropyLoss(reduction='none')
+    device = get_model_device(model)
+    trie = trie.to(device)
+    games = [(name, word, label) for name, dataset in datasets.items() for word, label in dataset]
+    batch_size = batch_size or max(len(games), 1)
+
+    with torch.no_grad():
+        for start in range(0, len(games), batch_size):
+            batch = games[start:start + batch_size]
+            labels = torch.stack([label for name, word, label in batch]).to(device)
+            features = get_batch_default_features(len(batch), device)
+            active = torch.arange(len(batch))
+            turns = [[] for game in batch]
+            losses = torch.zeros(len(batch), dtype=torch.float64)
+
+            for attempt in range(6):
+                outputs = forward(model, features[active])
+                # the mean over the 5 characters of every word, like loss_fn(outputs, label) in avg_loss(), in float64 like batch_avg_loss()
+                losses[active] += loss_fn(outputs.reshape(-1, 26), labels[active].reshape(-1)).double().reshape(-1, 5).sum(1).cpu() / 5
+
+                guessed_letters = get_batch_word_beam_search(outputs, trie, k)
+                codes = get_paired_feedback(guessed_letters, labels[active])
+                feedback = decode_batch_feedback(codes)
+                for idx, guessed_word, word_feedback in zip(active.tolist(), get_words_from_tensor(guessed_letters), feedback.tolist()):
+                    turns[idx].append({ 'feedback': word_feedback, 'guessed_word': guessed_word })
+
+                features[active] = get_batch_updated_features(features[active], feedback, guessed_letters)
+                done = (codes == 242).cpu() if attempt < 5 else torch.ones(len(active), dtype=torch.bool)
+                for idx in active[done].tolist():
+                    yield batch[idx][0], batch[idx][1], turns[idx], losses[idx].item()
+                active = active[~done]
+                if not len(active):
+                    break
+
+class GameMetrics:
+    """
+        The statistics of a stream of games, every game is add()-ed as it ends and never needs to be played again.
+
+        Arguments:
+        `words_set`: The vocabulary that the in vocab rate of the guesses is measured against, see visualize.get_in_vocab().
+        `max_attempts`: The number of attempts of a game, unsolved games are counted as max_attempts + 1 in the histogram.
+    """
+    def __init__(self, words_set : set, max_attempts : int = 6):
+        self.words_set = words_set
+        self.max_attempts = max_attempts
+        self.histogram = { attempts : 0 for attempts in range(1, max_attempts + 2) }
+        self.results = {}
+        self.loss = 0.
+        self.num_attempts = 0
+        self.num_in_vocab = 0
+
+    def add(self, correct_word : str, turns : list, loss : float) -> None:
+        solved = turns[-1]['guessed_word'] == correct_word
+        self.histogram[len(turns) if solved else self.max_attempts + 1] += 1
+        self.results[correct_word] = dict(enumerate(turns))
+        self.loss += loss
+        self.num_attempts += len(turns)
+        self.num_in_vocab += sum(turn['guessed_word'] in self.words_set for turn in turns)
+
+    def get_metrics(self) -> dict:
+        """
+            Return:
+            `metrics`: A dict with
+            'num_words': The number of games.
+            'accuracy': The % of solved games, as in accuracy().
+            'loss': The loss summed over all the attempts of all the games, as in avg_loss(), and 'mean_loss' per attempt.
+            'histogram': The number of games solved in every number of attempts, max_attempts + 1 for the unsolved ones.
+            'mean_attempts': The mean number of attempts of the solved games.
+            'in_vocab': The % of guesses that are in words_set.
+            'attempt_count': The number of attempts of every solved word, as in accuracy().
+            'results': The turns of every word, as in visualize.accuracy_on_dataset().
+        """
+        num_words = len(self.results)
+        num_solved = num_words - self.histogram[self.max_attempts + 1]
+        return {
+            'num_words': num_words,
+            'accuracy': round(100 * num_solved / num_words, 4) if num_words else 0,
+            'loss': self.loss,
+            'mean_loss': self.loss / self.num_attempts if self.num_attempts else 0,
+            'histogram': dict(self.histogram),
+            'mean_attempts': round(sum(attempts * count for attempts, count in self.histogram.items() if attempts <= self.max_attempts) / num_solved, 4) if num_solved else 0,
+            'in_vocab': round(100 * self.num_in_vocab / self.num_attempts, 4) if self.num_attempts else 0,
+            'attempt_count': { word : len(turns) for word, turns in self.results.items() if turns[len(turns) - 1]['guessed_word'] == word },
+            'results': self.results,
+        }
+
+def get_metrics(model, datasets, trie, k=3, batch_size=None, words_set=None):
+    """
+        All the metrics of the model on every dataset, from a single pass of play_games() over all of them together.
+
+        Arguments:
+        `datasets`: A dict of datasets of (word, label) pairs, like the one from get_split_dataset().
+        `words_set`: The vocabulary for the in vocab rate, by default all the words of the datasets.
+
+        Return:
+        `metrics`: A dict with the GameMetrics.get_metrics() of every dataset, by the same names. The words of
+        'attempt_count' and 'results' are in the order of the dataset.
+    """
+    if words_set is None:
+        words_set = { word for dataset in datasets.values() for word, label in dataset }
+    game_metrics = { name : GameMetrics(words_set) for name in datasets }
+    for name in datasets:
+        game_metrics[name].results = { word : None for word, label in datasets[name] }
+    for name, correct_word, turns, loss in play_games(model, datasets, trie, k, batch_size):
+        game_metrics[name].add(correct_word, turns, loss)
+    return { name : metrics.get_metrics() for name, metrics in game_metrics.items() }
+
+def evaluate(model, dataset, trie, k=3, batch_size=None):
+    """
+        batch_accuracy() and batch_avg_loss() in a single pass over the games, without gradients, see get_metrics().
+
+        Return:
+        `acc`, `attempt_count`: The same as batch_accuracy().
+        `loss`: The same as batch_avg_loss().
+    """
+    metrics = get_metrics(model, { 'dataset': dataset }, trie, k, batch_size)['dataset']
+    return metrics['accuracy'], metrics['attempt_count'], metrics['loss']
+
+def player_accuracy(player, dataset):
+    """
+        Same as accuracy(), but for any player with reset() / guess() / update() methods,
+        like players.ModelPlayer or solver.EntropySolver.
+    """
+    acc = 0.
+    count = 0.
+    attempt_count = {}
+    for correct_word, label in dataset:
+        turns = play_game(player, correct_word)
+        if turns[-1]['guessed_word'] == correct_word:
+            acc += 1
+            attempt_count[correct_word] = len(turns)
+        count += 1
+
+    acc = 100 * acc / count
+    acc = round(acc, 4)
+    return acc, attempt_count
\ No newline at end of file
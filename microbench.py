@@ -0,0 +1,153 @@
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+import torch
+from dataset import WordleDataset
+from models import BaseModel, FusedBaseModel
+from utils import get_default_features, get_feedback, get_mask_tree, get_updated_features, get_word, get_word_beam_search, get_wordlist
+
+BASELINE_PATH = "benchmarks/microbench_baseline.json"
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--save', default=False, dest='save', action='store_true', help="Save the results as the new baseline instead of comparing against it")
+parser.add_argument('--baseline', default=BASELINE_PATH, dest='baseline', help="The baseline json file")
+parser.add_argument('--threshold', default=0.25, type=float, dest='threshold', help="Fail when a benchmark is slower, or allocates more, than the baseline by more than this fraction")
+parser.add_argument('--filter', default='', dest='filter', help="Only run the benchmarks whose name contains this string")
+parser.add_argument('--rounds', default=5, type=int, dest='rounds', help="The number of timed rounds, the median round is reported")
+parser.add_argument('--min-time', default=0.2, type=float, dest='min_time', help="The minimum duration of a timed round in seconds")
+
+def get_benchmarks() -> dict:
+    """
+        Returns the benchmarks as a dict from name to a function without arguments that runs one call.
+        All the inputs are created up front from fixed seeds, so every run times the same work.
+    """
+    random.seed(2002)
+    torch.manual_seed(2002)
+
+    words = get_wordlist("data/official.txt")
+    pairs = [(random.choice(words), random.choice(words)) for _ in range(64)]
+    mask_tree = get_mask_tree("data/official.txt")
+    model = BaseModel(in_features=26 * 12)
+    model.eval()
+    fused_model = FusedBaseModel.from_base_model(model)
+    fused_model.eval()
+
+    features = get_default_features()
+    guessed_word, correct_word = pairs[0]
+    feedback = get_feedback(guessed_word, correct_word)
+    outputs = torch.randn((5, 26))
+    pair_iter = iter(range(sys.maxsize))
+
+    def feedback_call():
+        guessed_word, correct_word = pairs[next(pair_iter) % len(pairs)]
+        get_feedback(guessed_word, correct_word)
+
+    def forward_call():
+        with torch.no_grad():
+            model(features)
+
+    def fused_forward_call():
+        with torch.no_grad():
+            fused_model(features)
+
+    benchmarks = {
+        'get_feedback': feedback_call,
+        'get_updated_features': lambda: get_updated_features(features.clone(), feedback, guessed_word),
+        'get_word': lambda: get_word(outputs),
+        'get_mask_tree': lambda: get_mask_tree("data/official.txt"),
+        'WordleDataset': lambda: WordleDataset("data/official.txt"),
+        'BaseModel.forward': forward_call,
+        'FusedBaseModel.forward': fused_forward_call,
+    }
+    for k in [1, 3, 5, 10]:
+        benchmarks[f'get_word_beam_search[k={k}]'] = lambda k=k: get_word_beam_search(outputs, mask_tree, k)
+    return benchmarks
+
+def time_benchmark(function, rounds : int, min_time : float) -> float:
+    """
+        Returns the median number of calls per second over the rounds. The number of calls per round is
+        calibrated so that each round lasts at least min_time.
+    """
+    function()
+    calls = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(calls):
+            function()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        calls *= 2
+
+    ops = [calls / elapsed]
+    for _ in range(rounds - 1):
+        start = time.perf_counter()
+        for _ in range(calls):
+            function()
+        ops.append(calls / (time.perf_counter() - start))
+    return statistics.median(ops)
+
+def measure_allocations(function, calls : int = 10) -> float:
+    """
+        Returns the median number of bytes allocated on the Python heap by one call, measured as the peak
+        traced by tracemalloc during the call. Memory allocated by torch outside of the Python allocator is not counted.
+    """
+    tracemalloc.start()
+    allocated = []
+    for _ in range(calls):
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        function()
+        allocated.append(tracemalloc.get_traced_memory()[1] - current)
+    tracemalloc.stop()
+    return statistics.median(allocated)
+
+def run_benchmarks(name_filter : str, rounds : int, min_time : float) -> dict:
+    results = {}
+    for name, function in get_benchmarks().items():
+        if name_filter not in name:
+            continue
+        results[name] = {
+            'ops_per_second': round(time_benchmark(function, rounds, min_time), 2),
+            'bytes_per_call': measure_allocations(function),
+        }
+        print(f"{name:32} {results[name]['ops_per_second']:>14.2f} ops/s {results[name]['bytes_per_call']:>12} bytes/call")
+    return results
+
+def get_regressions(results : dict, baseline : dict, threshold : float) -> list:
+    """
+        Compares the results with the baseline and returns a message for every benchmark that got slower,
+        or allocates more, by more than the threshold.
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        expected = baseline[name]
+        if result['ops_per_second'] < expected['ops_per_second'] * (1 - threshold):
+            regressions.append(f"{name}: {result['ops_per_second']} ops/s, baseline {expected['ops_per_second']} ops/s")
+        # some slack, so functions that allocate almost nothing do not fail on noise
+        if result['bytes_per_call'] > expected['bytes_per_call'] * (1 + threshold) + 1024:
+            regressions.append(f"{name}: {result['bytes_per_call']} bytes/call, baseline {expected['bytes_per_call']} bytes/call")
+    return regressions
+
+if __name__ == "__main__":
+    options = parser.parse_args()
+    results = run_benchmarks(options.filter, options.rounds, options.min_time)
+
+    if options.save:
+        with open(options.baseline, "w") as f:
+            f.write(json.dumps(results, indent=4))
+        print(f"Saved baseline to {options.baseline}")
+        sys.exit(0)
+
+    with open(options.baseline, "r") as f:
+        baseline = json.load(f)
+    regressions = get_regressions(results, baseline, options.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    sys.exit(1 if regressions else 0)
@@ -1,3 +1,4 @@
+import copy
 import torch
 import torch.nn as nn
 
@@ -26,6 +27,12 @@ class BaseModel(nn.Module):
         self.activation = nn.ReLU()
 
     def forward(self, x):
+        # a batch of features [B, 26, 12] gives outputs of shape [B, 5, 26]
+        if x.dim() == 3:
+            output = x.flatten(start_dim=1)
+            output = self.linear_layers(output)
+            return torch.stack([layer(output) for layer in self.output_char_layers], dim=1)
+
         output = self.flatten(x)
         output = self.linear_layers(output)
 
@@ -34,4 +41,63 @@ class BaseModel(nn.Module):
             outputs[i] = layer(output)
         
         return outputs
-    
\ No newline at end of file
+    
+class FusedBaseModel(nn.Module):
+    """
+        Same network as BaseModel, with the five output heads fused into a single 512 -> 130 projection that is
+        reshaped to [5, 26]. All the layers are registered as submodules, so model.parameters(), .to(device)
+        and state_dict() cover the whole network.
+
+        Takes features of shape [26, 12] and returns outputs of shape [5, 26], or a batch of features
+        of shape [B, 26, 12] and returns outputs of shape [B, 5, 26].
+    """
+    def __init__(self, in_features):
+        super(FusedBaseModel, self).__init__()
+
+        self.linear_layers = nn.Sequential(
+            nn.Linear(in_features=in_features, out_features=512),
+            nn.ReLU(),
+            nn.Linear(in_features=512, out_features=512),
+            nn.ReLU(),
+            nn.Linear(in_features=512, out_features=512),
+            nn.ReLU(),
+        )
+
+        self.output_layer = nn.Linear(in_features=512, out_features=5 * 26)
+
+    def forward(self, x):
+        batched = x.dim() == 3
+        if not batched:
+            x = x[None]
+
+        output = x.flatten(start_dim=1)
+        output = self.linear_layers(output)
+        outputs = self.output_layer(output).reshape(-1, 5, 26)
+
+        return outputs if batched else outputs[0]
+
+    @classmethod
+    def from_base_model(cls, model : BaseModel) -> "FusedBaseModel":
+        """
+            Creates a FusedBaseModel with the weights of a BaseModel, for example one loaded from the pickled checkpoints
+            under models/. The weights of the five output heads are stacked into the fused output layer.
+        """
+        fused = cls(in_features=model.linear_layers[0].in_features)
+        fused.linear_layers.load_state_dict(model.linear_layers.state_dict())
+        with torch.no_grad():
+            fused.output_layer.weight.copy_(torch.cat([layer.weight for layer in model.output_char_layers]))
+            fused.output_layer.bias.copy_(torch.cat([layer.bias for layer in model.output_char_layers]))
+        return fused
+
+def quantize_model(model : nn.Module) -> nn.Module:
+    """
+        Returns a copy of the model for CPU inference, with the weights of every linear layer quantized to int8
+        and the activations quantized dynamically at every forward. A BaseModel is converted to a FusedBaseModel first,
+        since its output heads are not registered submodules. The quantized model has no parameters and can not be trained.
+    """
+    # cpu() and float() change the module in place, the model that is passed in is left as it is
+    model = copy.deepcopy(model)
+    if isinstance(model, BaseModel):
+        model = FusedBaseModel.from_base_model(model)
+    model = model.cpu().float()
+    return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
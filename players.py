@@ -0,0 +1,132 @@
+import torch
+from book import NO_NODE, ROOT
+from device import forward, get_model_device
+from feedback import encode_feedback
+from utils import get_default_features, get_feedback, get_updated_features, get_word_beam_search, get_words_from_tensor, get_words_tensor
+
+class ModelPlayer:
+    """
+        Plays the game with a trained model and beam search.
+
+        Every player has the same three methods, so the players can be swapped in game_loop.py and metrics.player_accuracy():
+        `player.reset()`: Start a new game.
+        `player.guess()`: Returns the next guessed word.
+        `player.update(guessed_word, feedback)`: Tell the player the feedback (from get_feedback()) for its guess.
+
+        Arguments:
+        `candidate_index`: An optional candidates.CandidateIndex. When given, the player guesses the most likely
+        word that is still consistent with the feedback so far, rather than the result of the beam search.
+
+        `cache`: An optional cache.DecisionCache that the results of the beam search go through. It is not used
+        together with a candidate index, whose guesses depend on more than the features.
+    """
+    def __init__(self, model : torch.nn.Module, mask_tree, k : int = 3, candidate_index = None, cache = None):
+        self.model = model
+        self.mask_tree = mask_tree
+        self.k = k
+        self.candidate_index = candidate_index
+        self.cache = cache
+        self.reset()
+
+    def reset(self) -> None:
+        self.features = get_default_features(get_model_device(self.model))
+        if self.candidate_index is not None:
+            self.live = self.candidate_index.all()
+
+    def guess(self) -> str:
+        if self.cache is not None and self.candidate_index is None:
+            return self.cache.get_word(self.model, self.features, self.mask_tree, self.k)
+
+        with torch.no_grad():
+            outputs = forward(self.model, self.features)
+
+        # with a candidate index, only words that are still consistent with the feedback are guessed
+        if self.candidate_index is not None:
+            guessed_word = self.candidate_index.get_best_words(outputs[None], self.live[None])[0]
+            if guessed_word is not None:
+                return guessed_word
+        return get_word_beam_search(outputs, self.mask_tree, self.k)
+
+    def update(self, guessed_word : str, feedback : list) -> None:
+        self.features = get_updated_features(self.features, feedback, guessed_word)
+        if self.candidate_index is not None:
+            self.live = self.candidate_index.update(self.live, feedback, guessed_word)
+
+class ExportedModelPlayer:
+    """
+        Plays the game with an artifact from export.py, loaded with torch.jit.load(). The model, the trie
+        and the beam width are all part of the artifact.
+    """
+    def __init__(self, exported : torch.jit.ScriptModule):
+        self.exported = exported
+        self.reset()
+
+    def reset(self) -> None:
+        self.features = self.exported.default_features(1)
+
+    def guess(self) -> str:
+        with torch.no_grad():
+            letters = self.exported(self.features)
+        return get_words_from_tensor(letters)[0]
+
+    def update(self, guessed_word : str, feedback : list) -> None:
+        guessed_letters = get_words_tensor([guessed_word])
+        self.features = self.exported.update_features(self.features, torch.tensor([feedback]), guessed_letters)
+
+class BookPlayer:
+    """
+        Plays the game from an OpeningBook (see book.py), every guess is a lookup in the book.
+        Once the game reaches a position that is not in the book, the guesses come from the fallback player,
+        which is first told about all the guesses of the game so far.
+    """
+    def __init__(self, book, fallback = None):
+        self.book = book
+        self.fallback = fallback
+        self.reset()
+
+    def reset(self) -> None:
+        self.node = ROOT
+        self.history = []
+
+    def guess(self) -> str:
+        if self.node != NO_NODE:
+            return self.book.words[self.node]
+        if self.fallback is None:
+            raise KeyError("The position is not in the book, and there is no fallback player")
+        return self.fallback.guess()
+
+    def update(self, guessed_word : str, feedback : list) -> None:
+        if self.node != NO_NODE:
+            if guessed_word == self.book.words[self.node]:
+                self.node = self.book.get_child(self.node, encode_feedback(feedback))
+            else:
+                self.node = NO_NODE
+            self.history.append((guessed_word, feedback))
+            if self.node == NO_NODE and self.fallback is not None:
+                self.fallback.reset()
+                for turn in self.history:
+                    self.fallback.update(*turn)
+        elif self.fallback is not None:
+            self.fallback.update(guessed_word, feedback)
+
+def play_game(player, correct_word : str, max_attempts : int = 6) -> list:
+    """
+        Plays one game of the player against the correct word.
+
+        Return:
+        `turns`: A list of dicts with 'guessed_word' and 'feedback' keys, one for each attempt.
+        The game stops after the word is guessed or after max_attempts.
+    """
+    player.reset()
+    turns = []
+    for attempt in range(max_attempts):
+        guessed_word = player.guess()
+        feedback = get_feedback(guessed_word, correct_word)
+        player.update(guessed_word, feedback)
+        turns.append({
+            'feedback': feedback,
+            'guessed_word': guessed_word,
+        })
+        if guessed_word == correct_word:
+            break
+    return turns
@@ -0,0 +1,158 @@
+import json
+import os
+import random
+import numpy as np
+import torch
+from checkpoint import CheckpointManager, load_checkpoint
+from interactions import INTERACTIONS_HEADER, RECORD_DTYPE, InteractionRecorder, get_record_count
+
+CONFIG_NAME = "config.json"
+DEFAULT_CONFIG = {
+    'wordlist': "data/official.txt",
+    'splits': [1.0, 0, 0],
+    'max_epochs': 100,
+    'eta': 0.00005,
+    # None trains one word at a time with main.train(), a number trains on mini-batches with main.train_batched()
+    'batch_size': None,
+    'accumulation_steps': 1,
+    # more than 1 trains with distributed.train_distributed() on this many local CPU processes, batch_size is then required
+    'processes': 1,
+    'autocast': None,
+    'seed': 2002,
+    'best_k': 3,
+    # at least 1, a run continues from its last snapshot
+    'last_n': 2,
+    'snapshot_every': 1,
+    # evaluate in an evaluator.BackgroundEvaluator process every eval_every epochs, rather than after every epoch in the training loop
+    'background_eval': False,
+    'eval_every': 1,
+}
+
+def get_config(config_path : str = None, overrides : dict = None) -> dict:
+    """
+        Returns DEFAULT_CONFIG, updated with the json config file at the path when given, and then with the overrides that are not None.
+        The config is checked with check_config().
+    """
+    config = dict(DEFAULT_CONFIG)
+    if config_path is not None:
+        with open(config_path, "r") as f:
+            config.update(json.load(f))
+    config.update({ key : value for key, value in (overrides or {}).items() if value is not None })
+    check_config(config)
+    return config
+
+def check_config(config : dict) -> None:
+    """
+        Raises ValueError when last_n is below 1.
+    """
+    if config['last_n'] < 1:
+        raise ValueError(f"last_n is {config['last_n']}, a run keeps at least its last snapshot to continue from")
+
+def seed_everything(seed : int) -> None:
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+
+def get_rng_state() -> dict:
+    """
+        The states of the torch, numpy and python random number generators.
+    """
+    return {
+        'torch': torch.get_rng_state(),
+        'cuda': torch.cuda.get_rng_state_all() if torch.cuda.is_available() else None,
+        'numpy': np.random.get_state(),
+        'python': random.getstate(),
+    }
+
+def set_rng_state(state : dict) -> None:
+    torch.set_rng_state(state['torch'])
+    if state['cuda'] is not None and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state['cuda'])
+    np.random.set_state(state['numpy'])
+    random.setstate(state['python'])
+
+class Run:
+    """
+        A training run in its own directory, holding everything that is needed to continue it:
+        `config.json`: The config of the run, see DEFAULT_CONFIG.
+        `checkpoints/`: The snapshots of a checkpoint.CheckpointManager, with the random number generator states and
+        the length of the interaction log at the end of their epoch.
+        `interactions.log`: The interaction log, see interactions.py.
+        `losses.npy`: The training loss of every epoch, written at the end.
+
+        A Run is passed as the `checkpoints` of main.train() and main.train_batched(). It snapshots every snapshot_every
+        epochs and at the last epoch. Training that continues from a snapshot with the same config and device gives
+        the same weights, log and losses as a run that was never stopped.
+    """
+    def __init__(self, directory : str, config : dict):
+        self.directory = directory
+        self.config = config
+        self.checkpoints = CheckpointManager(os.path.join(directory, "checkpoints"), config['best_k'], config['last_n'])
+        self.recorder = None
+
+    @classmethod
+    def create(cls, directory : str, config : dict) -> "Run":
+        if os.path.exists(os.path.join(directory, CONFIG_NAME)):
+            raise FileExistsError(f"{directory} already has a run, continue it with --resume {directory}")
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"{CONFIG_NAME}.tmp"), "w") as f:
+            f.write(json.dumps(config, indent=4))
+        os.replace(os.path.join(directory, f"{CONFIG_NAME}.tmp"), os.path.join(directory, CONFIG_NAME))
+        return cls(directory, config)
+
+    @classmethod
+    def load(cls, directory : str) -> "Run":
+        # the saved values are kept as they are, None included, only the keys that the config predates come from DEFAULT_CONFIG
+        with open(os.path.join(directory, CONFIG_NAME), "r") as f:
+            config = dict(DEFAULT_CONFIG, **json.load(f))
+        check_config(config)
+        return cls(directory, config)
+
+    @property
+    def log_path(self) -> str:
+        return os.path.join(self.directory, "interactions.log")
+
+    def __enter__(self):
+        self.recorder = InteractionRecorder(self.log_path)
+        return self
+
+    def __exit__(self, *args):
+        try:
+            if self.recorder is not None:
+                self.recorder.close()
+        finally:
+            self.checkpoints.close()
+
+    def save(self, model : torch.nn.Module, optimizer : torch.optim.Optimizer, epoch : int, metrics : dict, extra : dict = None, pending : bool = False) -> None:
+        """
+            Same as CheckpointManager.save(), with the random number generator states and the length of the interaction log added to extra.
+            Called at the end of every epoch, after the recorder is flushed.
+        """
+        if (epoch + 1) % self.config['snapshot_every'] and epoch + 1 != self.config['max_epochs']:
+            return
+        extra = dict(extra or {})
+        extra['rng'] = get_rng_state()
+        extra['interactions'] = get_record_count(self.log_path) if os.path.exists(self.log_path) else 0
+        self.checkpoints.save(model, optimizer, epoch, metrics, extra, pending)
+
+    def update_metrics(self, epoch : int, metrics : dict, history : dict = None) -> None:
+        self.checkpoints.update_metrics(epoch, metrics, history)
+
+    def load_checkpoint(self, checkpoint_path : str = None) -> dict:
+        """
+            Loads the checkpoint to continue the run from, the most recent snapshot unless a checkpoint path is given,
+            and cuts the interaction log back to where it was at that snapshot. Call it before entering the run.
+            Returns None when the run has no snapshot yet, it then starts over with an empty log.
+        """
+        checkpoint = None
+        if checkpoint_path is None and self.checkpoints.get_last() is not None:
+            checkpoint_path = self.checkpoints.get_path(self.checkpoints.get_last())
+        if checkpoint_path is not None:
+            checkpoint = load_checkpoint(checkpoint_path)
+        if os.path.exists(self.log_path):
+            num_records = checkpoint['extra']['interactions'] if checkpoint is not None else 0
+            os.truncate(self.log_path, INTERACTIONS_HEADER.size + num_records * RECORD_DTYPE.itemsize)
+        return checkpoint
+
+    def save_losses(self, losses : np.ndarray) -> None:
+        np.save(os.path.join(self.directory, "losses.npy"), losses)
@@ -0,0 +1,264 @@
+import argparse
+import copy
+import time
+import torch
+import torch.multiprocessing as mp
+from torch.nn import CrossEntropyLoss
+from torch.optim import Adam
+from device import forward, get_device, get_model_device
+from dictionary import get_compiled_dictionary
+from metrics import evaluate
+from models import FusedBaseModel
+from players import play_game
+from solver import EntropySolver
+from state import STATE_BYTES, get_batch_default_states, get_batch_updated_states, unpack_states
+from utils import decode_batch_feedback, get_batch_word_beam_search, get_label_tensor, get_paired_feedback, get_wordlist, get_words_from_tensor, get_words_tensor, load_model
+
+# the policies that the games of the producers are played with, in the order of the mix
+POLICIES = ['model', 'solver', 'random']
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--model', default=None, dest='model_path', help="A trained model to start from, by default a new model is trained")
+parser.add_argument('--wordlist', default="data/official.txt", dest='wordlist_path', help="The answers that are played, and the words that the beam search and the random policy guess from")
+parser.add_argument('--producers', default=2, type=int, dest='producers', help="The number of processes that play games into the replay buffer")
+parser.add_argument('--capacity', default=1 << 20, type=int, dest='capacity', help="The number of transitions that the replay buffer holds")
+parser.add_argument('--mix', default=[0.6, 0.2, 0.2], type=float, nargs=3, dest='mix', help="The share of the games played by the model, the entropy solver and random guesses")
+parser.add_argument('--mix-final', default=None, type=float, nargs=3, dest='mix_final', help="The mix that --mix moves to in a straight line over the steps, for example 0.9 0.1 0 to start from the solver's games and end on the model's own")
+parser.add_argument('--steps', default=20000, type=int, dest='steps', help="The number of mini-batches to train on")
+parser.add_argument('--batch-size', default=256, type=int, dest='batch_size', help="The number of transitions in a mini-batch")
+parser.add_argument('--lr', default=0.0005, type=float, dest='eta', help="The learning rate")
+parser.add_argument('--publish-every', default=50, type=int, dest='publish_every', help="The number of steps between copies of the weights to the producers")
+parser.add_argument('--eval-every', default=1000, type=int, dest='eval_every', help="The number of steps between evaluations on the word list")
+parser.add_argument('--output', default="models/self_play", dest='output_path', help="Where to save the trained model")
+
+class ReplayBuffer:
+    """
+        A fixed size ring buffer of (game state, answer) transitions in shared memory, that any number of
+        producer processes add to and the trainer samples from. The states are packed as in state.py,
+        so a transition is 44 bytes. Once the buffer is full, the oldest transitions are overwritten.
+
+        `states`: uint8 tensor of shape [capacity, 39], the game states before a guess.
+        `labels`: uint8 tensor of shape [capacity, 5], the answer of the game as offsets from 'a'.
+        `count`: The number of transitions added so far, the next one goes to count % capacity.
+    """
+    def __init__(self, capacity : int, context = None):
+        context = context or mp.get_context("spawn")
+        self.capacity = capacity
+        self.states = torch.zeros((capacity, STATE_BYTES), dtype=torch.uint8).share_memory_()
+        self.labels = torch.zeros((capacity, 5), dtype=torch.uint8).share_memory_()
+        self.count = torch.zeros(1, dtype=torch.long).share_memory_()
+        # writes and samples are copies of a few KB, a single lock keeps every sampled state next to its own label
+        self.lock = context.Lock()
+
+    def __len__(self):
+        return min(int(self.count), self.capacity)
+
+    def add(self, states : torch.Tensor, labels : torch.Tensor) -> None:
+        states, labels = states[-self.capacity:], labels[-self.capacity:]
+        with self.lock:
+            idx = (int(self.count) + torch.arange(len(states))) % self.capacity
+            self.states[idx] = states.cpu()
+            self.labels[idx] = labels.cpu().to(torch.uint8)
+            self.count += len(states)
+
+    def sample(self, batch_size : int, generator : torch.Generator = None) -> tuple:
+        """
+            Returns batch_size (states, labels) transitions drawn uniformly with replacement.
+        """
+        with self.lock:
+            idx = torch.randint(len(self), (batch_size,), generator=generator)
+            return self.states[idx], self.labels[idx]
+
+def play_policy_games(model, trie, words_tensor : torch.Tensor, answer_idx : torch.Tensor, policies : torch.Tensor, solver = None, k : int = 3, generator : torch.Generator = None) -> tuple:
+    """
+        Plays one game for every answer in lock step, each with its policy from POLICIES: beam search over
+        the model's outputs, the guesses of solver.EntropySolver, or random words of words_tensor.
+
+        Return:
+        `states`, `labels`: The packed state before every attempt of every game, of shape [N, 39], and the answer of its game, of shape [N, 5].
+    """
+    answers = words_tensor[answer_idx]
+    # the solver does not need the model, so its games are played first, one at a time with its memoized decisions
+    solver_letters = torch.zeros((len(answers), 6, 5), dtype=torch.long)
+    for idx in (policies == POLICIES.index('solver')).nonzero().flatten().tolist():
+        guesses = [turn['guessed_word'] for turn in play_game(solver, get_words_from_tensor(answers[idx:idx + 1])[0])]
+        solver_letters[idx] = get_words_tensor(guesses + guesses[-1:] * (6 - len(guesses)))
+
+    device = get_model_device(model)
+    states = get_batch_default_states(len(answers), "cpu")
+    active = torch.arange(len(answers))
+    all_states, all_labels = [], []
+    with torch.no_grad():
+        for attempt in range(6):
+            all_states.append(states[active].clone())
+            all_labels.append(answers[active])
+
+            active_policies = policies[active]
+            guessed_letters = solver_letters[active, attempt]
+            model_rows = active_policies == POLICIES.index('model')
+            if model_rows.any():
+                outputs = forward(model, unpack_states(states[active[model_rows]].to(device)))
+                guessed_letters[model_rows] = get_batch_word_beam_search(outputs, trie, k).cpu()
+            random_rows = active_policies == POLICIES.index('random')
+            guessed_letters[random_rows] = words_tensor[torch.randint(len(words_tensor), (int(random_rows.sum()),), generator=generator)]
+
+            codes = get_paired_feedback(guessed_letters, answers[active])
+            states[active] = get_batch_updated_states(states[active], decode_batch_feedback(codes), guessed_letters)
+            active = active[codes != 242]
+            if not len(active):
+                break
+    return torch.cat(all_states), torch.cat(all_labels)
+
+def _produce(rank : int, buffer : ReplayBuffer, shared_model, version : torch.Tensor, mix : torch.Tensor, wordlist_path : str, games : int, seed : int, stop) -> None:
+    """
+        The loop of a producer process, plays rounds of games into the buffer until stop is set.
+    """
+    torch.set_num_threads(1)
+    generator = torch.Generator().manual_seed(seed + rank)
+    words_tensor = get_words_tensor(get_wordlist(wordlist_path))
+    trie = get_compiled_dictionary(wordlist_path).trie
+    solver = None
+    model, model_version = None, -1
+
+    while not stop.is_set():
+        # the solver needs the feedback matrix, it is only loaded once the solver plays
+        if solver is None and mix[POLICIES.index('solver')] > 0:
+            solver = EntropySolver(answers_path=wordlist_path)
+        # pick up the weights that the trainer published last
+        if int(version) != model_version:
+            with buffer.lock:
+                model = copy.deepcopy(shared_model).eval()
+                model_version = int(version)
+        policies = torch.multinomial(mix, games, replacement=True, generator=generator)
+        answer_idx = torch.randint(len(words_tensor), (games,), generator=generator)
+        states, labels = play_policy_games(model, trie, words_tensor, answer_idx, policies, solver, generator=generator)
+        buffer.add(states, labels)
+
+class SelfPlay:
+    """
+        Producer processes that play games with a mix of policies (see POLICIES and play_policy_games()) and write
+        every transition to a ReplayBuffer, so playing games and training on them scale on their own.
+        The producers play with the weights of the last publish(), and the mix can be changed while they run with set_mix(),
+        for example to start from the solver's games and move to the model's own games as it gets better, see the mix_final
+        of train_self_play().
+
+        Arguments:
+        `model`: The model whose weights the producers play with, published right away.
+        `wordlist_path`: The answers, and the words that the beam search and the random policy guess from.
+        `capacity`: The size of the replay buffer.
+        `producers`: The number of producer processes.
+        `mix`: The share of the games of every policy, in the order of POLICIES.
+        `games`: The number of games that a producer plays together in a round.
+
+        Use it as a context manager, or call close() at the end.
+    """
+    def __init__(self, model : torch.nn.Module, wordlist_path : str = "data/official.txt", capacity : int = 1 << 20, producers : int = 2, mix : list = (0.6, 0.2, 0.2), games : int = 256, seed : int = 0):
+        context = mp.get_context("spawn")
+        self.buffer = ReplayBuffer(capacity, context)
+        self.shared_model = copy.deepcopy(model).to("cpu").share_memory()
+        self.version = torch.zeros(1, dtype=torch.long).share_memory_()
+        self.mix = torch.tensor(mix, dtype=torch.float).share_memory_()
+        self.stop = context.Event()
+        self.processes = [
+            context.Process(target=_produce, args=(rank, self.buffer, self.shared_model, self.version, self.mix, wordlist_path, games, seed, self.stop), daemon=True)
+            for rank in range(producers)
+        ]
+        for process in self.processes:
+            process.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def publish(self, model : torch.nn.Module) -> None:
+        """
+            Copies the weights of the model to the producers, they play with them from their next round on.
+        """
+        with self.buffer.lock:
+            with torch.no_grad():
+                for shared, parameter in zip(self.shared_model.state_dict().values(), model.state_dict().values()):
+                    shared.copy_(parameter)
+            self.version += 1
+
+    def set_mix(self, mix : list) -> None:
+        self.mix.copy_(torch.as_tensor(mix, dtype=torch.float))
+
+    def check(self) -> None:
+        for process in self.processes:
+            if not process.is_alive() and not self.stop.is_set():
+                raise RuntimeError(f"A self-play producer exited with code {process.exitcode}")
+
+    def wait_for(self, size : int) -> None:
+        """
+            Blocks until the replay buffer holds at least size transitions.
+        """
+        while len(self.buffer) < min(size, self.buffer.capacity):
+            self.check()
+            time.sleep(0.1)
+
+    def close(self) -> None:
+        self.stop.set()
+        for process in self.processes:
+            process.join()
+
+def get_mix(mix : torch.Tensor, mix_final : torch.Tensor, progress : float) -> torch.Tensor:
+    """
+        The mix of the curriculum after the progress (from 0 to 1) of training, on the straight line from mix to mix_final.
+    """
+    return torch.lerp(mix, mix_final, min(max(progress, 0.), 1.))
+
+def train_self_play(model, self_play : SelfPlay, steps : int, eta : float, batch_size : int = 256, publish_every : int = 50, eval_every : int = None, dataset = None, trie = None, mix_final : list = None):
+    """
+        Trains the model on mini-batches sampled from the replay buffer of self_play, with an optimizer step per mini-batch.
+        The weights are published to the producers every publish_every steps.
+
+        Arguments:
+        `mix_final`: The mix of the policies at the end of training, when given. The mix of self_play moves toward it with
+        get_mix() at every publish, and reaches it at the last step.
+        `eval_every`, `dataset`, `trie`: When given, the model is evaluated with metrics.evaluate() on the dataset every eval_every steps.
+
+        Return:
+        `losses`: The loss of every step.
+    """
+    optimizer = Adam(model.parameters(), lr=eta)
+    loss_criterion = CrossEntropyLoss()
+    device = get_model_device(model)
+    losses = torch.zeros(steps)
+    mix = self_play.mix.clone()
+    self_play.wait_for(batch_size)
+
+    for step in range(steps):
+        model.train()
+        states, labels = self_play.buffer.sample(batch_size)
+        outputs = forward(model, unpack_states(states.to(device)))
+        loss = loss_criterion(outputs.reshape(-1, 26), labels.to(device).long().reshape(-1))
+
+        optimizer.zero_grad()
+        loss.backward()
+        optimizer.step()
+        losses[step] = loss.item()
+
+        if (step + 1) % publish_every == 0:
+            self_play.check()
+            self_play.publish(model)
+        if mix_final is not None and ((step + 1) % publish_every == 0 or step + 1 == steps):
+            self_play.set_mix(get_mix(mix, torch.tensor(mix_final, dtype=torch.float), (step + 1) / steps))
+        if eval_every and (step + 1) % eval_every == 0:
+            model.eval()
+            acc, _, val_loss = evaluate(model, dataset, trie)
+            print(f"Step {step + 1} / {steps}, loss => {losses[step - eval_every + 1:step + 1].mean()}, val_acc => {acc}, val_loss => {val_loss}, buffer => {len(self_play.buffer)}")
+    return losses
+
+if __name__ == "__main__":
+    options = parser.parse_args()
+    model = load_model(options.model_path) if options.model_path else FusedBaseModel(in_features=26 * 12)
+    model = model.to(get_device())
+    dataset = [(word, get_label_tensor(word, get_device())) for word in get_wordlist(options.wordlist_path)]
+    trie = get_compiled_dictionary(options.wordlist_path).trie.to(get_device())
+
+    with SelfPlay(model, options.wordlist_path, options.capacity, options.producers, options.mix) as self_play:
+        train_self_play(model, self_play, options.steps, options.eta, options.batch_size, options.publish_every, options.eval_every, dataset, trie, options.mix_final)
+    torch.save(model, options.output_path)
+    print(f"Saved the model to {options.output_path}")
@@ -0,0 +1,127 @@
+import hashlib
+import json
+import os
+import numpy as np
+from dictionary import get_wordlist_hash
+from feedback import PATTERN_COUNT, FeedbackMatrix, encode_feedback
+from utils import get_wordlist
+
+OPENING_CACHE_PATH = "data/opening_guess.json"
+
+def get_pattern_counts(codes : np.ndarray, chunk_size : int = 2048) -> np.ndarray:
+    """
+        Buckets the feedback patterns of every guess over a set of candidate answers.
+
+        Arguments:
+        `codes`: Encoded feedback of shape [num_guesses, num_candidates], usually a slice of the feedback matrix.
+
+        Return:
+        `counts`: An array of shape [num_guesses, 243], counts[g, p] is the number of candidates
+        that give the pattern p for the guess g.
+    """
+    counts = np.empty((codes.shape[0], PATTERN_COUNT), dtype=np.int64)
+    for start in range(0, codes.shape[0], chunk_size):
+        chunk = np.asarray(codes[start:start + chunk_size], dtype=np.int64)
+        offsets = chunk + PATTERN_COUNT * np.arange(chunk.shape[0])[:, None]
+        counts[start:start + len(chunk)] = np.bincount(offsets.ravel(), minlength=len(chunk) * PATTERN_COUNT).reshape(-1, PATTERN_COUNT)
+    return counts
+
+def get_entropies(counts : np.ndarray) -> np.ndarray:
+    """
+        The entropy in bits of the feedback pattern distribution of each guess, from get_pattern_counts().
+        This is the expected information gained by making that guess.
+    """
+    total = counts.sum(axis=1, keepdims=True)
+    probabilities = counts / np.maximum(total, 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        information = np.where(counts > 0, -probabilities * np.log2(probabilities), 0.)
+    return information.sum(axis=1)
+
+class EntropySolver:
+    """
+        A classical player that keeps the set of answers that are still consistent with the feedback so far,
+        and guesses the word whose feedback pattern distribution over that set has the highest entropy.
+        Ties go to words that can still be the answer.
+        The solver is deterministic, so the guess made after every feedback history is memoized and
+        repeated games only pay for the entropy computation once.
+
+        It has the same reset() / guess() / update() methods as players.ModelPlayer, so it can be used
+        anywhere a player is expected.
+
+        Arguments:
+        `feedback_matrix`: The FeedbackMatrix to use, the guesses can be any word of its vocabulary.
+        `answers_path`: The word list of possible answers, None for the whole vocabulary of the feedback matrix.
+        If the answer turns out not to be in it, the solver falls back to the whole vocabulary.
+    """
+    def __init__(self, feedback_matrix : FeedbackMatrix = None, answers_path : str = "data/official.txt", opening_cache_path : str = OPENING_CACHE_PATH):
+        self.feedback_matrix = feedback_matrix or FeedbackMatrix()
+        self.words = self.feedback_matrix.words
+        answers = get_wordlist(answers_path) if answers_path is not None else self.words
+        self.answers = np.array([self.feedback_matrix.index[word] for word in answers], dtype=np.int64)
+        self.opening = self.get_opening(answers_path, opening_cache_path)
+        self.decisions = {}
+        self.reset()
+
+    def reset(self) -> None:
+        self.candidates = self.answers
+        self.history = []
+
+    def get_opening(self, answers_path : str, opening_cache_path : str) -> str:
+        """
+            The best opening guess only depends on the word lists, so it is computed once and cached
+            in a json file keyed by the hash of the answers and the vocabulary.
+        """
+        answers_hash = get_wordlist_hash(answers_path) if answers_path is not None else "vocabulary"
+        key = answers_hash + hashlib.sha256("\n".join(self.words).encode()).hexdigest()
+        cached = {}
+        if opening_cache_path and os.path.exists(opening_cache_path):
+            with open(opening_cache_path, "r") as f:
+                cached = json.load(f)
+            if cached.get(key) in self.feedback_matrix.index:
+                return cached[key]
+
+        opening = self.get_best_guess(self.answers)
+        if opening_cache_path:
+            cached[key] = opening
+            with open(opening_cache_path, "w") as f:
+                f.write(json.dumps(cached))
+        return opening
+
+    def get_best_guess(self, candidates : np.ndarray) -> str:
+        if len(candidates) <= 2:
+            return self.words[candidates[0]]
+
+        entropies = get_entropies(get_pattern_counts(self.feedback_matrix.matrix[:, candidates]))
+        is_candidate = np.zeros(len(self.words), dtype=bool)
+        is_candidate[candidates] = True
+        # highest entropy first, then candidates before other words
+        best = np.lexsort((~is_candidate, -entropies))[0]
+        return self.words[best]
+
+    def guess(self) -> str:
+        if not self.history:
+            return self.opening
+        if not len(self.candidates):
+            # the answer is not in the vocabulary, guess the words that were not tried yet
+            guessed = set(guessed_word for guessed_word, _ in self.history)
+            return next(word for word in self.words if word not in guessed)
+
+        key = tuple(self.history)
+        if key not in self.decisions:
+            self.decisions[key] = self.get_best_guess(self.candidates)
+        return self.decisions[key]
+
+    def update(self, guessed_word : str, feedback : list) -> None:
+        self.history.append((guessed_word, encode_feedback(feedback)))
+        self.candidates = self.filter(self.candidates, guessed_word, self.history[-1][1])
+
+        if not len(self.candidates) and len(self.answers) < len(self.words):
+            # the answer is not one of the answers, look for it in the whole vocabulary
+            self.candidates = np.arange(len(self.words))
+            for guessed_word, code in self.history:
+                self.candidates = self.filter(self.candidates, guessed_word, code)
+
+    def filter(self, candidates : np.ndarray, guessed_word : str, code : int) -> np.ndarray:
+        if guessed_word not in self.feedback_matrix.index:
+            return candidates
+        return candidates[self.feedback_matrix.row(guessed_word)[candidates] == code]
@@ -0,0 +1,85 @@
+import torch
+from device import get_device, get_dtype
+
+# The (26, 12) features of get_default_features() only ever hold 0s and 1s, so a game state is stored as the 312 bits
+# of the flattened features, bit row * 12 + col being bit (row * 12 + col) % 8 of byte (row * 12 + col) // 8.
+STATE_BITS = 26 * 12
+STATE_BYTES = STATE_BITS // 8
+
+_BIT_SHIFTS = torch.arange(8, dtype=torch.uint8)
+# the 8 bits of every byte value, unpacking is then a single embedding lookup of the bytes
+_BYTE_BITS = (torch.arange(256)[:, None] >> torch.arange(8)) & 1
+
+def pack_features(features : torch.Tensor) -> torch.Tensor:
+    """
+        Packs features of shape [..., 26, 12] (from get_default_features() or get_batch_default_features())
+        into game states of shape [..., 39] of dtype uint8.
+    """
+    bits = (features > 0).flatten(start_dim=-2).to(torch.uint8)
+    bits = bits.reshape(bits.shape[:-1] + (STATE_BYTES, 8))
+    return (bits << _BIT_SHIFTS.to(bits.device)).sum(dim=-1, dtype=torch.uint8)
+
+def unpack_states(states : torch.Tensor, dtype : torch.dtype = None) -> torch.Tensor:
+    """
+        Inverse of pack_features(), converts game states of shape [..., 39] to dense features of shape [..., 26, 12]
+        with a single embedding lookup over the whole batch, so they can be fed to the models.
+    """
+    byte_bits = _BYTE_BITS.to(device=states.device, dtype=dtype or get_dtype())
+    bits = torch.nn.functional.embedding(states.long(), byte_bits)
+    return bits.reshape(states.shape[:-1] + (26, 12))
+
+def get_batch_default_states(batch_size : int, device : torch.device = None) -> torch.Tensor:
+    """
+        Returns the packed get_batch_default_features(), of shape [batch_size, 39].
+    """
+    features = torch.zeros((26, 12), dtype=torch.uint8)
+    features[:, 0] = 1
+    return pack_features(features).to(device or get_device()).repeat(batch_size, 1)
+
+def _get_byte_masks(bit_idx : torch.Tensor, num_states : int) -> torch.Tensor:
+    """
+        Returns states of shape [num_states, 39] with only the bits at bit_idx (of shape [num_states, N]) set.
+    """
+    # a bit that is repeated in a row is only counted once, so adding up the bits of a byte is the same as or-ing them
+    bit_idx, _ = bit_idx.sort(dim=1)
+    repeated = torch.zeros_like(bit_idx, dtype=torch.bool)
+    repeated[:, 1:] = bit_idx[:, 1:] == bit_idx[:, :-1]
+    values = (1 << (bit_idx & 7)) * ~repeated
+    masks = torch.zeros((num_states, STATE_BYTES), dtype=torch.long, device=bit_idx.device)
+    masks.scatter_add_(1, bit_idx >> 3, values)
+    return masks.to(torch.uint8)
+
+def get_batch_updated_states(states : torch.Tensor, feedback : torch.Tensor, guessed_letters : torch.Tensor) -> torch.Tensor:
+    """
+        Same as get_batch_updated_features(), but on packed game states. Updates the states in place.
+
+        Arguments:
+        `states`: Game states of shape [B, 39], from get_batch_default_states() or an earlier call to this function.
+
+        `feedback`: Tensor of shape [B, 5] with entries from {-1, 0, 1}. See decode_batch_feedback().
+
+        `guessed_letters`: Tensor of shape [B, 5] holding the guessed words as offsets from 'a'.
+    """
+    positions = torch.arange(5, device=feedback.device)
+    col_idx = torch.where(feedback == 1, 2 + positions, 7 + positions)
+    col_idx = torch.where(feedback == -1, torch.ones_like(col_idx), col_idx)
+
+    states &= ~_get_byte_masks(guessed_letters * 12, states.shape[0])
+    states |= _get_byte_masks(guessed_letters * 12 + col_idx, states.shape[0])
+    return states
+
+def get_state_keys(states : torch.Tensor) -> list:
+    """
+        Converts game states of shape [B, 39] to one Python int per state, for hashing and storing them.
+        Bit i of the int is the bit row * 12 + col = i of the features.
+    """
+    data = states.cpu().contiguous().numpy().tobytes()
+    return [int.from_bytes(data[i:i + STATE_BYTES], 'little') for i in range(0, len(data), STATE_BYTES)]
+
+def get_states_from_keys(keys : list, device : torch.device = None) -> torch.Tensor:
+    """
+        Inverse of get_state_keys(), converts a list of ints to game states of shape [len(keys), 39].
+    """
+    data = b"".join(key.to_bytes(STATE_BYTES, 'little') for key in keys)
+    states = torch.frombuffer(bytearray(data), dtype=torch.uint8) if data else torch.empty(0, dtype=torch.uint8)
+    return states.reshape(-1, STATE_BYTES).to(device or get_device())
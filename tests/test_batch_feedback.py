@@ -0,0 +1,35 @@
+import numpy as np
+import torch
+from utils import decode_batch_feedback, get_batch_feedback, get_feedback, get_paired_feedback, get_words_from_tensor, get_words_tensor
+
+# the repeated letter cases from tests/test_feedback.py
+CASES = [
+    ("brash", "ctaju"), ("brsah", "ctaju"),
+    ("braas", "ctaju"), ("baars", "ctaju"), ("baras", "ctaju"),
+    ("brash", "ctaau"), ("barsh", "ctaau"),
+    ("braah", "ctaau"), ("barah", "ctaau"), ("braha", "ctaau"), ("abrha", "ctaau"),
+]
+
+def test_words_tensor():
+    words = ["cigar", "rebut", "sissy"]
+    assert get_words_from_tensor(get_words_tensor(words)) == words
+
+def test_paired_feedback():
+    guesses = get_words_tensor([guess for guess, _ in CASES])
+    answers = get_words_tensor([answer for _, answer in CASES])
+    feedback = decode_batch_feedback(get_paired_feedback(guesses, answers))
+    for (guess, answer), fb in zip(CASES, feedback):
+        assert fb.tolist() == get_feedback(guess, answer)
+
+def test_batch_feedback():
+    words = sorted(set(word for case in CASES for word in case))
+    encoded = get_words_tensor(words)
+    feedback = decode_batch_feedback(get_batch_feedback(encoded, encoded))
+    assert feedback.shape == (len(words), len(words), 5)
+    for i, guess in enumerate(words):
+        for j, answer in enumerate(words):
+            assert feedback[i, j].tolist() == get_feedback(guess, answer)
+
+    codes = get_batch_feedback(encoded.numpy(), encoded.numpy())
+    assert isinstance(codes, np.ndarray)
+    assert torch.equal(torch.from_numpy(codes), get_batch_feedback(encoded, encoded))
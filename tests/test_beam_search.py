@@ -0,0 +1,29 @@
+import torch
+from trie import DEAD_NODE, ROOT_NODE, get_packed_trie
+from utils import get_batch_default_features, get_batch_updated_features, get_batch_word_beam_search, get_default_features, get_feedback, get_mask_tree, get_updated_features, get_word_beam_search, get_words_from_tensor, get_words_tensor
+
+def test_packed_trie():
+    mask_tree = get_mask_tree("data/official.txt")
+    trie = get_packed_trie("data/official.txt")
+    assert trie.valid[ROOT_NODE].tolist() == mask_tree[0]
+    node = trie.children[ROOT_NODE, ord('c') - ord('a')]
+    node = trie.children[node, ord('i') - ord('a')]
+    assert trie.valid[node].tolist() == mask_tree[2]['ci']
+    assert trie.valid[DEAD_NODE].sum() == 0
+
+def test_batch_word_beam_search():
+    mask_tree = get_mask_tree("data/official.txt")
+    trie = get_packed_trie("data/official.txt")
+    outputs = 3 * torch.randn((64, 5, 26), generator=torch.Generator().manual_seed(0))
+    for k in [1, 3, 5, 10]:
+        words = get_words_from_tensor(get_batch_word_beam_search(outputs, trie, k))
+        assert words == [get_word_beam_search(output, mask_tree, k) for output in outputs]
+
+def test_batch_updated_features():
+    games = [("brash", "ctaju"), ("braha", "ctaau"), ("cigar", "cigar")]
+    features = get_batch_default_features(len(games))
+    feedback = torch.tensor([get_feedback(guess, answer) for guess, answer in games])
+    features = get_batch_updated_features(features, feedback, get_words_tensor([guess for guess, _ in games]))
+    for i, (guess, answer) in enumerate(games):
+        expected = get_updated_features(get_default_features(), get_feedback(guess, answer), guess)
+        assert torch.equal(features[i], expected)
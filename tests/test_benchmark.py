@@ -0,0 +1,67 @@
+import multiprocessing
+import torch
+import benchmark
+from benchmark import get_answers, get_answers_path, get_report, play_shard, run_benchmark
+from dictionary import get_compiled_dictionary
+from feedback import FeedbackMatrix
+from solver import EntropySolver
+from utils import get_label_tensor, get_wordlist
+
+WORDS = ["cigar", "rebut", "sissy", "humph", "awake", "blush", "focal", "evade", "naval", "serve", "heath", "dwarf"]
+
+def test_get_answers():
+    official = get_wordlist("data/official.txt")
+    assert get_answers('official') == official
+    answers = get_answers('all')
+    assert len(answers) == len(set(answers))
+    assert set(answers) == set(official) | set(get_wordlist("data/words.txt"))
+
+class WordModel(torch.nn.Module):
+    """
+        Always puts all the probability on the letters of one word.
+    """
+    def __init__(self, word):
+        super().__init__()
+        self.register_buffer("logits", 100. * torch.nn.functional.one_hot(get_label_tensor(word), 26).float())
+
+    def forward(self, features):
+        return self.logits.expand(len(features), 5, 26)
+
+def test_model_plays_all_words(tmp_path):
+    official = set(get_wordlist("data/official.txt"))
+    word = next(word for word in get_wordlist("data/words.txt") if word not in official)
+    benchmark.shared.update({ 'player': 'model', 'models': { 'float32': WordModel(word) }, 'candidate_index': None })
+    try:
+        benchmark.shared['trie'] = get_compiled_dictionary(get_answers_path('all', str(tmp_path / "all.txt"))).trie
+        assert play_shard(([word], 3, 'float32')) == { word: 1 }
+        # a word that is not in the trie of the official words is never guessed
+        benchmark.shared['trie'] = get_compiled_dictionary(get_answers_path('official')).trie
+        assert play_shard(([word], 3, 'float32')) == { word: None }
+    finally:
+        benchmark.shared.clear()
+
+def test_get_report():
+    report = get_report({ "cigar": 1, "rebut": 3, "sissy": 3, "humph": None }, 2.)
+    assert report['distribution'] == { 1: 1, 2: 0, 3: 2, 4: 0, 5: 0, 6: 0, 'failed': 1 }
+    assert report['average'] == round(7 / 3, 4)
+    assert report['failure_rate'] == 25.
+    assert report['games_per_second'] == 2.
+    assert get_report({}, 0.)['failure_rate'] == 0
+
+def test_run_benchmark(tmp_path):
+    wordlist_path = str(tmp_path / "words.txt")
+    with open(wordlist_path, "w") as f:
+        f.write("\n".join(word.upper() for word in WORDS))
+    feedback_matrix = FeedbackMatrix(str(tmp_path / "matrix.npy"), str(tmp_path / "vocab.txt"), [wordlist_path])
+    benchmark.shared['player'] = 'entropy'
+    benchmark.shared['solver'] = EntropySolver(feedback_matrix, None, str(tmp_path / "opening.json"))
+    try:
+        with multiprocessing.get_context("fork").Pool(2, initializer=benchmark.init_worker) as pool:
+            report, results = run_benchmark(pool, WORDS, None, 5)
+    finally:
+        benchmark.shared.clear()
+
+    assert sorted(results) == sorted(WORDS)
+    assert all(1 <= attempts <= 4 for attempts in results.values())
+    assert report['distribution']['failed'] == 0
+    assert sum(report['distribution'].values()) == len(WORDS)
@@ -0,0 +1,27 @@
+import torch
+from book import OpeningBook, build_book
+from metrics import player_accuracy
+from models import FusedBaseModel
+from players import BookPlayer, ModelPlayer
+from trie import get_packed_trie
+from utils import get_wordlist
+
+def test_opening_book(tmp_path):
+    torch.manual_seed(0)
+    model = FusedBaseModel(in_features=26 * 12)
+    model.eval()
+    trie = get_packed_trie("data/official.txt")
+    answers = get_wordlist("data/official.txt")[:200]
+    book = build_book(model, trie, answers, k=3)
+    book.save(str(tmp_path / "model.book"))
+    loaded = OpeningBook.load(str(tmp_path / "model.book"))
+    assert loaded.words == book.words and loaded.get_lines() == book.get_lines()
+    assert len(loaded.get_lines()) == len(loaded)
+
+    dataset = [(word, None) for word in answers]
+    assert player_accuracy(BookPlayer(loaded), dataset) == player_accuracy(ModelPlayer(model, trie, 3), dataset)
+
+    # words that were not played when building the book leave it, and are played by the fallback
+    dataset = [(word, None) for word in get_wordlist("data/official.txt")[200:300]]
+    player = BookPlayer(loaded, ModelPlayer(model, trie, 3))
+    assert player_accuracy(player, dataset) == player_accuracy(ModelPlayer(model, trie, 3), dataset)
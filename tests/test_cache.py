@@ -0,0 +1,41 @@
+import torch
+from cache import DecisionCache
+from models import FusedBaseModel
+from trie import get_packed_trie
+from utils import get_default_features, get_feedback, get_updated_features, get_word_beam_search
+
+def test_decision_cache():
+    torch.manual_seed(0)
+    model = FusedBaseModel(in_features=26 * 12)
+    model.eval()
+    trie = get_packed_trie("data/official.txt")
+    cache = DecisionCache(max_size=2)
+
+    features = get_default_features("cpu")
+    guessed_word = cache.get_word(model, features, trie)
+    with torch.no_grad():
+        assert guessed_word == get_word_beam_search(model(features), trie, 3)
+    assert cache.get_word(model, features.clone(), trie) == guessed_word
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # the beam width is part of the key, and the least recently used decision is evicted
+    cache.get_word(model, features, trie, k=1)
+    cache.get_word(model, get_updated_features(features.clone(), get_feedback(guessed_word, "cigar"), guessed_word), trie)
+    assert (cache.misses, cache.evictions, len(cache)) == (3, 1, 2)
+    cache.get_word(model, features, trie)
+    assert cache.misses == 4
+
+def test_decision_cache_invalidation():
+    torch.manual_seed(0)
+    model = FusedBaseModel(in_features=26 * 12)
+    trie = get_packed_trie("data/official.txt")
+    cache = DecisionCache()
+    features = get_default_features("cpu")
+    cache.get_word(model, features, trie)
+
+    # any in-place update of the weights clears the cache
+    with torch.no_grad():
+        model.output_layer.bias.copy_(-1000 * torch.ones(130))
+        model.output_layer.bias[[2, 26 + 8, 52 + 6, 78, 104 + 17]] = 1000
+    assert cache.get_word(model, features, trie) == "cigar"
+    assert (cache.hits, cache.misses, cache.invalidations) == (0, 2, 1)
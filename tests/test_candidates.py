@@ -0,0 +1,26 @@
+import random
+from candidates import CandidateIndex
+from utils import get_default_features, get_feedback, get_updated_features, get_wordlist
+
+def test_candidate_index():
+    words = get_wordlist("data/official.txt")
+    index = CandidateIndex(words)
+    assert index.count(index.all()) == len(words)
+
+    rng = random.Random(0)
+    for _ in range(50):
+        correct_word = rng.choice(words)
+        live, features, history = index.all(), get_default_features(), []
+        for _ in range(3):
+            guessed_word = rng.choice(words)
+            feedback = get_feedback(guessed_word, correct_word)
+            history.append((guessed_word, feedback))
+            live = index.update(live, feedback, guessed_word)
+            features = get_updated_features(features, feedback, guessed_word)
+
+        expected = [word for word in words if all(get_feedback(g, word) == fb for g, fb in history)]
+        assert index.get_words(live) == expected
+
+        # the features only give bounds, but never rule out the answer
+        from_features = index.get_words(index.from_features(features))
+        assert set(expected) <= set(from_features)
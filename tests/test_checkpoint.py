@@ -0,0 +1,76 @@
+import json
+import os
+import torch
+from checkpoint import CheckpointManager, load_checkpoint, restore_checkpoint
+from main import train_batched
+from models import FusedBaseModel
+from runs import get_rng_state
+from trie import get_packed_trie
+from utils import get_label_tensor, get_wordlist, load_model
+
+def test_checkpoint_manager(tmp_path):
+    torch.manual_seed(0)
+    model = FusedBaseModel(in_features=26 * 12)
+    optimizer = torch.optim.Adam(model.parameters())
+    accuracies = [10., 30., 20., 5., 1.]
+    with CheckpointManager(str(tmp_path), best_k=2, last_n=1) as checkpoints:
+        for epoch, acc in enumerate(accuracies):
+            model(torch.zeros((1, 26, 12))).sum().backward()
+            optimizer.step()
+            checkpoints.save(model, optimizer, epoch, { 'accuracy': acc })
+        checkpoints.wait()
+        # the best 2 by accuracy and the last one
+        assert sorted(os.listdir(tmp_path)) == ["checkpoints.json", "epoch00001.pt", "epoch00002.pt", "epoch00004.pt"]
+        assert checkpoints.get_best()['epoch'] == 1 and checkpoints.get_last()['epoch'] == 4
+
+    with open(tmp_path / "checkpoints.json") as f:
+        assert [entry['epoch'] for entry in json.load(f)['checkpoints']] == [1, 2, 4]
+    assert CheckpointManager(str(tmp_path)).get_best()['epoch'] == 1
+
+    # the last checkpoint has the final weights and optimizer state
+    restored = FusedBaseModel(in_features=26 * 12)
+    restored_optimizer = torch.optim.Adam(restored.parameters())
+    assert restore_checkpoint(load_checkpoint(str(tmp_path / "epoch00004.pt")), restored, restored_optimizer) == 5
+    assert all(torch.equal(a, b) for a, b in zip(model.state_dict().values(), restored.state_dict().values()))
+    assert restored_optimizer.state_dict()['state'][0]['step'] == 5
+    loaded = load_model(str(tmp_path / "epoch00004.pt"))
+    assert all(torch.equal(a, b) for a, b in zip(model.state_dict().values(), loaded.state_dict().values()))
+
+def test_update_metrics(tmp_path):
+    model = FusedBaseModel(in_features=26 * 12)
+    with CheckpointManager(str(tmp_path), best_k=1, last_n=1) as checkpoints:
+        # both are saved before the evaluation of epoch 0 is done
+        for epoch in range(2):
+            checkpoints.save(model, None, epoch, { 'loss': 1. }, { 'history': { 'val_acc': [0.] * (epoch + 1) } }, pending=True)
+        checkpoints.update_metrics(0, { 'accuracy': 50. }, { 'val_acc': 50. })
+        checkpoints.wait()
+        assert [entry.get('pending', False) for entry in checkpoints.entries] == [False, True]
+
+    assert load_checkpoint(str(tmp_path / "epoch00000.pt"))['metrics'] == { 'loss': 1., 'accuracy': 50. }
+    assert load_checkpoint(str(tmp_path / "epoch00000.pt"))['extra']['history']['val_acc'] == [50.]
+    assert load_checkpoint(str(tmp_path / "epoch00001.pt"))['extra']['history']['val_acc'] == [50., 0.]
+    # the evaluation of epoch 1 never came, it is not waited for once the index is picked up again
+    assert all('pending' not in entry for entry in CheckpointManager(str(tmp_path)).entries)
+
+class RngCheckpointManager(CheckpointManager):
+    """
+        Saves the random number generator states with every checkpoint, like runs.Run, so that the shuffling resumes where it was.
+    """
+    def save(self, model, optimizer, epoch, metrics, extra=None, pending=False):
+        super().save(model, optimizer, epoch, metrics, dict(extra or {}, rng=get_rng_state()), pending)
+
+def test_resume_training(tmp_path):
+    torch.manual_seed(0)
+    dataset = [(word, get_label_tensor(word, "cpu")) for word in get_wordlist("data/official.txt")[:64]]
+    trie = get_packed_trie("data/official.txt")
+    model = FusedBaseModel(in_features=26 * 12)
+    with RngCheckpointManager(str(tmp_path / "uninterrupted")) as checkpoints:
+        losses = train_batched(model, { 'train': dataset }, trie, 2, 0.001, batch_size=32, checkpoints=checkpoints)
+
+    # continuing after the first epoch gives the same losses and weights as the run that was never stopped
+    resume = load_checkpoint(str(tmp_path / "uninterrupted" / "epoch00000.pt"))
+    resumed = FusedBaseModel(in_features=26 * 12)
+    with CheckpointManager(str(tmp_path / "resumed")) as checkpoints:
+        resumed_losses = train_batched(resumed, { 'train': dataset }, trie, 2, 0.001, batch_size=32, checkpoints=checkpoints, resume=resume)
+    assert resumed_losses.tolist() == losses.tolist()
+    assert all(torch.equal(a, b) for a, b in zip(model.state_dict().values(), resumed.state_dict().values()))
@@ -0,0 +1,29 @@
+import os
+import torch
+from dictionary import get_compiled_dictionary
+from utils import get_label_tensor, get_mask_tree
+from trie import ROOT_NODE
+
+def write_wordlist(path, words):
+    with open(path, "w") as f:
+        f.write("\n".join(word.upper() for word in words))
+
+def test_compiled_dictionary(tmp_path):
+    wordlist_path = str(tmp_path / "words.txt")
+    write_wordlist(wordlist_path, ["cigar", "rebut", "sissy"])
+
+    dictionary = get_compiled_dictionary(wordlist_path)
+    assert dictionary.get_wordlist() == ["cigar", "rebut", "sissy"]
+    assert dictionary.index["rebut"] == 1
+    assert torch.equal(dictionary.labels[2], get_label_tensor("sissy"))
+    assert dictionary.trie.valid[ROOT_NODE].tolist() == get_mask_tree(wordlist_path)[0]
+
+    artifacts = [entry for entry in os.listdir(tmp_path) if entry.startswith(".words.")]
+    assert len(artifacts) == 1
+
+    # changing the word list compiles a new artifact and removes the old one
+    write_wordlist(wordlist_path, ["cigar", "rebut", "sissy", "humph"])
+    dictionary = get_compiled_dictionary(wordlist_path)
+    assert len(dictionary) == 4
+    assert [entry for entry in os.listdir(tmp_path) if entry.startswith(".words.")] != artifacts
+    assert len([entry for entry in os.listdir(tmp_path) if entry.startswith(".words.")]) == 1
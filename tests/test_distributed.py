@@ -0,0 +1,22 @@
+import numpy as np
+from distributed import launch
+from interactions import read_records
+from runs import Run, get_config
+
+def test_launch(tmp_path):
+    wordlist_path = tmp_path / "words.txt"
+    with open("data/official.txt") as f:
+        wordlist_path.write_text("".join(f.readlines()[:40]))
+    config = get_config(overrides={ 'wordlist': str(wordlist_path), 'max_epochs': 2, 'eta': 0.001, 'batch_size': 8, 'processes': 2 })
+    run = Run.create(str(tmp_path / "run"), config)
+    launch(run)
+
+    run = Run.load(str(tmp_path / "run"))
+    assert [entry['epoch'] for entry in run.checkpoints.get_retained(run.checkpoints.entries)] == [0, 1]
+    assert (np.load(tmp_path / "run" / "losses.npy") > 0).all()
+    # the games of both ranks are in the log of rank 0, every word is played in every epoch
+    records = np.concatenate(list(read_records(run.log_path)))
+    words = set(wordlist_path.read_text().lower().split())
+    for epoch in range(2):
+        first_attempts = records[(records['epoch'] == epoch) & (records['attempt'] == 0)]
+        assert set(first_attempts['word'].astype(str)) == words
@@ -0,0 +1,41 @@
+import math
+import torch
+from checkpoint import CheckpointManager, load_checkpoint
+from evaluator import BackgroundEvaluator
+from main import train_batched
+from metrics import batch_accuracy, batch_avg_loss, evaluate
+from models import FusedBaseModel
+from trie import get_packed_trie
+from utils import get_label_tensor, get_wordlist
+
+def test_evaluate():
+    torch.manual_seed(0)
+    model = FusedBaseModel(in_features=26 * 12).eval()
+    dataset = [(word, get_label_tensor(word, "cpu")) for word in get_wordlist("data/official.txt")[:200]]
+    trie = get_packed_trie("data/official.txt")
+    acc, attempt_count, loss = evaluate(model, dataset, trie)
+    assert (acc, attempt_count) == batch_accuracy(model, dataset, trie)
+    assert math.isclose(loss, batch_avg_loss(model, dataset, trie), rel_tol=1e-9)
+
+def test_background_evaluator(tmp_path):
+    dataset = [(word, get_label_tensor(word, "cpu")) for word in get_wordlist("data/official.txt")[:64]]
+    trie = get_packed_trie("data/official.txt")
+    torch.manual_seed(0)
+    with CheckpointManager(str(tmp_path / "inline"), best_k=3, last_n=3) as checkpoints:
+        train_batched(FusedBaseModel(in_features=26 * 12), { 'train': dataset }, trie, 3, 0.01, batch_size=16, checkpoints=checkpoints)
+    inline = { entry['epoch'] : entry['metrics'] for entry in checkpoints.entries }
+
+    torch.manual_seed(0)
+    with CheckpointManager(str(tmp_path / "background"), best_k=1, last_n=1) as checkpoints, BackgroundEvaluator(dataset, trie, every=2) as evaluator:
+        train_batched(FusedBaseModel(in_features=26 * 12), { 'train': dataset }, trie, 3, 0.01, batch_size=16, checkpoints=checkpoints, evaluator=evaluator)
+
+    # epoch 1 is on the cadence and epoch 2 is the last one, epoch 0 is not evaluated so it is not ranked
+    best = max([1, 2], key=lambda epoch: inline[epoch]['accuracy'])
+    assert [entry['epoch'] for entry in checkpoints.entries] == sorted({ best, 2 })
+    for entry in checkpoints.entries:
+        assert 'pending' not in entry
+        assert entry['metrics']['accuracy'] == inline[entry['epoch']]['accuracy']
+        assert math.isclose(entry['metrics']['val_loss'], inline[entry['epoch']]['val_loss'], rel_tol=1e-9)
+        # and so is the history that training continues with
+        history = load_checkpoint(checkpoints.get_path(entry))['extra']['history']
+        assert history['val_acc'][entry['epoch']] == inline[entry['epoch']]['accuracy']
@@ -0,0 +1,24 @@
+import torch
+from export import export_player
+from models import BaseModel, FusedBaseModel
+from trie import get_packed_trie
+from utils import get_batch_default_features, get_batch_word_beam_search, get_feedback, get_words_tensor
+
+def test_export_player(tmp_path):
+    torch.manual_seed(0)
+    model = BaseModel(in_features=26 * 12)
+    model.eval()
+    fused = FusedBaseModel.from_base_model(model)
+    trie = get_packed_trie("data/official.txt")
+    export_player(model, trie, str(tmp_path / "player.pt"), k=3)
+    exported = torch.jit.load(str(tmp_path / "player.pt"))
+
+    features = torch.randint(0, 2, (16, 26, 12)).float()
+    with torch.no_grad():
+        assert torch.equal(exported(features), get_batch_word_beam_search(fused(features), trie, 3))
+        assert torch.equal(exported(features[0]), exported(features[:1]))
+    assert torch.equal(exported.default_features(4), get_batch_default_features(4, "cpu"))
+
+    games = [("brash", "ctaju"), ("braha", "ctaau"), ("cigar", "cigar")]
+    feedback = exported.get_feedback(get_words_tensor([g for g, _ in games]), get_words_tensor([a for _, a in games]))
+    assert feedback.tolist() == [get_feedback(g, a) for g, a in games]
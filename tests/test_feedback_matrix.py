@@ -0,0 +1,40 @@
+import numpy as np
+from feedback import FeedbackMatrix, decode_feedback, encode_feedback, encode_words
+from utils import get_batch_feedback, get_feedback
+
+WORDS = ["brash", "ctaju", "braas", "baars", "baras", "ctaau", "braah", "barah", "braha", "abrha", "geese", "eerie"]
+
+def write_wordlist(path, words):
+    with open(path, "w") as f:
+        f.write("\n".join(word.upper() for word in words))
+
+def test_encode_feedback():
+    assert encode_feedback([-1, -1, -1, -1, -1]) == 0
+    assert encode_feedback([1, 1, 1, 1, 1]) == 242
+    for code in range(243):
+        assert encode_feedback(decode_feedback(code)) == code
+
+def test_feedback_codes():
+    encoded = encode_words(WORDS)
+    codes = get_batch_feedback(encoded, encoded)
+    for i, guess in enumerate(WORDS):
+        for j, answer in enumerate(WORDS):
+            assert codes[i, j] == encode_feedback(get_feedback(guess, answer))
+
+def test_feedback_matrix(tmp_path):
+    wordlist_path = str(tmp_path / "words.txt")
+    matrix_path = str(tmp_path / "matrix.npy")
+    vocab_path = str(tmp_path / "vocab.txt")
+    write_wordlist(wordlist_path, WORDS)
+
+    feedback_matrix = FeedbackMatrix(matrix_path, vocab_path, [wordlist_path])
+    assert len(feedback_matrix) == len(WORDS)
+    assert feedback_matrix.feedback("braha", "ctaau") == get_feedback("braha", "ctaau")
+    row = feedback_matrix.row("brash")
+    for answer in WORDS:
+        assert row[feedback_matrix.index[answer]] == feedback_matrix.code("brash", answer)
+
+    # the second load reuses the saved matrix as a memory map
+    reloaded = FeedbackMatrix(matrix_path, vocab_path, [wordlist_path])
+    assert isinstance(reloaded.matrix, np.memmap)
+    assert np.array_equal(reloaded.matrix, feedback_matrix.matrix)
@@ -0,0 +1,96 @@
+import json
+import os
+import torch
+from interactions import RECORD_DTYPE, InteractionRecorder, convert_history, get_interaction_store, iter_epoch_turns, iter_word_turns, read_records
+from utils import get_feedback, get_paired_feedback, get_words_tensor
+
+def test_interaction_recorder(tmp_path):
+    path = str(tmp_path / "history.log")
+    with InteractionRecorder(path, flush_every=4) as recorder:
+        for epoch in range(3):
+            recorder.record(epoch, "cigar", 0, "crane", get_feedback("crane", "cigar"))
+            recorder.record(epoch, "cigar", 1, "cigar", get_feedback("cigar", "cigar"))
+            # a batch of games playing the same attempt
+            guesses, answers = ["brash", "braha"], ["ctaju", "ctaau"]
+            codes = get_paired_feedback(get_words_tensor(guesses), get_words_tensor(answers))
+            recorder.record_batch(epoch, answers, 0, guesses, codes)
+
+    turns = list(iter_epoch_turns(path, 1))
+    assert [word for word, _ in turns] == ["cigar", "ctaju", "ctaau"]
+    assert turns[0][1] == {
+        0: {'feedback': get_feedback("crane", "cigar"), 'guessed_word': "crane"},
+        1: {'feedback': [1, 1, 1, 1, 1], 'guessed_word': "cigar"},
+    }
+    assert turns[2][1][0]['feedback'] == get_feedback("braha", "ctaau")
+    assert [epoch for epoch, _ in iter_word_turns(path, "ctaju")] == [0, 1, 2]
+
+    # a partly written record is skipped, and cut off before appending
+    with open(path, "ab") as f:
+        f.write(b"\x01\x02\x03")
+    assert sum(len(chunk) for chunk in read_records(path, chunk_size=5)) == 12
+    with InteractionRecorder(path) as recorder:
+        recorder.record(3, "cigar", 0, "cigar", [1, 1, 1, 1, 1])
+    assert [epoch for epoch, _ in iter_word_turns(path, "cigar")] == [0, 1, 2, 3]
+
+def test_convert_history(tmp_path):
+    history = { "0": { "cigar": { "0": {'feedback': get_feedback("crane", "cigar"), 'guessed_word': "crane"} } } }
+    with open(tmp_path / "history.json", "w") as f:
+        f.write(json.dumps(history))
+    convert_history(str(tmp_path / "history.json"), str(tmp_path / "history.log"))
+    assert list(iter_epoch_turns(str(tmp_path / "history.log"), 0)) == [("cigar", {0: history["0"]["cigar"]["0"]})]
+
+def test_interaction_store(tmp_path):
+    path = str(tmp_path / "history.log")
+    answers = ["cigar", "rebut", "sissy"]
+    guesses = [["crane", "cigar"], ["crane", "rebus", "rebut"], ["crane", "sissy"]]
+    with InteractionRecorder(path) as recorder:
+        for epoch in range(3):
+            for correct_word, words in zip(answers, guesses):
+                for attempt, guessed_word in enumerate(words if epoch else words[:1]):
+                    recorder.record(epoch, correct_word, attempt, guessed_word, get_feedback(guessed_word, correct_word))
+        # a resumed run that plays epoch 2 again, with a shorter game for rebut
+        recorder.record(2, "rebut", 0, "rebut", [1, 1, 1, 1, 1])
+
+    store = get_interaction_store(path)
+    assert store.get_epochs() == [0, 1, 2]
+    assert store.get_epoch_turns(1) == list(iter_epoch_turns(path, 1))
+    assert store.get_word_turns("cigar") == list(iter_word_turns(path, "cigar"))
+    assert store.get_word_turns("rebut")[2] == (2, {0: {'feedback': [1, 1, 1, 1, 1], 'guessed_word': "rebut"}})
+    assert store.get_word_turns("crane") == []
+
+    assert store.get_epoch_summary(0) == {'epoch': 0, 'games': 3, 'solved': 0, 'accuracy': 0, 'average': 0, 'distribution': {1: 0, 2: 0, 3: 0, 4: 0, 5: 0, 6: 0, 'failed': 3}}
+    assert store.get_epoch_summary(2)['distribution'] == {1: 1, 2: 2, 3: 0, 4: 0, 5: 0, 6: 0, 'failed': 0}
+    assert store.accuracy_on_output(1) == 100.
+    assert store.get_in_vocab({"cigar", "rebut", "sissy"}, epoch=1) == round(100 * 3 / 7, 4)
+
+    # the store is rebuilt once the log has grown
+    with InteractionRecorder(path) as recorder:
+        recorder.record(3, "cigar", 0, "cigar", [1, 1, 1, 1, 1])
+    assert get_interaction_store(path).get_epochs() == [0, 1, 2, 3]
+
+def test_interaction_store_order(tmp_path):
+    path = str(tmp_path / "history.log")
+    answers, guesses = ["sissy", "cigar", "rebut"], ["crane", "rebut", "cigar"]
+    with InteractionRecorder(path) as recorder:
+        # a batch of games, the records of its attempts are interleaved
+        codes = get_paired_feedback(get_words_tensor(guesses), get_words_tensor(answers))
+        recorder.record_batch(0, answers, 0, guesses, codes)
+        recorder.record_batch(0, answers[:2], 1, answers[:2], get_paired_feedback(get_words_tensor(answers[:2]), get_words_tensor(answers[:2])))
+        recorder.record(0, "awake", 0, "awake", [1, 1, 1, 1, 1])
+
+    turns = get_interaction_store(path).get_epoch_turns(0)
+    assert [word for word, _ in turns] == ["sissy", "cigar", "rebut", "awake"]
+    assert turns == list(iter_epoch_turns(path, 0))
+
+def test_interaction_store_rebuilt(tmp_path):
+    path = str(tmp_path / "history.log")
+    with InteractionRecorder(path) as recorder:
+        recorder.record(0, "cigar", 0, "crane", get_feedback("crane", "cigar"))
+        recorder.record(1, "cigar", 0, "crane", get_feedback("crane", "cigar"))
+    assert get_interaction_store(path).get_epochs() == [0, 1]
+
+    # the log is cut back to its first record and appended to again, it has as many records as before
+    os.truncate(path, os.path.getsize(path) - RECORD_DTYPE.itemsize)
+    with InteractionRecorder(path) as recorder:
+        recorder.record(2, "cigar", 0, "cigar", [1, 1, 1, 1, 1])
+    assert get_interaction_store(path).get_epochs() == [0, 2]
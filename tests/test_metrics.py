@@ -0,0 +1,31 @@
+import math
+import torch
+from metrics import batch_accuracy, batch_avg_loss, get_metrics
+from models import FusedBaseModel
+from players import ModelPlayer, play_game
+from trie import get_packed_trie
+from utils import get_label_tensor, get_wordlist
+
+def test_get_metrics():
+    torch.manual_seed(0)
+    model = FusedBaseModel(in_features=26 * 12).eval()
+    words = get_wordlist("data/official.txt")[:150]
+    datasets = { 'train': [(word, get_label_tensor(word, "cpu")) for word in words[:100]], 'val': [(word, get_label_tensor(word, "cpu")) for word in words[100:]] }
+    trie = get_packed_trie("data/official.txt")
+    # both datasets in the same batches, and in batches of 16 games
+    for words_set, metrics in [(set(words), get_metrics(model, datasets, trie)), (set(words[:10]), get_metrics(model, datasets, trie, batch_size=16, words_set=set(words[:10])))]:
+        for name, dataset in datasets.items():
+            acc, attempt_count = batch_accuracy(model, dataset, trie)
+            assert (metrics[name]['accuracy'], metrics[name]['attempt_count']) == (acc, attempt_count)
+            assert math.isclose(metrics[name]['loss'], batch_avg_loss(model, dataset, trie), rel_tol=1e-9)
+            assert list(metrics[name]['results']) == [word for word, label in dataset]
+            assert sum(metrics[name]['histogram'].values()) == metrics[name]['num_words'] == len(dataset)
+            assert metrics[name]['histogram'][7] == len(dataset) - len(attempt_count)
+
+            guesses = [turn['guessed_word'] for turns in metrics[name]['results'].values() for turn in turns.values()]
+            assert metrics[name]['in_vocab'] == round(100 * sum(guess in words_set for guess in guesses) / len(guesses), 4)
+            assert math.isclose(metrics[name]['mean_loss'], metrics[name]['loss'] / len(guesses))
+
+    # the turns of every word are the ones of a player
+    for word in words[:5]:
+        assert list(metrics['train']['results'][word].values()) == play_game(ModelPlayer(model, trie, 3), word)
@@ -0,0 +1,51 @@
+import torch
+import device
+from models import BaseModel, FusedBaseModel, quantize_model
+
+def test_fused_base_model():
+    torch.manual_seed(0)
+    model = BaseModel(in_features=26 * 12)
+    fused = FusedBaseModel.from_base_model(model)
+
+    # the output heads are part of the fused model's parameters
+    assert sum(p.numel() for p in fused.parameters()) == sum(p.numel() for p in model.parameters()) + 5 * (512 * 26 + 26)
+
+    features = torch.randint(0, 2, (8, 26, 12)).float()
+    assert fused(features).shape == (8, 5, 26)
+    assert torch.allclose(fused(features), model(features), atol=1e-6)
+    assert torch.allclose(fused(features[0]), model(features[0]), atol=1e-6)
+
+def test_autocast_forward():
+    torch.manual_seed(0)
+    model = FusedBaseModel(in_features=26 * 12)
+    features = torch.randint(0, 2, (8, 26, 12)).float()
+    previous = device.AUTOCAST_DTYPE
+    try:
+        device.configure("cpu", torch.bfloat16)
+        outputs = device.forward(model, features)
+    finally:
+        device.configure("cpu", previous)
+
+    # bfloat16 compute, float32 outputs
+    assert outputs.dtype == torch.float32
+    assert torch.allclose(outputs, model(features), atol=0.1)
+
+def test_quantize_model():
+    torch.manual_seed(0)
+    model = BaseModel(in_features=26 * 12)
+    model.eval()
+    quantized = quantize_model(model)
+    assert isinstance(quantized, FusedBaseModel)
+    assert not list(quantized.parameters())
+
+    features = torch.randint(0, 2, (64, 26, 12)).float()
+    with torch.no_grad():
+        outputs, quantized_outputs = model(features), quantized(features)
+    assert quantized_outputs.shape == (64, 5, 26)
+    assert torch.allclose(quantized_outputs, outputs, atol=0.02)
+    assert (quantized_outputs.argmax(dim=2) == outputs.argmax(dim=2)).float().mean() > 0.9
+
+    # the model that is quantized is not moved or cast
+    for model in [BaseModel(in_features=26 * 12).double(), FusedBaseModel(in_features=26 * 12).double()]:
+        quantize_model(model)
+        assert all(p.dtype == torch.float64 and p.device.type == "cpu" for p in model.parameters())
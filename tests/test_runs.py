@@ -0,0 +1,49 @@
+import pytest
+import torch
+import runs
+from main import train_batched
+from models import FusedBaseModel
+from runs import Run, get_config, seed_everything
+from trie import get_packed_trie
+from utils import get_label_tensor, get_wordlist
+
+def train_run(run, dataset, trie, resume_from=None):
+    seed_everything(run.config['seed'])
+    model = FusedBaseModel(in_features=26 * 12)
+    resume = run.load_checkpoint(resume_from) if resume_from is not None else None
+    with run:
+        losses = train_batched(model, { 'train': dataset }, trie, run.config['max_epochs'], run.config['eta'], batch_size=run.config['batch_size'], recorder=run.recorder, checkpoints=run, resume=resume)
+    return model, losses
+
+def test_resume_run(tmp_path):
+    dataset = [(word, get_label_tensor(word, "cpu")) for word in get_wordlist("data/official.txt")[:64]]
+    trie = get_packed_trie("data/official.txt")
+    config = get_config(overrides={ 'max_epochs': 3, 'eta': 0.001, 'batch_size': 16 })
+    model, losses = train_run(Run.create(str(tmp_path / "full"), config), dataset, trie)
+
+    # a run that is continued from the snapshot of its first epoch, with the random number generators moved on since
+    interrupted = Run.create(str(tmp_path / "interrupted"), config)
+    train_run(interrupted, dataset, trie)
+    torch.rand(100)
+    resumed = Run.load(str(tmp_path / "interrupted"))
+    resumed_model, resumed_losses = train_run(resumed, dataset, trie, str(tmp_path / "interrupted" / "checkpoints" / "epoch00000.pt"))
+
+    assert (resumed_losses == losses).all()
+    assert all(torch.equal(a, b) for a, b in zip(model.state_dict().values(), resumed_model.state_dict().values()))
+    assert (tmp_path / "full" / "interactions.log").read_bytes() == (tmp_path / "interrupted" / "interactions.log").read_bytes()
+    assert resumed.checkpoints.get_last()['epoch'] == 2
+
+def test_get_config():
+    assert get_config(overrides={ 'max_epochs': 3, 'eta': None })['max_epochs'] == 3
+    assert get_config(overrides={ 'eta': None })['eta'] == 0.00005
+    with pytest.raises(ValueError):
+        get_config(overrides={ 'last_n': 0 })
+
+def test_load_run(tmp_path, monkeypatch):
+    config = get_config(overrides={ 'max_epochs': 3 })
+    assert config['batch_size'] is None
+    Run.create(str(tmp_path), config)
+    # a run trained one word at a time stays that way, whatever the defaults are now
+    monkeypatch.setitem(runs.DEFAULT_CONFIG, 'batch_size', 64)
+    monkeypatch.setitem(runs.DEFAULT_CONFIG, 'autocast', "bfloat16")
+    assert Run.load(str(tmp_path)).config == config
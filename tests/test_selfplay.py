@@ -0,0 +1,62 @@
+import torch
+from models import FusedBaseModel
+from players import ModelPlayer, play_game
+from selfplay import POLICIES, ReplayBuffer, SelfPlay, get_mix, play_policy_games, train_self_play
+from solver import EntropySolver
+from state import get_batch_default_states, pack_features
+from trie import get_packed_trie
+from utils import get_default_features, get_updated_features, get_wordlist, get_words_from_tensor, get_words_tensor
+
+def test_replay_buffer():
+    buffer = ReplayBuffer(10)
+    for start in range(0, 25, 5):
+        buffer.add(torch.arange(start, start + 5, dtype=torch.uint8)[:, None].repeat(1, 39), torch.arange(start, start + 5)[:, None].repeat(1, 5))
+    assert len(buffer) == 10 and int(buffer.count) == 25
+    assert sorted(buffer.states[:, 0].tolist()) == list(range(15, 25))
+    states, labels = buffer.sample(100)
+    assert (states[:, :5] == labels).all() and states[:, 0].min() >= 15
+
+def test_play_policy_games():
+    torch.manual_seed(0)
+    model = FusedBaseModel(in_features=26 * 12).eval()
+    words = get_wordlist("data/official.txt")
+    trie = get_packed_trie("data/official.txt")
+    answer_idx = torch.arange(6)
+    policies = torch.tensor([0, 0, 1, 1, 2, 2])
+    states, labels = play_policy_games(model, trie, get_words_tensor(words), answer_idx, policies, EntropySolver())
+
+    # every game starts from the default state, and the model and solver games are the ones of their players
+    assert (states[:6] == get_batch_default_states(6, "cpu")).all() and (labels[:6] == get_words_tensor(words[:6])).all()
+    expected = []
+    for idx, policy in enumerate(policies.tolist()):
+        if POLICIES[policy] == 'random':
+            continue
+        player = ModelPlayer(model, trie, 3) if POLICIES[policy] == 'model' else EntropySolver()
+        features = get_default_features("cpu")
+        for turn in play_game(player, words[idx]):
+            expected.append((words[idx], pack_features(features)))
+            features = get_updated_features(features, turn['feedback'], turn['guessed_word'])
+    played = [(word, state) for word, state in zip(get_words_from_tensor(labels), states) if word in words[:4]]
+    assert sorted((word, state.tolist()) for word, state in played) == sorted((word, state.tolist()) for word, state in expected)
+
+def test_self_play(tmp_path):
+    torch.manual_seed(0)
+    model = FusedBaseModel(in_features=26 * 12)
+    with SelfPlay(model, capacity=2000, producers=1, mix=[0.5, 0., 0.5], games=64) as self_play:
+        losses = train_self_play(model, self_play, 20, 0.001, batch_size=32, publish_every=5)
+        self_play.wait_for(2000)
+        assert int(self_play.version) == 4 and int(self_play.buffer.count) >= 2000
+    assert (losses > 0).all()
+
+def test_mix_schedule():
+    assert torch.allclose(get_mix(torch.tensor([0., 1., 0.]), torch.tensor([1., 0., 0.]), 0.25), torch.tensor([0.25, 0.75, 0.]))
+    torch.manual_seed(0)
+    model = FusedBaseModel(in_features=26 * 12)
+    with SelfPlay(model, capacity=500, producers=1, mix=[0., 0., 1.], games=64) as self_play:
+        mixes = []
+        set_mix = self_play.set_mix
+        self_play.set_mix = lambda mix: (mixes.append(torch.as_tensor(mix).tolist()), set_mix(mix))
+        train_self_play(model, self_play, 12, 0.001, batch_size=32, publish_every=5, mix_final=[1., 0., 0.])
+        # at the publishes of steps 5 and 10, and at the last step, the producers play with the current mix
+        assert [round(mix[0], 4) for mix in mixes] == [round(5 / 12, 4), round(10 / 12, 4), 1.]
+        assert self_play.mix.tolist() == [1., 0., 0.]
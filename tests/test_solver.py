@@ -0,0 +1,45 @@
+import json
+import numpy as np
+from feedback import FeedbackMatrix
+from players import play_game
+from solver import EntropySolver, get_entropies, get_pattern_counts
+
+WORDS = ["cigar", "rebut", "sissy", "humph", "awake", "blush", "focal", "evade", "naval", "serve", "heath", "dwarf"]
+
+def write_wordlist(path, words):
+    with open(path, "w") as f:
+        f.write("\n".join(word.upper() for word in words))
+
+def test_entropies():
+    codes = np.array([[0, 0, 0, 0], [0, 1, 2, 3], [0, 0, 1, 1]])
+    assert np.allclose(get_entropies(get_pattern_counts(codes)), [0., 2., 1.])
+
+def test_entropy_solver(tmp_path):
+    wordlist_path = str(tmp_path / "words.txt")
+    write_wordlist(wordlist_path, WORDS)
+    feedback_matrix = FeedbackMatrix(str(tmp_path / "matrix.npy"), str(tmp_path / "vocab.txt"), [wordlist_path])
+    solver = EntropySolver(feedback_matrix, wordlist_path, str(tmp_path / "opening.json"))
+
+    for correct_word in WORDS:
+        turns = play_game(solver, correct_word)
+        assert turns[-1]['guessed_word'] == correct_word
+        assert len(turns) <= 4
+
+    # the cached opening is reused
+    assert EntropySolver(feedback_matrix, wordlist_path, str(tmp_path / "opening.json")).opening == solver.opening
+
+def test_opening_cache_key(tmp_path):
+    wordlist_path = str(tmp_path / "words.txt")
+    write_wordlist(wordlist_path, WORDS)
+    # two guess vocabularies with the same number of words
+    matrices = []
+    for extra_word in ["abbey", "xylyl"]:
+        vocab_path = str(tmp_path / f"{extra_word}.txt")
+        write_wordlist(vocab_path, [extra_word])
+        matrices.append(FeedbackMatrix(str(tmp_path / f"{extra_word}.npy"), str(tmp_path / f"{extra_word}_vocab.txt"), [wordlist_path, vocab_path]))
+    assert len(matrices[0]) == len(matrices[1])
+
+    for feedback_matrix in matrices:
+        EntropySolver(feedback_matrix, wordlist_path, str(tmp_path / "opening.json"))
+    with open(str(tmp_path / "opening.json")) as f:
+        assert len(json.load(f)) == 2
@@ -0,0 +1,33 @@
+import torch
+from state import STATE_BYTES, get_batch_default_states, get_batch_updated_states, get_state_keys, get_states_from_keys, pack_features, unpack_states
+from utils import get_batch_default_features, get_batch_updated_features, get_feedback, get_words_tensor
+
+def test_pack_features():
+    features = torch.randint(0, 2, (16, 26, 12)).float()
+    states = pack_features(features)
+    assert states.shape == (16, STATE_BYTES) and states.dtype == torch.uint8
+    assert torch.equal(unpack_states(states), features)
+    # bit row * 12 + col of the features is little endian in the bytes
+    features = torch.zeros((26, 12))
+    features[1, 2] = 1
+    assert get_state_keys(pack_features(features)[None]) == [1 << 14]
+
+def test_batch_updated_states():
+    games = [("brash", "ctaju"), ("braha", "ctaau"), ("cigar", "cigar"), ("eerie", "there")]
+    guessed_letters = get_words_tensor([guess for guess, _ in games])
+    feedback = torch.tensor([get_feedback(guess, answer) for guess, answer in games])
+    states = get_batch_default_states(len(games), "cpu")
+    features = get_batch_default_features(len(games), "cpu")
+    assert torch.equal(unpack_states(states), features)
+
+    for _ in range(2):
+        states = get_batch_updated_states(states, feedback, guessed_letters)
+        features = get_batch_updated_features(features, feedback, guessed_letters)
+        assert torch.equal(unpack_states(states), features)
+
+def test_state_keys():
+    states = pack_features(torch.randint(0, 2, (8, 26, 12)))
+    keys = get_state_keys(states)
+    assert len(set(keys)) == 8
+    assert torch.equal(get_states_from_keys(keys, "cpu"), states)
+    assert get_states_from_keys([], "cpu").shape == (0, STATE_BYTES)
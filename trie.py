@@ -0,0 +1,56 @@
+import torch
+from utils import get_wordlist
+
+# node 0 has no valid children and is used for prefixes that are not in the trie, the root is node 1
+DEAD_NODE = 0
+ROOT_NODE = 1
+
+class PackedTrie:
+    """
+        A prefix trie of the words in a word list, packed into tensors so that it can be walked for a whole batch at once.
+        This holds the same information as get_mask_tree(), with integer node ids instead of string prefixes.
+
+        `children`: A long tensor of shape [num_nodes, 26]. children[node, c] is the node reached by appending
+        the character c to the prefix of node, or DEAD_NODE if that prefix is not part of any word.
+
+        `valid`: A float tensor of shape [num_nodes, 26], 1 where children[node, c] is a valid prefix and 0 otherwise.
+        valid[ROOT_NODE] is the same as mask_tree[0].
+    """
+    def __init__(self, children : torch.Tensor, valid : torch.Tensor):
+        self.children = children
+        self.valid = valid
+
+    def __len__(self):
+        return self.children.shape[0]
+
+    def to(self, device):
+        return PackedTrie(self.children.to(device), self.valid.to(device))
+
+def build_packed_trie(words : list) -> PackedTrie:
+    """
+        Builds a PackedTrie from a list of 5 letter words.
+    """
+    nodes = { '': ROOT_NODE }
+    edges = []
+    for word in words:
+        for pass_len in range(5):
+            prefix = word[:pass_len + 1]
+            if prefix not in nodes:
+                nodes[prefix] = len(nodes) + 1
+                edges.append((nodes[word[:pass_len]], ord(word[pass_len]) - ord('a'), nodes[prefix]))
+
+    children = torch.full((len(nodes) + 1, 26), DEAD_NODE, dtype=torch.long)
+    if edges:
+        parents, characters, child_nodes = torch.tensor(edges).T
+        children[parents, characters] = child_nodes
+    valid = (children != DEAD_NODE).float()
+    return PackedTrie(children, valid)
+
+def get_packed_trie(wordlist_path : str) -> PackedTrie:
+    """
+        Reads the words from the file at the path and builds a PackedTrie out of them.
+
+        Arguments:
+        `wordlist_path`: Needs to be the full path to the wordlist to use. Usually word lists are under data/ subdirectory.
+    """
+    return build_packed_trie(get_wordlist(wordlist_path))
@@ -1,9 +1,12 @@
 import torch
 import json
+from typing import List
 from dataset import WordleDataset
+from models import BaseModel, FusedBaseModel, quantize_model
+from device import get_device, get_dtype
 import numpy as np
 
-def get_default_features() -> torch.Tensor:
+def get_default_features(device : torch.device = None) -> torch.Tensor:
     """
         Returns the default features.
         The features are:
@@ -25,12 +28,23 @@ def get_default_features() -> torch.Tensor:
         12) Incorrect Position - 5
 
         These are all binary features.
+
+        The features are created on the given device, by default the one set up in device.py.
     """
-    one_through_11 = torch.zeros((26, 11)).float()
-    zero = torch.ones((26, 1)).float()
+    device = device or get_device()
+    one_through_11 = torch.zeros((26, 11), dtype=get_dtype(), device=device)
+    zero = torch.ones((26, 1), dtype=get_dtype(), device=device)
     return torch.hstack((zero, one_through_11))
 
-def get_label_tensor(word : str) -> torch.Tensor:
+def get_batch_default_features(batch_size : int, device : torch.device = None) -> torch.Tensor:
+    """
+        Returns a batch of default features of shape [batch_size, 26, 12], one get_default_features() for each game.
+    """
+    features = torch.zeros((batch_size, 26, 12), dtype=get_dtype(), device=device or get_device())
+    features[:, :, 0] = 1
+    return features
+
+def get_label_tensor(word : str, device : torch.device = None) -> torch.Tensor:
     """
         Given a word, we need to create labels for that word.
         Each label is the offset from 'a'.
@@ -38,10 +52,8 @@ def get_label_tensor(word : str) -> torch.Tensor:
 
         Since each word has 5 characters, the resulting tensor has size 5
     """
-    output = torch.empty(5, dtype=torch.long)
-    for i, k in enumerate(word):
-        output[i] = ord(k) - ord('a')
-    return output
+    output = torch.tensor([ord(k) - ord('a') for k in word], dtype=torch.long)
+    return output.to(device or get_device())
 
 def get_feedback(guessed_word : str, correct_word : str) -> list:
     """
@@ -82,6 +94,92 @@ def get_feedback(guessed_word : str, correct_word : str) -> list:
     
     return feedback
 
+FEEDBACK_POWERS = [1, 3, 9, 27, 81]
+
+def _get_feedback_codes(guesses : torch.Tensor, answers : torch.Tensor) -> torch.Tensor:
+    """
+        Computes the base-3 encoded feedback (see feedback.encode_feedback()) for integer encoded guesses and answers.
+        The leading dimensions of both tensors are broadcast against each other.
+
+        Greens are given first, the remaining occurrences of a letter in the answer are then handed out
+        as yellows from left to right. This is the same as get_feedback().
+        Only uses operations that TorchScript supports, so it can be compiled into the exported players of export.py.
+    """
+    green = guesses == answers
+    codes = torch.zeros(green.shape[:-1], dtype=torch.uint8, device=green.device)
+    yellows : List[torch.Tensor] = []
+    power = 1
+    for i in range(5):
+        letter = guesses[..., i:i + 1]
+        available = ((answers == letter) & ~green).sum(dim=-1)
+        used = torch.zeros_like(available)
+        for j in range(i):
+            used += (guesses[..., j] == guesses[..., i]) & yellows[j]
+        yellow = ~green[..., i] & (available > used)
+        yellows.append(yellow)
+        codes += power * (2 * green[..., i] + yellow).to(torch.uint8)
+        power *= 3
+    return codes
+
+def get_batch_feedback(guesses, answers):
+    """
+        Batched version of get_feedback(). Computes the feedback for every guess against every answer in one vectorized call.
+
+        Arguments:
+        `guesses`: Integer encoded words of shape [N, 5], each entry is the offset from 'a'. See get_words_tensor().
+        Can either be a torch.Tensor or a np.ndarray.
+
+        `answers`: Integer encoded words of shape [M, 5], same as guesses.
+
+        Return:
+        `feedback`: A uint8 tensor of shape [N, M] with the base-3 encoded feedback (see feedback.encode_feedback())
+        for each (guess, answer) pair. Use decode_batch_feedback() to get back the {-1, 0, 1} values.
+        If the inputs were numpy arrays, a numpy array is returned.
+    """
+    is_numpy = isinstance(guesses, np.ndarray)
+    guesses = torch.as_tensor(guesses).long()
+    answers = torch.as_tensor(answers).long()
+    codes = _get_feedback_codes(guesses[:, None], answers[None])
+    return codes.numpy() if is_numpy else codes
+
+def get_paired_feedback(guesses, answers):
+    """
+        Same as get_batch_feedback(), but the i-th guess is only compared with the i-th answer.
+        This is the feedback for a batch of games being played in lock step.
+
+        Return:
+        `feedback`: A uint8 tensor of shape [N] with the base-3 encoded feedback.
+    """
+    is_numpy = isinstance(guesses, np.ndarray)
+    codes = _get_feedback_codes(torch.as_tensor(guesses).long(), torch.as_tensor(answers).long())
+    return codes.numpy() if is_numpy else codes
+
+def decode_batch_feedback(codes : torch.Tensor) -> torch.Tensor:
+    """
+        Converts a tensor of base-3 encoded feedback to a tensor with an extra trailing dimension of size 5,
+        holding values from {-1, 0, 1} just like get_feedback().
+    """
+    codes = torch.as_tensor(codes).long()
+    powers = torch.tensor(FEEDBACK_POWERS, device=codes.device)
+    return torch.div(codes[..., None], powers, rounding_mode='floor') % 3 - 1
+
+def get_words_tensor(words : list) -> torch.Tensor:
+    """
+        Converts a list of words to a tensor of shape [len(words), 5], each entry being the offset from 'a'.
+        Each row is the same as get_label_tensor() of that word.
+    """
+    if not words:
+        return torch.empty((0, 5), dtype=torch.long)
+    encoded = np.frombuffer("".join(words).encode("ascii"), dtype=np.uint8).reshape(-1, 5)
+    return torch.from_numpy(encoded - ord('a')).long()
+
+def get_words_from_tensor(letters : torch.Tensor) -> list:
+    """
+        Inverse of get_words_tensor(), converts a tensor of shape [N, 5] with offsets from 'a' back to a list of words.
+    """
+    encoded = (letters.cpu() + ord('a')).to(torch.uint8).numpy().tobytes().decode("ascii")
+    return [encoded[i:i + 5] for i in range(0, len(encoded), 5)]
+
 def get_updated_features(features : torch.Tensor, feedback : list, guessed_word : str) -> torch.Tensor:
     """
         This function updates the features based on the feedback and the guessed_word.
@@ -108,6 +206,26 @@ def get_updated_features(features : torch.Tensor, feedback : list, guessed_word
         features[row_idx][0] = 0
     return features
 
+def get_batch_updated_features(features : torch.Tensor, feedback : torch.Tensor, guessed_letters : torch.Tensor) -> torch.Tensor:
+    """
+        Batched version of get_updated_features(). Updates the features of a batch of games in place.
+
+        Arguments:
+        `features`: Features of shape [B, 26, 12], from get_batch_default_features() or an earlier call to this function.
+
+        `feedback`: Tensor of shape [B, 5] with entries from {-1, 0, 1}. See decode_batch_feedback().
+
+        `guessed_letters`: Tensor of shape [B, 5] holding the guessed words as offsets from 'a'.
+    """
+    positions = torch.arange(5, device=feedback.device)
+    col_idx = torch.where(feedback == 1, 2 + positions, 7 + positions)
+    col_idx = torch.where(feedback == -1, torch.ones_like(col_idx), col_idx)
+    batch_idx = torch.arange(features.shape[0], device=features.device)[:, None].expand(-1, 5)
+
+    features[batch_idx, guessed_letters, col_idx] = 1
+    features[batch_idx, guessed_letters, 0] = 0
+    return features
+
 def get_word(outputs : torch.Tensor) -> str:
     """
         To convert the output of our model to a word that can be made sense of, we use this function.
@@ -195,6 +313,22 @@ def save_model(model : torch.nn.Module, model_name : str) -> None:
     """
     torch.save(model, f"models/{model_name}")
 
+def load_model(model_path : str, quantize : bool = False) -> torch.nn.Module:
+    """
+        Loads a model saved with save_model(). Needs to be the full path to the model, usually under the models/ subdirectory.
+        Pickled BaseModel checkpoints are converted to a FusedBaseModel with the same weights, and the checkpoints
+        of checkpoint.CheckpointManager are loaded into a new FusedBaseModel.
+        With quantize, the model is returned from models.quantize_model(), it then only runs on CPU.
+    """
+    model = torch.load(model_path, map_location="cpu", weights_only=False)
+    if isinstance(model, dict):
+        state_dict = model['model']
+        model = FusedBaseModel(in_features=model['in_features'])
+        model.load_state_dict(state_dict)
+    if isinstance(model, BaseModel):
+        model = FusedBaseModel.from_base_model(model)
+    return quantize_model(model.eval()) if quantize else model
+
 def save_history(history : dict, file_name : str) -> None:
     """
         Save the interaction_history as a json file with the chosen file_name under the interactions/ subdirectory
@@ -260,21 +394,25 @@ def get_word_beam_search(outputs : torch.Tensor, mask_tree : dict, k : int = 3)
 
         Arguments:
         `outputs`: The output from the model. Should be of the shape [5, 26].
-        `mask_tree`: The mask tree to be used. This is created using the get_word_tree() function
+        `mask_tree`: The mask tree to be used. This is created using the get_word_tree() function.
+        A PackedTrie (see trie.py and dictionary.py) can be used instead, the search is then done with get_batch_word_beam_search().
     """
+    if not isinstance(mask_tree, dict):
+        return get_words_from_tensor(get_batch_word_beam_search(outputs[None], mask_tree, k))[0]
+
     # initialize
     soft_outputs = torch.nn.functional.softmax(outputs, dim=1)
     mask = mask_tree[0]
-    mask = torch.tensor(mask)
+    mask = torch.tensor(mask, device=outputs.device)
     mask = mask * soft_outputs[0]
     values, indices = torch.topk(mask, k=k)
     characters = [ chr(i + ord('a')) for i in indices ]
     
     for i, output in enumerate(soft_outputs[1:]):
-        new_output = torch.tensor([])
+        new_output = torch.tensor([], device=outputs.device)
         for j, c in enumerate(characters):
             mask = mask_tree[i + 1][c]
-            mask = torch.tensor(mask)
+            mask = torch.tensor(mask, device=outputs.device)
             mask = values[j] * mask
             mask = mask * output
             new_output = torch.hstack((new_output, mask))
@@ -288,4 +426,48 @@ def get_word_beam_search(outputs : torch.Tensor, mask_tree : dict, k : int = 3)
             temp_char[i] = new_ch
         characters = temp_char
     
-    return characters[0]
\ No newline at end of file
+    return characters[0]
+
+def _get_beam_search_letters(outputs : torch.Tensor, children : torch.Tensor, valid : torch.Tensor, k : int) -> torch.Tensor:
+    """
+        The beam search of get_batch_word_beam_search() over the arrays of a PackedTrie. It only uses operations
+        that TorchScript supports, so it can be compiled into the exported players of export.py.
+    """
+    batch_size = outputs.shape[0]
+    soft_outputs = torch.nn.functional.softmax(outputs, dim=2)
+
+    # start with a single beam at the root of the trie
+    nodes = torch.ones((batch_size, 1), dtype=torch.long, device=outputs.device)
+    values = torch.ones((batch_size, 1), device=outputs.device)
+    letters = torch.empty((batch_size, 1, 0), dtype=torch.long, device=outputs.device)
+
+    for i in range(5):
+        new_output = values[:, :, None] * valid[nodes]
+        new_output = new_output * soft_outputs[:, i, None, :]
+
+        values, indices = torch.topk(new_output.reshape(batch_size, -1), k=k)
+        beams = torch.div(indices, 26, rounding_mode='trunc')
+        characters = indices % 26
+
+        nodes = children[torch.gather(nodes, 1, beams), characters]
+        letters = torch.gather(letters, 1, beams[:, :, None].expand(-1, -1, i))
+        letters = torch.cat((letters, characters[:, :, None]), dim=2)
+
+    return letters[:, 0]
+
+def get_batch_word_beam_search(outputs : torch.Tensor, trie, k : int = 3) -> torch.Tensor:
+    """
+        Batched version of get_word_beam_search(), finds the same words for a whole batch of model outputs.
+        Rather than looking up masks for string prefixes, the beams are node ids in a packed prefix trie (see trie.py),
+        so every step is a single gather of the masks, a multiply and a topk over all the beams of the batch.
+
+        Arguments:
+        `outputs`: The output from the model for a batch of features. Should be of the shape [B, 5, 26].
+        `trie`: The PackedTrie to be used. This is created using the trie.get_packed_trie() function
+        `k`: The number of words to track in beam search.
+
+        Return:
+        `letters`: A tensor of shape [B, 5] with the best word for each output as offsets from 'a'.
+        Use get_words_from_tensor() to convert them to strings.
+    """
+    return _get_beam_search_letters(outputs, trie.children, trie.valid, k)
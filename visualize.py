@@ -2,6 +2,10 @@ from termcolor import colored
 import json
 import torch
 from utils import *
+from metrics import get_metrics
+from dictionary import get_compiled_dictionary
+from interactions import get_interaction_store
+from device import get_device
 import matplotlib.pyplot as plt
 
 # load the data from interaction_history.json
@@ -63,63 +67,39 @@ def get_colored_turn(turns : dict) -> str:
         colored_turn.append(colored_word)
     return " => ".join(colored_turn)
 
-def print_epoch_turns(one_epoch_interaction : dict) -> None:
+def print_epoch_turns(log_path : str, epoch : int) -> None:
     """
         This function is used to print the interaction history from one epoch of the model.
         One epoch contains all interactions of the model over the entire training dataset.
         By printing these interactions, we can see how the model is doing over the dataset.
 
         Arguments:
-        `one_epoch_interaction`: A dictionary containing the interaction history of the model
-        over the entire training dataset. For each word there should be at least 1 attempt,
-        with each attempt being a valid turn. See get_colored_turn() for example of valid turns.
-
-        Example one_epoch_interaction:
-        {
-            'hello': {
-                '0': {
-                    'feedback': [1, 1, 0, -1, -1],
-                    'guessed_word': heoyy,
-                },
-                '1': {
-                    'feedback': [1, 1, 1, 1, 1],
-                    'guessed_word': hello,
-                }
-            },
-            'goose': {
-                '0': {
-                    'feedback': [1, 1, 0, -1, -1],
-                    'guessed_word': goecx,
-                },
-                '1': {
-                    'feedback': [1, 1, 1, 0, -1],
-                    'guessed_word': gooex,
-                },
-                '2': {
-                    'feedback': [1, 1, 1, 1, 1],
-                    'guessed_word': goose,
-                }
-            }
-        }
+        `log_path`: The interaction log written during training by interactions.InteractionRecorder, usually under
+        the interactions/ subdirectory. The rows of the epoch are read from its InteractionStore, see interactions.get_interaction_store().
+        An interaction history saved as json can be converted with interactions.convert_history().
+
+        `epoch`: The epoch to print.
+
+        Example output, with colored letters:
+        hello : heoyy => hello
+        goose : goecx => gooex => goose
     """
-    for correct_word, turns in one_epoch_interaction.items():
+    for correct_word, turns in get_interaction_store(log_path).get_epoch_turns(epoch):
         colored_turn = get_colored_turn(turns)
         print(f"{correct_word} : {colored_turn}")
 
-def print_word_over_epochs(interaction_history : dict, correct_word : str) -> None:
+def print_word_over_epochs(log_path : str, correct_word : str) -> None:
     """
         Print the evolution of the AI's ability to predict the sequence of guesses for a given word.
         Useful to see this relation evolve an check for over training.
 
         Arguments:
-        `interaction_history`: A dictonary that is the output of running the train() function for a model on the dataset.
-        Usually these files are saved in the interactions sub-directory. An interacion_history is a dict with epoch number
-        as keys and the interactions over the entire dataset is the value for the keys.
+        `log_path`: The interaction log written during training by interactions.InteractionRecorder, usually under
+        the interactions/ subdirectory. The rows of the word are read from its InteractionStore, see interactions.get_interaction_store().
 
         `correct_word`: The word that we are tracking through different epochs.
     """
-    for epoch in range(100):
-        turns = interaction_history[str(epoch)][correct_word]
+    for epoch, turns in get_interaction_store(log_path).get_word_turns(correct_word):
         colored_turn = get_colored_turn(turns)
         print(colored_turn)
 
@@ -130,7 +110,8 @@ def accuracy_on_output(one_epoch_interaction : dict) -> float:
         metrics.py.
 
         Arguments:
-        `one_epoch_ineraction`: Full definition is present in print_epoch_turns()
+        `one_epoch_ineraction`: A dict from every correct word to its turns, see get_colored_turn().
+        For an interaction log, use InteractionStore.accuracy_on_output() from interactions.py instead.
     """
     acc = 0.
     count = 0.
@@ -142,63 +123,46 @@ def accuracy_on_output(one_epoch_interaction : dict) -> float:
         count += 1
     return round(100. * acc / count, 3)
 
-def accuracy_on_dataset(model_path : str, wordlist_path : str, dataset_name : str, k : int = 3) -> tuple:
+def get_dataset_metrics(model_path : str, wordlist_path : str, dataset_names : list = ('train', 'val', 'test'), k : int = 3) -> dict:
     """
-        Given a model path, wordlist path, and the dataset name from {'train', 'test', 'val'},
-        finds the accuracy on the given dataset.
+        Given a model path and wordlist path, finds all the metrics of metrics.get_metrics() on the datasets
+        from {'train', 'test', 'val'}. The games of all the datasets are played together, in a single pass.
 
         Arguments:
         `model_path`: This needs to be the full path to the model. Usuallay models are stored in 
         the models/ subdirectory.
 
         `wordlist_path`: This need to be the full path to the word list. Usually the word list is
-        stored in data/ subdirectory.
+        stored in data/ subdirectory. The in vocab rate is measured against this word list.
 
-        `dataset_name`: The default split on the loaded wordlist will be [0.8, 0.05, 0.15] for 
-        {'train', 'val', 'test'}. The dataset_name specifies which dataset to use to find this accuracy.
+        `dataset_names`: The default split on the loaded wordlist will be [0.8, 0.05, 0.15] for 
+        {'train', 'val', 'test'}. The dataset_names specify which datasets to find the metrics on.
 
         `k`: The number of words to track in beam search. Increasing this number makes search slower.
 
         Return:
-        `results`: A dict, storing the attempts that the model made for each word in the specified dataset.
-        `accuracy`: A float multiplied by 100 to give % of accuracy
+        `metrics`: A dict from every dataset name to its metrics, see metrics.GameMetrics.get_metrics().
     """
     splits = [0.8, 0.05, 0]
     dataset = get_dataset(wordlist_path)
     datasets = get_split_dataset(dataset, splits)
-    mask_tree = get_mask_tree(wordlist_path)
-    
-    model = torch.load(model_path)
+    trie = get_compiled_dictionary(wordlist_path).trie.to(get_device())
+
+    model = load_model(model_path).to(get_device())
     model.eval()
-    acc, count = 0., 0.
-    results = {word : {} for word, label in datasets[dataset_name]}
-
-    i = 0
-    N = len(datasets[dataset_name])
-    for correct_word, label in datasets[dataset_name]:
-        i += 1
-        print(f"word: {correct_word} {i}/{N}", end='\r')
-        features = get_default_features()
-
-        for attempt in range(6):
-            output = model(features)
-            guessed_word = get_word_beam_search(output, mask_tree, k)
-            feedback = get_feedback(guessed_word, correct_word)
-            features = get_updated_features(features, feedback, guessed_word)
-            
-            results[correct_word][attempt] = {
-                'feedback': feedback,
-                'guessed_word': guessed_word,
-            }
-
-            if guessed_word == correct_word:
-                acc += 1
-                break
-        
-        count += 1
+    return get_metrics(model, { name : datasets[name] for name in dataset_names }, trie, k, words_set=get_wordset(wordlist_path))
+
+def accuracy_on_dataset(model_path : str, wordlist_path : str, dataset_name : str, k : int = 3) -> tuple:
+    """
+        Given a model path, wordlist path, and the dataset name from {'train', 'test', 'val'},
+        finds the accuracy on the given dataset, see get_dataset_metrics().
 
-    acc = round(100. * acc / count, 3) if count else 0
-    return results, acc
+        Return:
+        `results`: A dict, storing the attempts that the model made for each word in the specified dataset.
+        `accuracy`: A float multiplied by 100 to give % of accuracy
+    """
+    metrics = get_dataset_metrics(model_path, wordlist_path, [dataset_name], k)[dataset_name]
+    return metrics['results'], round(metrics['accuracy'], 3)
 
 def get_in_vocab(interaction_results : dict, words_set : set) -> float:
     """
@@ -262,7 +226,7 @@ def k_variation_beam_search(model_name : str) -> None:
     ks = [1, 3, 5, 10]
     results, acc = {}, {} 
     for k in ks:
-        results[k], acc[k] = accuracy_on_dataset(model_name, "data/official.txt", "train")
+        results[k], acc[k] = accuracy_on_dataset(model_name, "data/official.txt", "train", k)
     
     for k in ks:
         print(f"Accuracy for k = {k}: {acc[k]}%")
@@ -281,26 +245,20 @@ def print_model_statistics(model_name : str) -> None:
         `model_name`: Needs to be the full path to the model file. Usually under models/ subdirectory.
     """
     print(model_name)
-    results, acc, in_vocab = {}, {}, {}
-
-    results['train'], acc['train'] = accuracy_on_dataset(model_name, "data/official.txt", "train")
-    results['val'], acc['val'] = accuracy_on_dataset(model_name, "data/official.txt", "val")
-    results['test'], acc['test'] = accuracy_on_dataset(model_name, "data/official.txt", "test")
+    metrics = get_dataset_metrics(model_name, "data/official.txt")
 
-    print(f"Train accuracy: {acc['train']}%")
-    print(f"validation accuracy: {acc['val']}%")
-    print(f"Test accuracy: {acc['test']}%")
+    print(f"Train accuracy: {metrics['train']['accuracy']}%")
+    print(f"validation accuracy: {metrics['val']['accuracy']}%")
+    print(f"Test accuracy: {metrics['test']['accuracy']}%")
 
-    word_set = get_wordset("data/official.txt")
-    in_vocab['train'] = get_in_vocab(results['train'], word_set)
-    in_vocab['val'] = get_in_vocab(results['val'], word_set)
-    in_vocab['test'] = get_in_vocab(results['test'], word_set)
+    print(f"Words guessed in vocab(train): {metrics['train']['in_vocab']}%")
+    print(f"Words guessed in vocab(val): {metrics['val']['in_vocab']}%")
+    print(f"Words guessed in vocab(test): {metrics['test']['in_vocab']}%")
 
-    print(f"Words guessed in vocab(train): {in_vocab['train']}%")
-    print(f"Words guessed in vocab(val): {in_vocab['val']}%")
-    print(f"Words guessed in vocab(test): {in_vocab['test']}%")
+    for name in ['train', 'val', 'test']:
+        print(f"Loss({name}): {metrics[name]['loss']}, per attempt {metrics[name]['mean_loss']}, average attempts {metrics[name]['mean_attempts']}")
     
-    # show_guess_distribution(results['train'])
+    # show_guess_distribution(metrics['train']['results'])
     print("")
 
 if __name__ == "__main__":